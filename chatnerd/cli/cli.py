@@ -7,7 +7,7 @@ from pathlib import Path
 from rich.console import Console
 from rich.syntax import Syntax
 from chatnerd.config import Config
-from chatnerd.cli import cli_projects, cli_utils, cli_db
+from chatnerd.cli import cli_projects, cli_utils, cli_db, cli_server
 from chatnerd.lib.helpers import get_filtered_directories
 from chatnerd.tools.chat_logger import ChatLogger
 
@@ -35,6 +35,8 @@ def main(ctx: typer.Context):
 def study_command(
     directory_filter: cli_utils.DirectoryFilterArgument = None,
     limit: cli_utils.LimitOption = None,
+    stream: cli_utils.StreamOption = None,
+    retry_failed: cli_utils.RetryFailedOption = False,
 ):
     cli_utils.validate_confirm_active_project()
 
@@ -49,61 +51,107 @@ def study_command(
 
         from chatnerd.document_loaders.document_loader import DocumentLoader
 
+        project_config = Config.instance().get_project_config()
+
         document_loader = DocumentLoader(
-            project_config=Config.instance().get_project_config(),
+            project_config=project_config,
             source_directories=source_directories,
+            retry_failed=bool(retry_failed),
         )
 
-        tqdm_holder = cli_utils.TqdmHolder(desc="Loading documents", ncols=80)
-        document_loader.on("start", tqdm_holder.start)
-        document_loader.on("update", tqdm_holder.update)
-        document_loader.on("end", tqdm_holder.close)
+        if stream is None:
+            stream = bool((project_config.get("study", None) or {}).get("streaming"))
 
-        document_loader_results, document_loader_errors = document_loader.run(
-            limit=limit
-        )
+        if stream:
+            study_streaming(project_config, document_loader, limit=limit)
+            return
 
-        tqdm_holder.close()
-        logging.info(
-            f"{len(document_loader_results)} documents loaded successfully with {len(document_loader_errors)} errors...."
+        study_batches(project_config, document_loader, limit=limit)
+
+    except Exception as e:
+        logging.error(
+            "Error studying sources. Try to load the sources separately with the option --source. See chatnerd add --help."
         )
+        raise e
+    except SystemExit:
+        raise typer.Abort()
 
-        if len(document_loader_errors) > 0:
-            logging.error("Error loading documents", exc_info=document_loader_errors[0])
-            return
 
-        from chatnerd.langchain.document_embedder import DocumentEmbedder
+def study_batches(project_config: dict, document_loader, limit: Optional[int] = None):
+    from chatnerd.document_loaders.document_loader import DEFAULT_BATCH_SIZE
+    from chatnerd.langchain.document_embedder import DocumentEmbedder
 
-        document_embedder = DocumentEmbedder(Config.instance().get_project_config())
+    batch_size = (project_config.get("study", None) or {}).get(
+        "batch_size", DEFAULT_BATCH_SIZE
+    )
 
-        tqdm_holder = cli_utils.TqdmHolder(desc="Embedding documents", ncols=80)
-        document_embedder.on("start", tqdm_holder.start)
-        document_embedder.on("update", tqdm_holder.update)
-        document_embedder.on("end", tqdm_holder.close)
-        document_embedder.on("write", tqdm_holder.write)
+    # The embedding model is loaded once for all the batches
+    document_embedder = DocumentEmbedder(project_config)
 
-        document_embedder_results, document_embedder_errors = document_embedder.run(
-            documents=document_loader_results,
-            limit=limit,
-        )
+    tqdm_holder = cli_utils.TqdmHolder(desc="Embedding documents", ncols=80)
+    document_embedder.on("start", tqdm_holder.start)
+    document_embedder.on("update", tqdm_holder.update)
+    document_embedder.on("end", tqdm_holder.close)
+    document_embedder.on("write", tqdm_holder.write)
+
+    num_results = 0
+    num_errors = 0
+    for batch_index, (documents, document_loader_errors) in enumerate(
+        document_loader.irun_batches(batch_size=batch_size, limit=limit)
+    ):
+        if len(document_loader_errors) > 0:
+            logging.error(
+                f"Error loading {len(document_loader_errors)} documents",
+                exc_info=document_loader_errors[0],
+            )
 
-        tqdm_holder.close()
         logging.info(
-            f"{len(document_embedder_results)} documents embedded successfully with {len(document_embedder_errors)} errors...."
+            f"Studying batch {batch_index + 1} ({len(documents)} documents)..."
+        )
+        document_embedder_results, document_embedder_errors = document_embedder.run(
+            documents=documents
         )
+        tqdm_holder.close()
 
         if len(document_embedder_errors) > 0:
             logging.error(
                 "Error embedding documents", exc_info=document_embedder_errors[0]
             )
 
-    except Exception as e:
-        logging.error(
-            "Error studying sources. Try to load the sources separately with the option --source. See chatnerd add --help."
-        )
-        raise e
-    except SystemExit:
-        raise typer.Abort()
+        # Save the progress, so an interrupted study is resumed after the last batch
+        batch_results = len(set(document_embedder_results))
+        batch_errors = len(document_loader_errors) + len(document_embedder_errors)
+        document_loader.save_checkpoint(batch_results, batch_errors)
+        num_results += batch_results
+        num_errors += batch_errors
+
+    document_loader.finish_study_run()
+
+    logging.info(
+        f"{num_results} documents studied successfully with {num_errors} errors...."
+    )
+
+
+def study_streaming(project_config: dict, document_loader, limit: Optional[int] = None):
+    from chatnerd.langchain.study_pipeline import StudyPipeline
+
+    study_pipeline = StudyPipeline(project_config, document_loader)
+
+    tqdm_holder = cli_utils.TqdmHolder(desc="Studying documents", ncols=80)
+    study_pipeline.on("start", tqdm_holder.start)
+    study_pipeline.on("update", tqdm_holder.update)
+    study_pipeline.on("end", tqdm_holder.close)
+    study_pipeline.on("write", tqdm_holder.write)
+
+    study_results, study_errors = study_pipeline.run(limit=limit)
+
+    tqdm_holder.close()
+    logging.info(
+        f"{len(study_results)} documents studied successfully with {len(study_errors)} errors...."
+    )
+
+    if len(study_errors) > 0:
+        logging.error("Error studying documents", exc_info=study_errors[0])
 
 
 @app.command("chat", help="Start a chat session with your active project")
@@ -247,3 +295,9 @@ app.add_typer(
     help="View and manage the local DBs",
     epilog="* These commands require an active project environment.",
 )
+
+app.add_typer(
+    cli_server.app,
+    name="server",
+    help="Manage the model server, which keeps the models loaded between commands",
+)
@@ -11,6 +11,7 @@ from chatnerd.langchain.llm_factory import LLMFactory
 from chatnerd.stores.store_factory import StoreFactory
 from chatnerd.document_loaders.document_loader import DocumentLoader
 from chatnerd.lib.enums import LogColors
+from chatnerd.lib.helpers import get_embeddings_client
 from chatnerd.config import Config
 
 _global_config = Config.instance()
@@ -39,6 +40,13 @@ def status_command():
     with store_factory.get_status_store() as status_store:
         database_path = str(status_store.database_path)
         num_studied_documents = len(status_store.get_studied_documents())
+        num_failed_files = len(status_store.get_failed_files())
+        last_study_run = status_store.get_last_study_run()
+        num_lexical_chunks = (
+            status_store.count_lexical_chunks()
+            if status_store.has_lexical_index
+            else "(SQLite without FTS5)"
+        )
         pragmas = status_store.get_pragma_compile_options()
 
     try:
@@ -48,6 +56,28 @@ def status_command():
         logging.warning(f"Error getting chunks collection: {str(e)}")
         num_chunk_documents = "(Not supported by the store)"
 
+    # Disabled caches are not opened, opening them would create their files
+    embedding_cache_config = (
+        project_config.get("embeddings", {}).get("cache", None) or {}
+    )
+    embedding_cache_stats = None
+    try:
+        if embedding_cache_config.get("enabled", False):
+            with store_factory.get_embedding_cache_store() as embedding_cache_store:
+                embedding_cache_stats = embedding_cache_store.get_stats()
+    except Exception as e:
+        logging.warning(f"Error getting embedding cache stats: {str(e)}")
+
+    parsed_cache_config = project_config.get("loader", {}).get("cache", None) or {}
+    parsed_cache_stats = None
+    try:
+        if parsed_cache_config.get("enabled", False):
+            parsed_cache_stats = (
+                store_factory.get_parsed_document_cache_store().get_stats()
+            )
+    except Exception as e:
+        logging.warning(f"Error getting parsed document cache stats: {str(e)}")
+
     print("SQLite compile options:")
     if pragmas:
         print(
@@ -62,6 +92,42 @@ def status_command():
     print(
         f"- Num studied chunks:    {LogColors.BOLD}{num_chunk_documents}{LogColors.ENDC}"
     )
+    print(
+        f"- Num lexical chunks:    {LogColors.BOLD}{num_lexical_chunks}{LogColors.ENDC} (hybrid search, see db lexical-index)"
+    )
+    print(
+        f"- Num failed files:      {LogColors.BOLD}{num_failed_files}{LogColors.ENDC} (skipped until they change, see study --retry-failed)"
+    )
+    if last_study_run:
+        print(
+            f"- Last study run:        {LogColors.BOLD}{last_study_run['studied_files'] + last_study_run['failed_files']} / {last_study_run['total_files']} files{LogColors.ENDC} "
+            f"({last_study_run['failed_files']} failed, {last_study_run['batches']} batches, "
+            f"{'finished at ' + last_study_run['finished_at'] if last_study_run['finished_at'] else 'not finished, resumed by the next study'})"
+        )
+
+    if embedding_cache_stats:
+        print("Embedding cache Summary:")
+        print(
+            f"- SQlite DB Path:        {LogColors.BOLD}{embedding_cache_stats['database_path']}{LogColors.ENDC}"
+        )
+        print(
+            f"- Num cached vectors:    {LogColors.BOLD}{embedding_cache_stats['count']}{LogColors.ENDC}"
+        )
+        print(
+            f"- Size (MB):             {LogColors.BOLD}{embedding_cache_stats['size_mb']:.1f} / {embedding_cache_stats['max_size_mb']:.0f}{LogColors.ENDC}"
+        )
+
+    if parsed_cache_stats:
+        print("Parsed document cache Summary:")
+        print(
+            f"- Directory Path:        {LogColors.BOLD}{parsed_cache_stats['directory_path']}{LogColors.ENDC}"
+        )
+        print(
+            f"- Num cached files:      {LogColors.BOLD}{parsed_cache_stats['count']}{LogColors.ENDC}"
+        )
+        print(
+            f"- Size (MB):             {LogColors.BOLD}{parsed_cache_stats['size_mb']:.1f} / {parsed_cache_stats['max_size_mb']:.0f}{LogColors.ENDC}"
+        )
 
 
 @app.command(
@@ -256,7 +322,9 @@ def fix_store_command():
                 if source not in studied_sources:
                     # Try to load source document
                     try:
-                        source_documents = DocumentLoader.load_single_document(source)
+                        source_documents = DocumentLoader.load_single_document(
+                            source, DocumentLoader.get_loader_kwargs(project_config)
+                        )
 
                     except Exception as e:
                         logging.error(
@@ -268,7 +336,9 @@ def fix_store_command():
                     status_store.add_studied_document(
                         id=source,
                         source=source,
-                        page_content=source_documents[0].page_content,
+                        page_content="\n\n".join(
+                            document.page_content for document in source_documents
+                        ),
                         metadata=source_documents[0].metadata,
                     )
 
@@ -286,6 +356,71 @@ def fix_store_command():
     print("Done")
 
 
+@app.command(
+    "lexical-index",
+    help="Rebuild the lexical index of the hybrid search from the chunks of the embeddings DB (chunks studied with previous versions)",
+)
+def lexical_index_command():
+    validate_confirm_active_project(skip_confirmation=True)
+
+    project_config = _global_config.get_project_config()
+
+    store_factory = StoreFactory(project_config)
+    chunks_store = store_factory.get_vector_store()
+
+    with store_factory.get_status_store() as status_store:
+        if not status_store.has_lexical_index:
+            logging.error(
+                "SQLite compiled without FTS5, the lexical search is disabled"
+            )
+            raise typer.Abort()
+
+        try:
+            status_store.delete_all_lexical_chunks()
+            for chunks in chunks_store.iget_chunks():
+                status_store.add_lexical_chunks(
+                    [
+                        (
+                            chunk.id,
+                            chunk.metadata.get("source", None),
+                            chunk.page_content,
+                        )
+                        for chunk in chunks
+                    ]
+                )
+        except Exception as e:
+            logging.error("Error building the lexical index", exc_info=e)
+            raise typer.Abort()
+
+        print(f"Lexical index built: {status_store.count_lexical_chunks()} chunks")
+
+
+@app.command(
+    "qdrant-index",
+    help="Apply the index settings of the 'qdrant' config (HNSW, on_disk, optimizers, quantization) to the existing collection",
+)
+def qdrant_index_command():
+    validate_confirm_active_project(skip_confirmation=True)
+
+    project_config = _global_config.get_project_config()
+
+    store_factory = StoreFactory(project_config)
+    if store_factory.selected_store != "qdrant":
+        logging.error(f"The vector store is not qdrant: {store_factory.selected_store}")
+        raise typer.Abort()
+
+    chunks_store = store_factory.get_vector_store()
+    try:
+        chunks_store.update_index_config()
+    except Exception as e:
+        logging.error("Error updating the qdrant collection", exc_info=e)
+        raise typer.Abort()
+
+    print(
+        "Qdrant collection updated, the index is rebuilt by the server in the background"
+    )
+
+
 @app.command("delete-source", help="Delete documents of a source from the DB")
 def delete_source_command(
     source: str,
@@ -340,8 +475,9 @@ def embeddings_parameters_command():
 
     embeddings: Embeddings = LLMFactory(project_config).get_embedding_function()
 
-    print("max_seq_length: ", embeddings.client.get_max_seq_length())
+    client = get_embeddings_client(embeddings)
+    print("max_seq_length: ", client.get_max_seq_length())
     print(
         "sentence_embedding_dimension: ",
-        embeddings.client.get_sentence_embedding_dimension(),
+        client.get_sentence_embedding_dimension(),
     )
@@ -0,0 +1,128 @@
+import sys
+import time
+import signal
+import logging
+import subprocess
+import typer
+from typing_extensions import Annotated
+from chatnerd.cli.cli_utils import OrderedCommandsTyperGroup
+from chatnerd.langchain.model_server import (
+    ModelClient,
+    ModelServer,
+    get_socket_path,
+)
+from chatnerd.lib.enums import LogColors
+from chatnerd.config import Config
+
+_global_config = Config.instance()
+app = typer.Typer(cls=OrderedCommandsTyperGroup, no_args_is_help=True)
+
+_START_TIMEOUT = 30  # Seconds waiting for a detached server to listen
+
+
+def _get_socket_path() -> str:
+    project_config = _global_config.get_project_config(ignore_project=True)
+    model_server_config = project_config.get("model_server", None) or {}
+
+    return get_socket_path(model_server_config, _global_config.PROJECTS_DIRECTORY_PATH)
+
+
+# Default command: status
+@app.callback(invoke_without_command=True)
+def main(ctx: typer.Context):
+    if ctx.invoked_subcommand is None:
+        status_command()
+
+
+@app.command(
+    "start",
+    help="Start the model server, keeping the embedding model, the cross-encoder and the local LLMs loaded between commands",
+)
+def start_command(
+    detach: Annotated[
+        bool,
+        typer.Option(
+            "--detach",
+            "-d",
+            help="Run the server in the background",
+        ),
+    ] = False,
+    preload: Annotated[
+        bool,
+        typer.Option(
+            help="Load the embedding model and the cross-encoder of the active project before serving",
+        ),
+    ] = True,
+):
+    socket_path = _get_socket_path()
+    if ModelClient(socket_path).ping() is not None:
+        print(f"Model server already running on {socket_path}")
+        return
+
+    if detach:
+        command = [sys.executable, "-m", "chatnerd", "server", "start"]
+        if not preload:
+            command.append("--no-preload")
+        subprocess.Popen(
+            command,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            start_new_session=True,
+        )
+
+        # Wait until the server listens (after loading the models)
+        for _ in range(_START_TIMEOUT * 10):
+            time.sleep(0.1)
+            if ModelClient(socket_path).ping() is not None:
+                print(f"Model server started on {socket_path}")
+                return
+
+        logging.warning(
+            f"Model server not listening on {socket_path} yet, check it with 'chatnerd server status'"
+        )
+        return
+
+    server = ModelServer(socket_path)
+    if preload:
+        server.preload(_global_config.get_project_config(ignore_project=True))
+
+    # SIGTERM stops the server like Ctrl+C (the socket is removed)
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+@app.command("stop", help="Stop the model server")
+def stop_command():
+    socket_path = _get_socket_path()
+    model_client = ModelClient(socket_path)
+    if model_client.ping() is None:
+        print(f"Model server not running on {socket_path}")
+        return
+
+    model_client.call("stop")
+    print("Model server stopped")
+
+
+@app.command("status", help="Print the status of the model server and its models")
+def status_command():
+    socket_path = _get_socket_path()
+    status = ModelClient(socket_path).ping()
+
+    print("Model server Summary:")
+    print(f"- Socket Path:           {LogColors.BOLD}{socket_path}{LogColors.ENDC}")
+    if status is None:
+        print(f"- Status:                {LogColors.BOLD}not running{LogColors.ENDC}")
+        return
+
+    print(
+        f"- Status:                {LogColors.BOLD}running (pid {status['pid']}){LogColors.ENDC}"
+    )
+    print(
+        f"- Loaded models:         {LogColors.BOLD}{len(status['models'])}{LogColors.ENDC}"
+    )
+    for model_key in status["models"]:
+        print(f"  {model_key}")
@@ -17,7 +17,7 @@ LimitOption = Annotated[
     typer.Option(
         "--limit",
         "-l",
-        help="Limit the maximum number of items to process per run. If not specified, use default limit of 1000 items.",
+        help="Limit the maximum number of items to process per run. The rest are processed in the next runs. If not specified, process all the items.",
     ),
 ]
 
@@ -30,6 +30,25 @@ DirectoryFilterArgument = Annotated[
 ]
 
 
+StreamOption = Annotated[
+    Optional[bool],
+    typer.Option(
+        "--stream",
+        "-s",
+        help="Run the study stages (load, split, embed and store) at the same time connected by bounded queues. If not specified, use the value of study.streaming in the config.",
+    ),
+]
+
+
+RetryFailedOption = Annotated[
+    Optional[bool],
+    typer.Option(
+        "--retry-failed",
+        help="Load again the files that failed in previous runs. By default, they are skipped until they change.",
+    ),
+]
+
+
 DryRunOption = Annotated[
     Optional[bool],
     typer.Option(
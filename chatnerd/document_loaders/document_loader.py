@@ -1,14 +1,17 @@
 import os
+import json
+import functools
 from pathlib import Path
-import glob
 import logging
-from typing import Any, Dict, List, Tuple
-from concurrent.futures import ProcessPoolExecutor, as_completed
+from collections import deque
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+from dataclasses import dataclass, field
+from concurrent.futures import wait, FIRST_COMPLETED
 from langchain_core.documents import Document
+from langchain_core.document_loaders import BaseLoader
 from langchain_community.document_loaders import (
     CSVLoader,
     EverNoteLoader,
-    PDFMinerLoader,
     TextLoader,
     UnstructuredEPubLoader,
     UnstructuredHTMLLoader,
@@ -17,11 +20,38 @@ from langchain_community.document_loaders import (
     UnstructuredPowerPointLoader,
     UnstructuredWordDocumentLoader,
 )
+from chatnerd.config import Config
 from chatnerd.stores.store_factory import StoreFactory
+from chatnerd.stores.status_store import StatusStore
+from chatnerd.stores.parsed_document_cache_store import ParsedDocumentCacheStore
+from chatnerd.lib.helpers import get_file_hash, iwalk_files
+from chatnerd.document_loaders.load_scheduler import (
+    LoadScheduler,
+    EXECUTOR_LAZY,
+    EXECUTOR_PROCESS,
+    EXECUTOR_THREAD,
+    EXECUTOR_TRANSCRIPTION,
+    DEFAULT_THREAD_WORKERS,
+)
+from chatnerd.document_loaders.load_pool import (
+    LoadPool,
+    LazyLoadWorker,
+    DocumentLoadError,
+    DEFAULT_MAX_MEMORY_MB,
+    DEFAULT_MAX_TASKS_PER_CHILD,
+)
+from chatnerd.document_loaders.pdf_page_loader import PDFPageLoader
+from chatnerd.document_loaders.open_ai_whisper_loader import (
+    OpenAIWhisperLoader,
+    DEFAULT_LANG_MODEL,
+    DEFAULT_WINDOW_SECONDS,
+    DEFAULT_BATCH_SIZE as DEFAULT_TRANSCRIPTION_BATCH_SIZE,
+)
 from chatnerd.tools.event_emitter import EventEmitter
 
 
-_RUN_TASKS_LIMIT = 1_000  # Maximum number of tasks to run in a single call to run()
+DEFAULT_BATCH_SIZE = 100  # Number of files studied in each checkpointed batch
+DEFAULT_TRANSCRIPTION_WORKERS = 1  # Worker processes transcribing audio files
 
 
 # Map file extensions to document loaders and their arguments
@@ -32,116 +62,788 @@ _LOADER_MAPPING = {
     ".enex": (EverNoteLoader, {}),
     ".epub": (UnstructuredEPubLoader, {}),
     ".html": (UnstructuredHTMLLoader, {}),
+    ".m4a": (OpenAIWhisperLoader, {}),
     ".md": (UnstructuredMarkdownLoader, {}),
+    ".mp3": (OpenAIWhisperLoader, {}),
     ".odt": (UnstructuredODTLoader, {}),
-    ".pdf": (PDFMinerLoader, {}),
+    ".pdf": (PDFPageLoader, {}),
     ".ppt": (UnstructuredPowerPointLoader, {}),
     ".pptx": (UnstructuredPowerPointLoader, {}),
     ".txt": (TextLoader, {"encoding": "utf8"}),
-    # ".mp3": (OpenAIWhisperLoader, {"device": "cpu", "lang_model": "openai/whisper-base"}),
+    ".wav": (OpenAIWhisperLoader, {}),
     # Add more mappings for other file extensions and loaders as needed
 }
 
 
+@dataclass
+class SourceChanges:
+    """
+    Changes of the source files since the last study. Each file is described by its signature:
+    {source, size, mtime_ns, content_hash}
+    """
+
+    new: List[Dict[str, Any]] = field(default_factory=list)
+    modified: List[Dict[str, Any]] = field(default_factory=list)
+    renamed: List[Tuple[str, Dict[str, Any]]] = field(default_factory=list)
+    removed: List[str] = field(default_factory=list)
+    touched: List[Dict[str, Any]] = field(default_factory=list)  # same content
+    failed: List[Dict[str, Any]] = field(default_factory=list)  # failed before, skipped
+    unchanged: int = 0
+
+    @property
+    def files_to_load(self) -> List[str]:
+        return [signature["source"] for signature in self.new + self.modified]
+
+    @property
+    def signatures(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            signature["source"]: signature for signature in self.new + self.modified
+        }
+
+    @property
+    def content_hashes(self) -> Dict[str, str]:
+        return {
+            signature["source"]: signature["content_hash"]
+            for signature in self.new + self.modified
+        }
+
+    def __str__(self):
+        return (
+            f"{len(self.new)} new, {len(self.modified)} modified, {len(self.renamed)} renamed, "
+            f"{len(self.removed)} removed, {self.unchanged + len(self.touched)} unchanged, "
+            f"{len(self.failed)} skipped (failed before)"
+        )
+
+
 class DocumentLoader(EventEmitter):
     config: Dict[str, Any] = {}
     source_directories: List[str] = []
 
     def __init__(
-        self, project_config: Dict[str, Any], source_directories: List[str | Path]
+        self,
+        project_config: Dict[str, Any],
+        source_directories: List[str | Path],
+        retry_failed: bool = False,
     ):
         super().__init__()
         self.config = project_config
         self.source_directories = [str(directory) for directory in source_directories]
+        self.retry_failed = retry_failed
+        self.study_run_id: int | None = None
+        self.is_limited = False  # Files were left for the next run by the limit
 
-    def run(self, limit: int = _RUN_TASKS_LIMIT) -> Tuple[List[Document], List[any]]:
+    def run(self, limit: int | None = None) -> Tuple[List[Document], List[any]]:
         logging.debug("Running document loader...")
 
-        # Get studied documents to exclude them
-        studied_sources = []
-        with StoreFactory(self.config).get_status_store() as status_store:
-            studied_sources = status_store.get_studied_document_ids()
-
         results: List[Document] = []
         errors = []
-        for source_directory in self.source_directories:
-            # Load source documents
-            documents, errors = self.load_documents(
-                source_directory, ignored_files=studied_sources, limit=limit
-            )
-            if len(documents) > 0:
+        for _, documents, error in self.irun(limit=limit):
+            if error is not None:
+                errors.append(error)
+            elif documents:
                 results.extend(documents)
-            if len(errors) > 0:
-                errors.extend(errors)
 
         return results, errors
 
+    def irun_batches(
+        self, batch_size: int = DEFAULT_BATCH_SIZE, limit: int | None = None
+    ) -> Iterator[Tuple[List[Document], List[any]]]:
+        """
+        Batched version of run(). Yields the documents and the errors of every batch_size
+        files, so the documents held in memory are bounded by the batch size instead of by
+        the size of the corpus. Save the progress with save_checkpoint() after each batch
+        """
+        batch_size = max(1, int(batch_size or DEFAULT_BATCH_SIZE))
+
+        results: List[Document] = []
+        errors = []
+        num_files = 0
+        for _, documents, error in self.irun(limit=limit):
+            if error is not None:
+                errors.append(error)
+            elif documents:
+                results.extend(documents)
+
+            num_files += 1
+            if num_files >= batch_size:
+                yield results, errors
+                results, errors, num_files = [], [], 0
+
+        if num_files > 0:
+            yield results, errors
+
+    def irun(
+        self, limit: int | None = None, lazy: bool = False
+    ) -> Iterator[Tuple[str, Iterable[Document] | None, Exception | None]]:
+        """
+        Lazy version of run(). Yields a tuple (file_path, documents, error) per loaded file.
+        Only new and modified files are loaded. The chunks of removed files are deleted and
+        the chunks of renamed files are kept. With lazy=True, see iload_files().
+        The files that fail to load are recorded and skipped until their content changes
+        (or retry_failed is set). Without limit, all the files are loaded. The progress of the
+        run is saved in the status store (see save_checkpoint()), and an interrupted run is
+        resumed: the files already studied are not loaded again
+        """
+        store_factory = StoreFactory(self.config)
+
+        files_to_load = []
+        with store_factory.get_status_store() as status_store:
+            studied_sources = status_store.get_studied_document_ids()
+            source_files = status_store.get_source_files()
+            if self.retry_failed:
+                status_store.delete_failed_files()
+            failed_files = status_store.get_failed_files()
+
+            for source_directory in self.source_directories:
+                source_changes = self.detect_source_changes(
+                    source_directory, source_files, studied_sources, failed_files
+                )
+                logging.info(
+                    f"Changes in {os.path.basename(source_directory)}: {source_changes}"
+                )
+
+                self.apply_source_changes(source_changes, status_store, store_factory)
+                files_to_load.append((source_directory, source_changes))
+
+            num_files = sum(
+                len(source_changes.files_to_load) for _, source_changes in files_to_load
+            )
+            self.study_run_id = self.start_study_run(status_store, num_files)
+
+        self.is_limited = bool(limit) and num_files > limit
+        if self.is_limited:
+            logging.warning(
+                f"Number of documents to load cut to limit {limit} (out of {num_files}). The rest are loaded in the next runs"
+            )
+
+        remaining_files = limit if limit else None
+        for source_directory, source_changes in files_to_load:
+            source_files_to_load = source_changes.files_to_load
+            if remaining_files is not None:
+                source_files_to_load = source_files_to_load[:remaining_files]
+                remaining_files -= len(source_files_to_load)
+
+            signatures = source_changes.signatures
+            for file_path, documents, error in self.iload_files(
+                source_files_to_load,
+                desc=f"Loading {os.path.basename(source_directory)}",
+                lazy=lazy,
+                content_hashes=source_changes.content_hashes,
+            ):
+                if isinstance(error, DocumentLoadError):
+                    self.save_failed_file(
+                        store_factory, error, signatures.get(file_path, None)
+                    )
+                elif documents is not None and not isinstance(documents, list):
+                    documents = self._isave_failed_file(
+                        store_factory, documents, signatures.get(file_path, None)
+                    )
+
+                yield file_path, documents, error
+
     def load_documents(
         self,
         source_dir: str,
-        ignored_files: List[str] = [],
-        limit: int = _RUN_TASKS_LIMIT,
+        ignored_files: set[str] = set(),
+        limit: int | None = None,
     ) -> Tuple[List[Document], List[any]]:
         """
         Loads all documents from the source documents directory, ignoring specified files
         """
-        all_files = []
-        for ext in _LOADER_MAPPING:
-            all_files.extend(
-                glob.glob(os.path.join(source_dir, f"**/*{ext}"), recursive=True)
-            )
+        results = []
+        errors = []
+        for _, documents, error in self.iload_documents(
+            source_dir, ignored_files=ignored_files, limit=limit
+        ):
+            if error is not None:
+                errors.append(error)
+            elif documents:
+                results.extend(documents)
+
+        return results, errors
+
+    def iload_documents(
+        self,
+        source_dir: str,
+        ignored_files: set[str] = set(),
+        limit: int | None = None,
+    ) -> Iterator[Tuple[str, List[Document] | None, Exception | None]]:
+        """
+        Lazy version of load_documents()
+        """
         filtered_files = [
-            file_path for file_path in all_files if file_path not in ignored_files
+            file_path
+            for file_path in self.find_files(source_dir)
+            if file_path not in ignored_files
         ]
 
+        yield from self.iload_files(
+            filtered_files, limit=limit, desc=f"Loading {os.path.basename(source_dir)}"
+        )
+
+    def find_files(self, source_dir: str) -> Iterator[str]:
+        """
+        Yields the supported files of the directory (single pass over the directory tree)
+        """
+        loader_config = self.config.get("loader", None) or {}
+
+        yield from iwalk_files(
+            source_dir,
+            extensions=_LOADER_MAPPING.keys(),
+            include=loader_config.get("include", None),
+            exclude=loader_config.get("exclude", None),
+        )
+
+    def detect_source_changes(
+        self,
+        source_dir: str,
+        source_files: Dict[str, Dict[str, Any]],
+        studied_sources: set[str],
+        failed_files: Dict[str, Dict[str, Any]] = {},
+    ) -> "SourceChanges":
+        """
+        Compare the files in the directory with the index of source files (size, mtime and
+        content hash). The content is only hashed when size or mtime changed. Files that
+        failed to load with the same content are skipped.
+        """
+        source_changes = SourceChanges()
+        found_files = set()
+        new_files = []
+
+        for file_path in self.find_files(source_dir):
+            found_files.add(file_path)
+            try:
+                file_stat = os.stat(file_path)
+            except OSError as err:
+                logging.warning(f"Error reading file {file_path}: {str(err)}")
+                continue
+
+            source_file = source_files.get(file_path, None)
+            is_studied = file_path in studied_sources
+            if (
+                is_studied
+                and source_file
+                and source_file["size"] == file_stat.st_size
+                and source_file["mtime_ns"] == file_stat.st_mtime_ns
+            ):
+                source_changes.unchanged += 1
+                continue
+
+            signature = {
+                "source": file_path,
+                "size": file_stat.st_size,
+                "mtime_ns": file_stat.st_mtime_ns,
+            }
+
+            # Failed files with the same size and mtime are skipped without hashing them
+            failed_file = None if is_studied else failed_files.get(file_path, None)
+            if (
+                failed_file
+                and failed_file.get("size", None) == file_stat.st_size
+                and failed_file.get("mtime_ns", None) == file_stat.st_mtime_ns
+            ):
+                signature["content_hash"] = failed_file["content_hash"]
+                source_changes.failed.append(signature)
+                continue
+
+            signature["content_hash"] = get_file_hash(file_path)
+
+            if failed_file and failed_file["content_hash"] == signature["content_hash"]:
+                source_changes.failed.append(signature)
+            elif is_studied and (
+                not source_file
+                or source_file["content_hash"] == signature["content_hash"]
+            ):
+                source_changes.touched.append(signature)
+            elif is_studied or source_file:
+                source_changes.modified.append(signature)
+            else:
+                new_files.append(signature)
+
+        # Files of the directory that are not found anymore
+        missing_sources = {
+            source
+            for source in set(source_files) | studied_sources
+            if self.is_in_directory(source, source_dir) and source not in found_files
+        }
+
+        # Renamed files: the content of a new file matches a missing studied file
+        missing_hashes = {
+            source_files[source]["content_hash"]: source
+            for source in missing_sources
+            if source in source_files and source in studied_sources
+        }
+        for signature in new_files:
+            old_source = missing_hashes.pop(signature["content_hash"], None)
+            if old_source:
+                source_changes.renamed.append((old_source, signature))
+                missing_sources.discard(old_source)
+            else:
+                source_changes.new.append(signature)
+
+        source_changes.removed = sorted(missing_sources)
+
+        return source_changes
+
+    def apply_source_changes(
+        self,
+        source_changes: "SourceChanges",
+        status_store: StatusStore,
+        store_factory: StoreFactory,
+    ):
+        chunks_store = None
+        if source_changes.modified or source_changes.renamed or source_changes.removed:
+            chunks_store = store_factory.get_vector_store()
+
+        try:
+            for signature in source_changes.touched + source_changes.new:
+                status_store.set_source_file(**signature)
+
+            for signature in source_changes.modified:
+                chunks_store.delete_by_source(signature["source"])
+                status_store.delete_studied_document(signature["source"])
+                status_store.delete_failed_file(signature["source"])
+                status_store.set_source_file(**signature)
+
+            for old_source, signature in source_changes.renamed:
+                chunks_store.update_source(old_source, signature["source"])
+                status_store.rename_studied_document(
+                    old_source,
+                    new_id=signature["source"],
+                    new_source=signature["source"],
+                )
+                status_store.delete_source_file(old_source)
+                status_store.set_source_file(**signature)
+
+            for source in source_changes.removed:
+                chunks_store.delete_by_source(source)
+                status_store.delete_studied_document(source)
+                status_store.delete_source_file(source)
+                status_store.delete_failed_file(source)
+        finally:
+            if chunks_store:
+                chunks_store.close()
+
+    @staticmethod
+    def is_in_directory(file_path: str, directory: str) -> bool:
+        return file_path.startswith(os.path.join(directory, ""))
+
+    def iload_files(
+        self,
+        filtered_files: List[str],
+        limit: int | None = None,
+        desc: str = "Loading",
+        lazy: bool = False,
+        content_hashes: Dict[str, str] = None,
+    ) -> Iterator[Tuple[str, Iterable[Document] | None, Exception | None]]:
+        """
+        Load the files in pools of workers (processes for slow parsers and threads for cheap
+        formats) in the order decided by LoadScheduler. Files are submitted as the results are
+        consumed, so a slow consumer stops the loading (backpressure).
+        With lazy=True, the files of the extensions with 'lazy' enabled (PDF by default) are
+        yielded as an iterator of their parts (pages), parsed in a worker process (with the
+        same timeout and memory limit) while the caller consumes them. Errors of these files
+        are raised by the iterator.
+        Files found in the parsed document cache (by content hash) are not parsed again
+        """
         if len(filtered_files) == 0:
-            return [], []
+            return
 
         # Limit number of tasks to run
-        if not limit or not 0 < limit <= _RUN_TASKS_LIMIT:
-            limit = _RUN_TASKS_LIMIT
-        if len(filtered_files) > limit:
+        if limit and len(filtered_files) > limit:
             logging.warning(
                 f"Number of documents to load cut to limit {limit} (out of {len(filtered_files)})"
             )
             filtered_files = filtered_files[:limit]
 
         # Emit start event (show progress bar in UI)
-        self.emit(
-            "start", len(filtered_files), desc=f"Loading {os.path.basename(source_dir)}"
-        )
+        self.emit("start", len(filtered_files), desc=desc)
 
-        results = []
-        errors = []
-        max_workers = max(1, os.cpu_count() // 2)
-        with ProcessPoolExecutor(max_workers=max_workers) as executor:
-            response_futures = [
-                executor.submit(DocumentLoader.load_single_document, file_argument)
-                for file_argument in filtered_files
-            ]
-
-            for response_future in as_completed(response_futures):
+        loader_config = self.config.get("loader", None) or {}
+        loader_kwargs = self.get_loader_kwargs(self.config)
+
+        # Split the files found in the parsed document cache
+        parsed_cache = self.get_parsed_document_cache()
+        cache_keys: Dict[str, Tuple[str, str]] = {}
+        cached_files = deque()
+        files_to_parse = filtered_files
+        if parsed_cache is not None:
+            content_hashes = content_hashes or {}
+            files_to_parse = []
+            for file_path in filtered_files:
                 try:
-                    response = response_future.result()
-                    if response:
-                        results.extend(response)
+                    cache_keys[file_path] = (
+                        content_hashes.get(file_path, None) or get_file_hash(file_path),
+                        self.get_loader_key(file_path, loader_kwargs),
+                    )
                 except Exception as err:
-                    errors.append(err)
+                    logging.warning(f"Error reading file {file_path}: {str(err)}")
+                    files_to_parse.append(file_path)
+                    continue
+
+                if parsed_cache.has(*cache_keys[file_path]):
+                    cached_files.append(file_path)
+                else:
+                    files_to_parse.append(file_path)
+
+            if len(cached_files) > 0:
+                logging.info(
+                    f"{len(cached_files)} documents found in the parsed document cache"
+                )
+
+        scheduler = LoadScheduler(files_to_parse, loader_config, lazy=lazy)
+
+        max_workers = int(loader_config.get("max_workers", None) or 0)
+        if max_workers < 1:
+            max_workers = max(1, os.cpu_count() // 2)
+        thread_workers = max(
+            1, int(loader_config.get("thread_workers", None) or DEFAULT_THREAD_WORKERS)
+        )
+
+        transcription_config = loader_config.get("transcription", None) or {}
+        transcription_workers = max(
+            1,
+            int(
+                transcription_config.get("workers", None)
+                or DEFAULT_TRANSCRIPTION_WORKERS
+            ),
+        )
+
+        load_task = functools.partial(
+            DocumentLoader.load_single_document, loader_kwargs=loader_kwargs
+        )
+        pools = {
+            EXECUTOR_PROCESS: LoadPool(
+                load_task,
+                max_workers=max_workers,
+                use_processes=True,
+                max_memory_mb=loader_config.get("max_memory_mb", DEFAULT_MAX_MEMORY_MB),
+                max_tasks_per_child=loader_config.get(
+                    "max_tasks_per_child", DEFAULT_MAX_TASKS_PER_CHILD
+                ),
+            ),
+            EXECUTOR_THREAD: LoadPool(
+                load_task,
+                max_workers=thread_workers,
+                use_processes=False,
+            ),
+            # The workers are not recycled, so the speech recognition model is loaded once
+            EXECUTOR_TRANSCRIPTION: LoadPool(
+                load_task,
+                max_workers=transcription_workers,
+                use_processes=True,
+                max_memory_mb=transcription_config.get("max_memory_mb", 0),
+                max_tasks_per_child=0,
+            ),
+        }
+        # Lazy files are parsed in a worker process too, with the same limits
+        lazy_worker = LazyLoadWorker(
+            functools.partial(
+                DocumentLoader.lazy_load_single_document, loader_kwargs=loader_kwargs
+            ),
+            max_memory_mb=loader_config.get("max_memory_mb", DEFAULT_MAX_MEMORY_MB),
+            max_tasks_per_child=loader_config.get(
+                "max_tasks_per_child", DEFAULT_MAX_TASKS_PER_CHILD
+            ),
+        )
+        # Number of files loaded ahead of the consumer in each pool
+        max_pending = {
+            EXECUTOR_PROCESS: max_workers * 2,
+            EXECUTOR_THREAD: thread_workers * 2,
+            EXECUTOR_TRANSCRIPTION: transcription_workers * 2,
+        }
+
+        def submit_available():
+            for executor_name, pool in pools.items():
+                while len(pool) < max_pending[executor_name]:
+                    file_path = scheduler.pop_next(executor_name)
+                    if file_path is None:
+                        break
+                    pool.submit(file_path, timeout=scheduler.get_timeout(file_path))
+
+        try:
+            while True:
+                submit_available()
+
+                done_files = []
+                for pool in pools.values():
+                    done_files.extend(pool.pop_results())
+
+                if len(done_files) == 0:
+                    # Cached files are read while the pools keep loading ahead
+                    if len(cached_files) > 0:
+                        file_path = cached_files.popleft()
+                        documents, error = (
+                            self._iget_cached_documents(
+                                parsed_cache, cache_keys[file_path], file_path
+                            ),
+                            None,
+                        )
+                        if not lazy:
+                            try:
+                                documents = list(documents)
+                            except Exception as err:
+                                documents, error = None, err
+
+                        self.emit("update")
+                        yield file_path, documents, error
+                        continue
+
+                    # Lazy files are parsed while the caller consumes them, and the pools
+                    # keep loading ahead
+                    file_path = scheduler.pop_next(EXECUTOR_LAZY)
+                    if file_path is not None:
+                        documents = lazy_worker.iload(
+                            file_path, timeout=scheduler.get_timeout(file_path)
+                        )
+                        if file_path in cache_keys:
+                            documents = parsed_cache.iset(
+                                *cache_keys[file_path], documents
+                            )
+
+                        yield file_path, documents, None
+                        scheduler.done(file_path)
+                        self.emit("update")
+                        continue
+
+                    pending_futures = [
+                        future for pool in pools.values() for future in pool.futures
+                    ]
+                    if not pending_futures:
+                        break
+
+                    # Wait for the first file loaded (or the first timeout)
+                    deadlines = [
+                        deadline
+                        for deadline in [
+                            pool.get_next_deadline() for pool in pools.values()
+                        ]
+                        if deadline is not None
+                    ]
+                    wait(
+                        pending_futures,
+                        timeout=min(deadlines) if deadlines else None,
+                        return_when=FIRST_COMPLETED,
+                    )
                     continue
-                finally:
+
+                for file_path, documents, error in done_files:
+                    scheduler.done(file_path)
+
+                    if error is None and file_path in cache_keys:
+                        try:
+                            parsed_cache.set(*cache_keys[file_path], documents)
+                        except Exception as err:
+                            logging.warning(
+                                f"Error saving parsed document {file_path}: {str(err)}"
+                            )
+
                     self.emit("update")
+                    yield file_path, documents, error
+        finally:
+            for pool in pools.values():
+                pool.shutdown()
+            lazy_worker.shutdown()
 
         self.emit("end")
-        return results, errors
+
+    @staticmethod
+    def save_failed_file(
+        store_factory: StoreFactory,
+        error: DocumentLoadError,
+        signature: Dict[str, Any] | None = None,
+    ):
+        """
+        Saves the failed file with its signature {size, mtime_ns, content_hash}, the file is
+        skipped until it changes
+        """
+        logging.warning(f"{str(error)}. The file is skipped until it changes")
+        try:
+            if not signature:
+                file_stat = os.stat(error.file_path)
+                signature = {
+                    "size": file_stat.st_size,
+                    "mtime_ns": file_stat.st_mtime_ns,
+                    "content_hash": get_file_hash(error.file_path),
+                }
+            with store_factory.get_status_store() as status_store:
+                status_store.set_failed_file(
+                    error.file_path,
+                    signature["content_hash"],
+                    error.message,
+                    size=signature["size"],
+                    mtime_ns=signature["mtime_ns"],
+                )
+        except Exception as e:
+            logging.warning(f"Error saving failed file {error.file_path}: {str(e)}")
+
+    @staticmethod
+    def start_study_run(status_store: StatusStore, num_files: int) -> int | None:
+        """
+        Resume the last run if it was interrupted, or start a new one. Returns the run id
+        """
+        study_run = status_store.get_last_study_run(unfinished=True)
+        if study_run:
+            logging.info(
+                f"Resuming the study run started at {study_run['started_at']}: "
+                f"{study_run['studied_files']} files studied, {num_files} pending"
+            )
+            status_store.resume_study_run(study_run["id"], num_files)
+            return study_run["id"]
+
+        if num_files == 0:
+            return None
+
+        return status_store.start_study_run(num_files)
+
+    def save_checkpoint(
+        self,
+        studied_files: int,
+        failed_files: int = 0,
+        status_store: StatusStore | None = None,
+    ):
+        """
+        Save the progress of the run after a batch of files is studied
+        """
+        if self.study_run_id is None:
+            return
+
+        if status_store is not None:
+            status_store.checkpoint_study_run(
+                self.study_run_id, studied_files, failed_files
+            )
+        else:
+            with StoreFactory(self.config).get_status_store() as status_store:
+                status_store.checkpoint_study_run(
+                    self.study_run_id, studied_files, failed_files
+                )
+
+    def finish_study_run(self, status_store: StatusStore | None = None):
+        """
+        Mark the run as finished, unless some files were left for the next run by the limit
+        """
+        if self.study_run_id is None or self.is_limited:
+            return
+
+        if status_store is not None:
+            status_store.finish_study_run(self.study_run_id)
+        else:
+            with StoreFactory(self.config).get_status_store() as status_store:
+                status_store.finish_study_run(self.study_run_id)
+
+        self.study_run_id = None
 
     @classmethod
-    def load_single_document(cls, file_path: str) -> List[Document]:
-        ext = "." + file_path.rsplit(".", 1)[-1]
-        if ext in _LOADER_MAPPING:
-            loader_class, loader_args = _LOADER_MAPPING[ext]
-            loader = loader_class(file_path, **loader_args)
-            documents = loader.load()
+    def _isave_failed_file(
+        cls,
+        store_factory: StoreFactory,
+        documents: Iterator[Document],
+        signature: Dict[str, Any] | None = None,
+    ) -> Iterator[Document]:
+        try:
+            yield from documents
+        except DocumentLoadError as err:
+            cls.save_failed_file(store_factory, err, signature)
+            raise
+
+    def get_parsed_document_cache(self) -> ParsedDocumentCacheStore | None:
+        loader_config = self.config.get("loader", None) or {}
+        cache_config = loader_config.get("cache", None) or {}
+        if not cache_config.get("enabled", False):
+            return None
+
+        try:
+            return StoreFactory(self.config).get_parsed_document_cache_store()
+        except Exception as e:
+            logging.warning(
+                f"Error opening the parsed document cache, documents are parsed without cache: {str(e)}"
+            )
+            return None
+
+    @staticmethod
+    def get_loader_key(
+        file_path: str, loader_kwargs: Dict[str, Dict[str, Any]] = None
+    ) -> str:
+        ext = os.path.splitext(file_path)[1].lower()
+        if ext not in _LOADER_MAPPING:
+            raise ValueError(f"Unsupported file extension '{ext}'")
+
+        loader_class, loader_args = _LOADER_MAPPING[ext]
+        loader_args = {**loader_args, **(loader_kwargs or {}).get(ext, {})}
+        return ParsedDocumentCacheStore.get_loader_key(
+            loader_class, json.dumps(loader_args, sort_keys=True)
+        )
+
+    @staticmethod
+    def _iget_cached_documents(
+        parsed_cache: ParsedDocumentCacheStore,
+        cache_key: Tuple[str, str],
+        file_path: str,
+    ) -> Iterator[Document]:
+        try:
+            yield from parsed_cache.iget(*cache_key, source=file_path)
+        except Exception:
+            # Remove the broken entry, so the file is parsed again in the next run
+            parsed_cache.delete(*cache_key)
+            raise
+
+    @classmethod
+    def load_single_document(
+        cls, file_path: str, loader_kwargs: Dict[str, Dict[str, Any]] = None
+    ) -> List[Document]:
+        loader = cls._get_loader(file_path, loader_kwargs)
+        documents = loader.load()
+
+        return documents
+
+    @classmethod
+    def lazy_load_single_document(
+        cls, file_path: str, loader_kwargs: Dict[str, Dict[str, Any]] = None
+    ) -> Iterator[Document]:
+        loader = cls._get_loader(file_path, loader_kwargs)
+        yield from loader.lazy_load()
+
+    @staticmethod
+    def get_loader_kwargs(config: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+        """
+        Arguments of the loaders from the config, per file extension (added to the arguments
+        of _LOADER_MAPPING)
+        """
+        loader_config = config.get("loader", None) or {}
+        transcription_config = loader_config.get("transcription", None) or {}
+
+        transcription_kwargs = {
+            "device": transcription_config.get("device", None) or "cpu",
+            "lang_model": transcription_config.get("lang_model", None)
+            or DEFAULT_LANG_MODEL,
+            "window_seconds": transcription_config.get(
+                "window_seconds", DEFAULT_WINDOW_SECONDS
+            ),
+            "batch_size": transcription_config.get(
+                "batch_size", DEFAULT_TRANSCRIPTION_BATCH_SIZE
+            ),
+        }
+        if transcription_config.get("cache", True) and config.get(
+            "_project_base_path", None
+        ):
+            transcription_kwargs["cache_directory"] = str(
+                Path(config["_project_base_path"], Config._PROJECT_STORE_DIRECTORYNAME)
+            )
+
+        return {
+            extension: transcription_kwargs
+            for extension, (loader_class, _) in _LOADER_MAPPING.items()
+            if loader_class is OpenAIWhisperLoader
+        }
 
-            return documents
+    @staticmethod
+    def _get_loader(
+        file_path: str, loader_kwargs: Dict[str, Dict[str, Any]] = None
+    ) -> BaseLoader:
+        ext = os.path.splitext(file_path)[1].lower()
+        if ext not in _LOADER_MAPPING:
+            raise ValueError(f"Unsupported file extension '{ext}'")
 
-        raise ValueError(f"Unsupported file extension '{ext}'")
+        loader_class, loader_args = _LOADER_MAPPING[ext]
+        loader_args = {**loader_args, **(loader_kwargs or {}).get(ext, {})}
+        return loader_class(file_path, **loader_args)
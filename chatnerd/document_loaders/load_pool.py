@@ -0,0 +1,546 @@
+import os
+import sys
+import time
+import queue
+import signal
+import logging
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from chatnerd.lib.helpers import process_memory_limit
+
+DEFAULT_MAX_MEMORY_MB = 4096  # Maximum address space of a worker process (in MB)
+DEFAULT_MAX_TASKS_PER_CHILD = (
+    50  # Files loaded by a worker process before it is replaced
+)
+_KILL_TIMEOUT_FACTOR = (
+    2  # Processes are killed when a file exceeds this factor of the timeout
+)
+_LAZY_QUEUE_SIZE = 4  # Parts of a lazy file parsed ahead of the caller
+_LAZY_POLL_INTERVAL = 0.5  # Seconds between checks that the lazy worker is alive
+_START_POLL_INTERVAL = 0.5  # Seconds between checks that the files waiting have started
+
+
+class DocumentLoadError(Exception):
+    """
+    Error loading a file (parser error, timeout or memory limit). The file is recorded in the
+    status store and skipped in the next runs until its content changes
+    """
+
+    def __init__(self, file_path: str, message: str):
+        super().__init__(file_path, message)
+        self.file_path = file_path
+        self.message = message
+
+    def __str__(self):
+        return f"Error loading {self.file_path}: {self.message}"
+
+
+def _init_worker(max_memory_bytes: int, pids: Any = None):
+    # Report the pid, so the pool can kill the worker (the executor keeps its processes private)
+    if pids is not None:
+        try:
+            pids.send(os.getpid())
+        except OSError:
+            pass  # The pool is already gone
+
+    if max_memory_bytes > 0:
+        try:
+            process_memory_limit(max_memory_bytes)
+        except Exception as e:
+            logging.warning(f"Could not limit the memory of the loader: {str(e)}")
+
+
+def _run_task(task: Callable[[str], Any], file_path: str, timeout: Optional[float]):
+    # Interrupt the task with an alarm signal (only in the main thread of a worker process)
+    if (
+        not timeout
+        or not hasattr(signal, "SIGALRM")
+        or threading.current_thread() is not threading.main_thread()
+    ):
+        return task(file_path)
+
+    def on_timeout(signum, frame):
+        raise TimeoutError(f"Timeout after {timeout} seconds")
+
+    previous_handler = signal.signal(signal.SIGALRM, on_timeout)
+    signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        return task(file_path)
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous_handler)
+
+
+def _run_lazy_worker(
+    task: Callable[[str], Iterable[Any]],
+    max_memory_bytes: int,
+    tasks: multiprocessing.Queue,
+    results: multiprocessing.Queue,
+):
+    _init_worker(max_memory_bytes)
+    results.put(("ready", None))
+    while True:
+        file_path = tasks.get()
+        if file_path is None:
+            return
+
+        try:
+            for part in task(file_path):
+                results.put(("part", part))
+            results.put(("end", None))
+        except BaseException as e:
+            results.put(("error", f"{type(e).__name__}: {str(e)}"))
+
+
+class LazyLoadWorker:
+    """
+    Worker process parsing files lazily for the caller (ex. the pages of a PDF). The parts are
+    sent back one by one through a bounded queue. The worker runs with the memory limit of the
+    LoadPool processes, and the timeout counts the time the caller waits for the parts (not the
+    time it spends consuming them). The worker is killed and replaced when a file times out,
+    kills it, or is not consumed until its end
+    """
+
+    def __init__(
+        self,
+        task: Callable[[str], Iterable[Any]],
+        max_memory_mb: float = DEFAULT_MAX_MEMORY_MB,
+        max_tasks_per_child: int = DEFAULT_MAX_TASKS_PER_CHILD,
+    ):
+        self.task = task
+        self.max_memory_bytes = int(float(max_memory_mb or 0) * 1024**2)
+        self.max_tasks_per_child = int(max_tasks_per_child or 0)
+
+        self._process: multiprocessing.Process = None
+        self._tasks: multiprocessing.Queue = None
+        self._results: multiprocessing.Queue = None
+        self._num_tasks = 0
+
+    def iload(self, file_path: str, timeout: Optional[float] = None) -> Iterator[Any]:
+        """
+        The parts of the file. Errors, timeouts and crashes of the worker are raised as
+        DocumentLoadError
+        """
+        if self._process is None or not self._process.is_alive():
+            try:
+                self._start()
+            except Exception as e:
+                raise DocumentLoadError(file_path, str(e)) from e
+        self._tasks.put(file_path)
+        self._num_tasks += 1
+
+        is_finished = False
+        waited_seconds = 0.0
+        try:
+            while True:
+                started_at = time.monotonic()
+                try:
+                    kind, value = self._results.get(timeout=_LAZY_POLL_INTERVAL)
+                except queue.Empty:
+                    waited_seconds += time.monotonic() - started_at
+                    if timeout and waited_seconds >= timeout:
+                        raise DocumentLoadError(
+                            file_path, f"Timeout after {timeout} seconds"
+                        )
+                    if not self._process.is_alive():
+                        raise DocumentLoadError(
+                            file_path,
+                            f"Loader process exited with code {self._process.exitcode}",
+                        )
+                    continue
+                waited_seconds += time.monotonic() - started_at
+
+                if kind == "part":
+                    yield value
+                    continue
+
+                is_finished = True
+                if kind == "error":
+                    raise DocumentLoadError(file_path, value)
+                return
+        finally:
+            if not is_finished:
+                # The worker is still parsing the file (or dead)
+                self._stop(kill=True)
+            elif (
+                self.max_tasks_per_child and self._num_tasks >= self.max_tasks_per_child
+            ):
+                self._stop()
+
+    def shutdown(self):
+        self._stop(kill=True)
+
+    def _start(self):
+        self._stop(kill=True)
+
+        # Fresh worker process (not forked), like the LoadPool processes
+        context = multiprocessing.get_context("spawn")
+        self._tasks = context.Queue()
+        self._results = context.Queue(maxsize=_LAZY_QUEUE_SIZE)
+        self._process = context.Process(
+            target=_run_lazy_worker,
+            args=(self.task, self.max_memory_bytes, self._tasks, self._results),
+            daemon=True,
+        )
+        self._process.start()
+        self._num_tasks = 0
+
+        # The start of the process does not count in the timeout of the first file
+        while True:
+            try:
+                self._results.get(timeout=_LAZY_POLL_INTERVAL)
+                return
+            except queue.Empty:
+                if not self._process.is_alive():
+                    raise RuntimeError(
+                        f"Loader process exited with code {self._process.exitcode}"
+                    )
+
+    def _stop(self, kill: bool = False):
+        if self._process is None:
+            return
+
+        if kill:
+            self._process.terminate()
+        else:
+            self._tasks.put(None)
+        self._process.join(timeout=5)
+        if self._process.is_alive():
+            self._process.kill()
+            self._process.join()
+
+        for process_queue in [self._tasks, self._results]:
+            process_queue.close()
+            process_queue.cancel_join_thread()
+        self._process = None
+        self._tasks = None
+        self._results = None
+
+
+class _WorkerPids:
+    """
+    Pids of the worker processes of a pool, reported by the workers when they start
+    """
+
+    def __init__(self, context: Any):
+        # A pipe without lock: the small messages of the workers are written atomically
+        self.reader, self.writer = context.Pipe(duplex=False)
+        self.pids = set()
+
+    def update(self):
+        # Read the pids reported by the new workers (replaced after max_tasks_per_child)
+        try:
+            while self.reader.poll():
+                self.pids.add(self.reader.recv())
+        except (EOFError, OSError):
+            pass
+
+    def get_processes(self) -> List[multiprocessing.Process]:
+        """
+        The live worker processes (a pid of an exited worker is never killed)
+        """
+        self.update()
+        return [
+            process
+            for process in multiprocessing.active_children()
+            if process.pid in self.pids
+        ]
+
+    def close(self):
+        self.reader.close()
+        self.writer.close()
+
+
+class LoadPool:
+    """
+    Pool of workers (processes or threads) loading files with a wall-clock timeout per file.
+    Worker processes run with a cap of their address space (RLIMIT_AS) and are replaced after
+    max_tasks_per_child files or after a memory error. A file that times out in a process is
+    interrupted by an alarm signal, and if it does not stop, its workers are killed and the
+    other files in flight are loaded again. When a worker dies, the files in flight are loaded
+    again one by one in an isolated worker, so only the file that kills it fails. Threads can
+    not be killed, so a thread that times out is abandoned.
+    """
+
+    def __init__(
+        self,
+        task: Callable[[str], Any],
+        max_workers: int,
+        use_processes: bool = True,
+        max_memory_mb: float = DEFAULT_MAX_MEMORY_MB,
+        max_tasks_per_child: int = DEFAULT_MAX_TASKS_PER_CHILD,
+    ):
+        self.task = task
+        self.max_workers = max_workers
+        self.use_processes = use_processes
+        self.max_memory_bytes = int(float(max_memory_mb or 0) * 1024**2)
+        self.max_tasks_per_child = int(max_tasks_per_child or 0)
+
+        self._executor: Executor = None
+        self._isolated_executor: Executor = None
+        self._retired_executors: List[Executor] = []
+        # executor -> pids of its worker processes
+        self._executor_pids: Dict[Executor, _WorkerPids] = {}
+        # future -> (file_path, timeout, executor)
+        self._futures: Dict[Future, Tuple[str, Optional[float], Executor]] = {}
+        self._started_at: Dict[Future, float] = {}
+        self._suspects = deque()  # (file_path, timeout) to load in the isolated worker
+
+    def __len__(self) -> int:
+        return len(self._futures) + len(self._suspects)
+
+    @property
+    def futures(self) -> List[Future]:
+        return list(self._futures)
+
+    def submit(self, file_path: str, timeout: Optional[float] = None):
+        if self._executor is None:
+            self._executor = self._create_executor(self.max_workers)
+
+        self._submit_to(self._executor, file_path, timeout)
+
+    def get_next_deadline(self) -> Optional[float]:
+        """
+        Seconds until the first running file times out (None without timeouts). The files
+        not started yet are checked again after a short interval
+        """
+        now = time.monotonic()
+        next_deadline = None
+        for future, (_, timeout, _) in self._futures.items():
+            if timeout is None:
+                continue
+
+            if future not in self._started_at:
+                if not future.running() and not future.done():
+                    next_deadline = min(
+                        next_deadline or _START_POLL_INTERVAL, _START_POLL_INTERVAL
+                    )
+                    continue
+                self._started_at[future] = now
+
+            deadline = max(
+                0.0, self._started_at[future] + self._kill_timeout(timeout) - now
+            )
+            if next_deadline is None or deadline < next_deadline:
+                next_deadline = deadline
+
+        return next_deadline
+
+    def pop_results(self) -> List[Tuple[str, Any, Exception | None]]:
+        """
+        Returns a tuple (file_path, result, error) per finished file: completed, failed or
+        timed out
+        """
+        results = []
+        recycle = False
+
+        for future in [future for future in self._futures if future.done()]:
+            file_path, timeout, executor = self._futures.pop(future)
+            self._started_at.pop(future, None)
+
+            error = future.exception()
+            if isinstance(error, BrokenProcessPool):
+                if executor is self._isolated_executor:
+                    # The file killed the isolated worker
+                    self._forget(executor)
+                    self._isolated_executor = None
+                    results.append(
+                        (file_path, None, self._get_load_error(file_path, error))
+                    )
+                else:
+                    self._suspects.append((file_path, timeout))
+                    recycle = recycle or executor is self._executor
+            elif error is not None:
+                results.append(
+                    (file_path, None, self._get_load_error(file_path, error))
+                )
+                # Replace the workers after a memory error
+                recycle = recycle or (
+                    isinstance(error, MemoryError) and executor is self._executor
+                )
+            else:
+                results.append((file_path, future.result(), None))
+
+        if recycle:
+            self._retire(self._executor)
+            self._executor = None
+
+        results.extend(self._pop_timed_out())
+
+        for worker_pids in self._executor_pids.values():
+            worker_pids.update()
+
+        self._submit_suspect()
+
+        # Forget the retired pools without files in flight (their workers exit by themselves)
+        for executor in self._retired_executors:
+            if not any(owner is executor for _, _, owner in self._futures.values()):
+                self._forget(executor)
+        self._retired_executors = [
+            executor
+            for executor in self._retired_executors
+            if executor in self._executor_pids
+        ]
+
+        return results
+
+    def shutdown(self):
+        # Kill the workers of the files still in flight (ex. the caller stopped early)
+        for executor in [
+            self._executor,
+            self._isolated_executor,
+        ] + self._retired_executors:
+            if executor is None:
+                continue
+            if any(owner is executor for _, _, owner in self._futures.values()):
+                self._kill(executor)
+            else:
+                executor.shutdown(wait=False, cancel_futures=True)
+
+        self._executor = None
+        self._isolated_executor = None
+        self._retired_executors = []
+        for executor in list(self._executor_pids):
+            self._forget(executor)
+        self._futures.clear()
+        self._started_at.clear()
+        self._suspects.clear()
+
+    def _submit_to(self, executor: Executor, file_path: str, timeout: Optional[float]):
+        future = executor.submit(_run_task, self.task, file_path, timeout)
+        self._futures[future] = (file_path, timeout if timeout else None, executor)
+
+    def _submit_suspect(self):
+        # Load the suspects one by one
+        if not self._suspects or any(
+            owner is self._isolated_executor for _, _, owner in self._futures.values()
+        ):
+            return
+
+        if self._isolated_executor is None:
+            self._isolated_executor = self._create_executor(1)
+
+        file_path, timeout = self._suspects.popleft()
+        self._submit_to(self._isolated_executor, file_path, timeout)
+
+    def _pop_timed_out(self) -> List[Tuple[str, Any, Exception | None]]:
+        self.get_next_deadline()  # Register the files started since the last call
+
+        now = time.monotonic()
+        timed_out_futures = [
+            future
+            for future, (_, timeout, _) in self._futures.items()
+            if timeout is not None
+            and future in self._started_at
+            and now - self._started_at[future] >= self._kill_timeout(timeout)
+        ]
+        if not timed_out_futures:
+            return []
+
+        results = []
+        timed_out_executors = []
+        for future in timed_out_futures:
+            file_path, timeout, executor = self._futures.pop(future)
+            self._started_at.pop(future, None)
+            future.cancel()
+            if executor not in timed_out_executors:
+                timed_out_executors.append(executor)
+            results.append(
+                (
+                    file_path,
+                    None,
+                    DocumentLoadError(file_path, f"Timeout after {timeout} seconds"),
+                )
+            )
+
+        if not self.use_processes:
+            logging.warning(
+                f"{len(timed_out_futures)} loader threads timed out and keep running in background"
+            )
+            return results
+
+        # Kill the workers of the files, and load the other files in flight again
+        for executor in timed_out_executors:
+            in_flight = [
+                (future, file_path, timeout)
+                for future, (file_path, timeout, owner) in self._futures.items()
+                if owner is executor
+            ]
+            for future, _, _ in in_flight:
+                self._futures.pop(future)
+                self._started_at.pop(future, None)
+
+            self._kill(executor)
+            if executor is self._executor:
+                self._executor = None
+            if executor is self._isolated_executor:
+                self._isolated_executor = None
+
+            for _, file_path, timeout in in_flight:
+                self.submit(file_path, timeout)
+
+        return results
+
+    def _kill_timeout(self, timeout: float) -> float:
+        # Worker processes get the chance to stop the file by themselves
+        return timeout * _KILL_TIMEOUT_FACTOR if self.use_processes else timeout
+
+    def _create_executor(self, max_workers: int) -> Executor:
+        if not self.use_processes:
+            return ThreadPoolExecutor(max_workers=max_workers)
+
+        executor_kwargs = {}
+        if self.max_tasks_per_child > 0 and sys.version_info >= (3, 11):
+            executor_kwargs["max_tasks_per_child"] = self.max_tasks_per_child
+
+        # Fresh worker processes (not forked), so the memory limit does not count the memory
+        # of the main process
+        context = multiprocessing.get_context("spawn")
+        worker_pids = _WorkerPids(context)
+        executor = ProcessPoolExecutor(
+            max_workers=max_workers,
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=(self.max_memory_bytes, worker_pids.writer),
+            **executor_kwargs,
+        )
+        self._executor_pids[executor] = worker_pids
+        return executor
+
+    def _retire(self, executor: Executor):
+        # The running files finish in the old pool, then its workers exit
+        if executor is None:
+            return
+
+        executor.shutdown(wait=False)
+        self._retired_executors.append(executor)
+
+    def _kill(self, executor: Executor):
+        worker_pids = self._executor_pids.get(executor, None)
+        for process in worker_pids.get_processes() if worker_pids else []:
+            try:
+                process.terminate()
+            except Exception:
+                pass
+        self._forget(executor)
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def _forget(self, executor: Executor):
+        worker_pids = self._executor_pids.pop(executor, None)
+        if worker_pids is not None:
+            worker_pids.close()
+
+    @staticmethod
+    def _get_load_error(file_path: str, error: Exception) -> DocumentLoadError:
+        if isinstance(error, DocumentLoadError):
+            return error
+
+        load_error = DocumentLoadError(
+            file_path, f"{type(error).__name__}: {str(error)}"
+        )
+        load_error.__cause__ = error
+        return load_error
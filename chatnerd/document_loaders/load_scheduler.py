@@ -0,0 +1,132 @@
+import os
+import logging
+from collections import deque
+from typing import Any, Dict, Iterable, Optional
+
+EXECUTOR_PROCESS = "process"  # Pool of worker processes (slow parsers)
+EXECUTOR_THREAD = "thread"  # Pool of threads in the main process (cheap formats)
+EXECUTOR_TRANSCRIPTION = "transcription"  # Dedicated worker processes keeping the speech recognition model loaded
+EXECUTOR_LAZY = (
+    "lazy"  # Loaded part by part while the documents are consumed (lowest memory)
+)
+
+DEFAULT_THREAD_WORKERS = 4
+DEFAULT_TIMEOUT = 300  # Maximum number of seconds loading a single file
+
+# Default settings per file extension: executor, max_workers (files of the type loaded at the
+# same time), priority (higher first) and lazy (loaded page by page when the caller consumes the
+# documents as a stream). Overridden by 'loader.extensions' in the config file.
+_DEFAULT_EXTENSIONS_CONFIG = {
+    ".csv": {"executor": EXECUTOR_THREAD, "priority": 0},
+    ".m4a": {"executor": EXECUTOR_TRANSCRIPTION, "timeout": 3600},
+    ".mp3": {"executor": EXECUTOR_TRANSCRIPTION, "timeout": 3600},
+    ".pdf": {"lazy": True},
+    ".txt": {"executor": EXECUTOR_THREAD, "priority": 0},
+    ".wav": {"executor": EXECUTOR_TRANSCRIPTION, "timeout": 3600},
+}
+_DEFAULT_EXTENSION_CONFIG = {"executor": EXECUTOR_PROCESS, "priority": 1}
+
+
+class LoadScheduler:
+    """
+    Decides the order in which files are loaded: files of the types with higher priority go first
+    and, within the same priority, the largest files go first, so a few huge files do not hold up
+    the tail of the run. Each extension can be limited to a number of files loaded at the same time.
+    """
+
+    def __init__(
+        self,
+        file_paths: Iterable[str],
+        loader_config: Dict[str, Any] = None,
+        lazy: bool = False,
+    ):
+        loader_config = loader_config or {}
+        self.lazy = lazy
+        self.default_timeout = loader_config.get("timeout", DEFAULT_TIMEOUT)
+
+        self.extensions_config = {**_DEFAULT_EXTENSIONS_CONFIG}
+        for extension, extension_config in (
+            loader_config.get("extensions", None) or {}
+        ).items():
+            extension = str(extension).lower()
+            self.extensions_config[extension] = {
+                **self.extensions_config.get(extension, {}),
+                **(extension_config or {}),
+            }
+
+        # Queue of files per extension, sorted by size (largest first)
+        files_by_extension: Dict[str, list] = {}
+        for file_path in file_paths:
+            extension = os.path.splitext(file_path)[1].lower()
+            try:
+                file_size = os.path.getsize(file_path)
+            except OSError:
+                file_size = 0
+            files_by_extension.setdefault(extension, []).append((file_size, file_path))
+
+        self._queues: Dict[str, deque] = {
+            extension: deque(sorted(files, key=lambda item: item[0], reverse=True))
+            for extension, files in files_by_extension.items()
+        }
+        self._running: Dict[str, int] = {extension: 0 for extension in self._queues}
+
+    def get_extension_config(self, extension: str) -> Dict[str, Any]:
+        return {
+            **_DEFAULT_EXTENSION_CONFIG,
+            **self.extensions_config.get(extension, {}),
+        }
+
+    def get_executor(self, extension: str) -> str:
+        extension_config = self.get_extension_config(extension)
+        if self.lazy and extension_config.get("lazy", False):
+            return EXECUTOR_LAZY
+
+        executor = extension_config["executor"]
+        if executor not in [EXECUTOR_PROCESS, EXECUTOR_THREAD, EXECUTOR_TRANSCRIPTION]:
+            logging.warning(
+                f"Unknown executor '{executor}' for extension '{extension}', using '{EXECUTOR_PROCESS}'"
+            )
+            return EXECUTOR_PROCESS
+        return executor
+
+    def get_timeout(self, file_path: str) -> Optional[float]:
+        """
+        Maximum number of seconds loading the file (None: no timeout)
+        """
+        extension = os.path.splitext(file_path)[1].lower()
+        timeout = self.get_extension_config(extension).get(
+            "timeout", self.default_timeout
+        )
+        return float(timeout) if timeout else None
+
+    def pop_next(self, executor: str) -> Optional[str]:
+        """
+        Returns the next file to load in the executor, or None if no file can start now
+        """
+        next_extension = None
+        next_key = None
+        for extension, queue in self._queues.items():
+            if len(queue) == 0 or self.get_executor(extension) != executor:
+                continue
+
+            extension_config = self.get_extension_config(extension)
+            max_workers = extension_config.get("max_workers", None)
+            if max_workers and self._running[extension] >= int(max_workers):
+                continue
+
+            key = (int(extension_config.get("priority", 0)), queue[0][0])
+            if next_key is None or key > next_key:
+                next_extension, next_key = extension, key
+
+        if next_extension is None:
+            return None
+
+        self._running[next_extension] += 1
+        return self._queues[next_extension].popleft()[1]
+
+    def done(self, file_path: str):
+        extension = os.path.splitext(file_path)[1].lower()
+        self._running[extension] = max(0, self._running.get(extension, 0) - 1)
+
+    def __len__(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
@@ -1,48 +1,189 @@
 """Loads audio file transcription."""
 
 import os
-from typing import Iterator, List, Optional
+import json
+import logging
+import subprocess
+from functools import lru_cache
+from typing import Any, Iterator, List, Optional
+import numpy as np
 from langchain_core.documents import Document
-from langchain.document_loaders.base import BaseLoader
-from langchain.document_loaders.blob_loaders.file_system import FileSystemBlobLoader
-from langchain.document_loaders.generic import GenericLoader
-from langchain.document_loaders.parsers.audio import OpenAIWhisperParserLocal
+from langchain_core.document_loaders import BaseLoader
+from chatnerd.lib.helpers import get_file_hash
+from chatnerd.stores.parsed_document_cache_store import ParsedDocumentCacheStore
+
+DEFAULT_LANG_MODEL = "openai/whisper-base"
+DEFAULT_WINDOW_SECONDS = 30  # Whisper transcribes windows of up to 30 seconds
+DEFAULT_BATCH_SIZE = 8  # Number of windows transcribed in a single call to the model
+TRANSCRIPTS_DIRECTORY_NAME = "transcripts"
+_SAMPLING_RATE = 16_000  # Sampling rate expected by Whisper
+_BYTES_PER_SAMPLE = 4  # float32
+
+
+@lru_cache(maxsize=2)
+def get_transcriber(lang_model: str, device: str) -> Any:
+    """
+    Loads the speech recognition model once per process (the transcription worker is kept
+    alive between files)
+    """
+    from transformers import pipeline
+
+    logging.info(f"Loading transcription model {lang_model} on {device}...")
+    return pipeline("automatic-speech-recognition", model=lang_model, device=device)
 
 
-# source: https://github.com/langchain-ai/langchain/pull/8517/files
 class OpenAIWhisperLoader(BaseLoader):
     """Loads audio file transcription using OpenAI Whisper.
-    OpenAIWhisperParserLocal Source: langchain/document_loaders/parsers/audio.py"""
+    The audio is decoded by ffmpeg as a stream, split in fixed windows and the windows are
+    transcribed in batches, so long audio files are never decoded whole in memory.
+    With cache_directory, the transcripts are cached by the hash of the audio file and the
+    model, so the same audio is never transcribed twice."""
 
     def __init__(
         self,
         file_path: str,
         device: Optional[str] = "cpu",
-        lang_model: Optional[str] = "openai/whisper-base",
+        lang_model: Optional[str] = DEFAULT_LANG_MODEL,
+        window_seconds: float = DEFAULT_WINDOW_SECONDS,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        cache_directory: Optional[str] = None,
     ):
         """Initialize with file path."""
         self.file_path = file_path
-        self.device = device
-        self.lang_model = lang_model
+        self.device = device or "cpu"
+        self.lang_model = lang_model or DEFAULT_LANG_MODEL
+        self.window_seconds = float(window_seconds or DEFAULT_WINDOW_SECONDS)
+        self.batch_size = max(1, int(batch_size or DEFAULT_BATCH_SIZE))
+        self.cache_directory = cache_directory
+        self._duration_seconds = 0.0
         if "~" in self.file_path:
             self.file_path = os.path.expanduser(self.file_path)
 
-    def _get_loader(self) -> GenericLoader:
-        return GenericLoader(
-            FileSystemBlobLoader(
-                os.path.dirname(self.file_path), glob=os.path.basename(self.file_path)
-            ),
-            OpenAIWhisperParserLocal(device=self.device, lang_model=self.lang_model),
-        )
-
     def load(self) -> List[Document]:
         """Load audio transcription into Document objects."""
-        loader = self._get_loader()
-        return loader.load()
+        return list(self.lazy_load())
 
     def lazy_load(
         self,
     ) -> Iterator[Document]:
         """A lazy loader for Documents."""
-        loader = self._get_loader()
-        yield from loader.lazy_load()
+        transcript_cache = self._get_transcript_cache()
+        if transcript_cache is None:
+            yield self._transcribe()
+            return
+
+        cache_key = (get_file_hash(self.file_path), self._get_transcriber_key())
+        documents = transcript_cache.get(*cache_key, source=self.file_path)
+        if documents is None:
+            documents = [self._transcribe()]
+            transcript_cache.set(*cache_key, documents)
+
+        yield from documents
+
+    def _transcribe(self) -> Document:
+        transcriber = get_transcriber(self.lang_model, self.device)
+
+        texts = []
+        windows = []
+        for window in self._iread_windows():
+            windows.append({"raw": window, "sampling_rate": _SAMPLING_RATE})
+            if len(windows) >= self.batch_size:
+                texts.extend(self._transcribe_windows(transcriber, windows))
+                windows = []
+
+        if windows:
+            texts.extend(self._transcribe_windows(transcriber, windows))
+
+        return Document(
+            page_content="\n".join(text for text in texts if text),
+            metadata={
+                "source": self.file_path,
+                "duration": round(self._duration_seconds, 1),
+                "lang_model": self.lang_model,
+            },
+        )
+
+    def _transcribe_windows(self, transcriber: Any, windows: List[dict]) -> List[str]:
+        outputs = transcriber(windows, batch_size=self.batch_size)
+        return [str(output.get("text", "")).strip() for output in outputs]
+
+    def _iread_windows(self) -> Iterator[np.ndarray]:
+        """
+        Yields the audio as fixed windows of mono float32 samples at 16 kHz, decoded by ffmpeg
+        """
+        window_bytes = int(self.window_seconds * _SAMPLING_RATE) * _BYTES_PER_SAMPLE
+        command = [
+            "ffmpeg",
+            "-nostdin",
+            "-hide_banner",
+            "-loglevel",
+            "error",
+            "-i",
+            self.file_path,
+            "-ac",
+            "1",
+            "-ar",
+            str(_SAMPLING_RATE),
+            "-f",
+            "f32le",
+            "pipe:1",
+        ]
+        try:
+            process = subprocess.Popen(
+                command, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+            )
+        except FileNotFoundError as e:
+            raise ValueError(
+                "ffmpeg was not found, it is required to load audio files"
+            ) from e
+
+        self._duration_seconds = 0.0
+        is_complete = False
+        try:
+            while True:
+                window = process.stdout.read(window_bytes)
+                if not window:
+                    break
+                # Drop a trailing partial sample
+                window = window[: len(window) - len(window) % _BYTES_PER_SAMPLE]
+                self._duration_seconds += (
+                    len(window) / _BYTES_PER_SAMPLE / _SAMPLING_RATE
+                )
+                yield np.frombuffer(window, dtype=np.float32)
+            is_complete = True
+        finally:
+            process.stdout.close()
+            if not is_complete:
+                process.kill()
+            error = process.stderr.read().decode("utf-8", errors="replace").strip()
+            process.stderr.close()
+            return_code = process.wait()
+
+        if return_code != 0:
+            raise ValueError(f"Error decoding audio with ffmpeg: {error}")
+
+    def _get_transcriber_key(self) -> str:
+        return ParsedDocumentCacheStore.get_loader_key(
+            self.__class__,
+            json.dumps(
+                {"lang_model": self.lang_model, "window_seconds": self.window_seconds},
+                sort_keys=True,
+            ),
+        )
+
+    def _get_transcript_cache(self) -> ParsedDocumentCacheStore | None:
+        if not self.cache_directory:
+            return None
+
+        try:
+            # Transcripts are small and expensive: they are not evicted
+            return ParsedDocumentCacheStore(
+                self.cache_directory,
+                max_size_mb=0,
+                directory_name=TRANSCRIPTS_DIRECTORY_NAME,
+            )
+        except Exception as e:
+            logging.warning(
+                f"Error opening the transcript cache, transcripts are not cached: {str(e)}"
+            )
+            return None
@@ -0,0 +1,62 @@
+"""Loads PDF files page by page."""
+
+import io
+import os
+from typing import Iterator, List
+from langchain_core.documents import Document
+from langchain_core.document_loaders import BaseLoader
+from pdfminer.converter import TextConverter
+from pdfminer.layout import LAParams
+from pdfminer.pdfdocument import PDFDocument
+from pdfminer.pdfinterp import PDFPageInterpreter, PDFResourceManager
+from pdfminer.pdfpage import PDFPage
+from pdfminer.pdfparser import PDFParser
+from pdfminer.pdftypes import resolve1
+
+
+class PDFPageLoader(BaseLoader):
+    """Loads a PDF file with PDFMiner, one document per page. lazy_load() parses the pages
+    one at a time, so the text of the whole file is never held in memory."""
+
+    def __init__(self, file_path: str):
+        """Initialize with file path."""
+        self.file_path = file_path
+        if "~" in self.file_path:
+            self.file_path = os.path.expanduser(self.file_path)
+
+    def load(self) -> List[Document]:
+        """Load all the pages into Document objects."""
+        return list(self.lazy_load())
+
+    def lazy_load(
+        self,
+    ) -> Iterator[Document]:
+        """A lazy loader for the pages of the file."""
+        with open(self.file_path, "rb") as pdf_file:
+            pdf_document = PDFDocument(PDFParser(pdf_file))
+
+            # Number of pages from the page tree (without parsing the pages)
+            try:
+                total_pages = int(resolve1(pdf_document.catalog["Pages"])["Count"])
+            except Exception:
+                total_pages = None
+
+            resource_manager = PDFResourceManager(caching=True)
+            output = io.StringIO()
+            device = TextConverter(resource_manager, output, laparams=LAParams())
+            interpreter = PDFPageInterpreter(resource_manager, device)
+
+            try:
+                for page_number, page in enumerate(PDFPage.create_pages(pdf_document)):
+                    interpreter.process_page(page)
+                    page_content = output.getvalue().rstrip("\x0c")
+                    output.seek(0)
+                    output.truncate(0)
+
+                    metadata = {"source": self.file_path, "page": page_number}
+                    if total_pages:
+                        metadata["total_pages"] = total_pages
+
+                    yield Document(page_content=page_content, metadata=metadata)
+            finally:
+                device.close()
@@ -0,0 +1,90 @@
+import json
+from typing import Any, Dict, List
+from langchain_core.embeddings import Embeddings
+from chatnerd.stores.embedding_cache_store import EmbeddingCacheStore
+from chatnerd.langchain.onnx_embeddings import get_quantization
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wraps an embedding function and looks up the persistent embedding cache before calling the
+    model. Other attributes (client, model_kwargs, max_seq_length...) are read from the wrapped
+    embeddings.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        cache_store: EmbeddingCacheStore,
+        model_key: str,
+    ):
+        self.embeddings = embeddings
+        self.cache_store = cache_store
+        self.model_key = model_key
+
+    @staticmethod
+    def get_model_key(embeddings_config: Dict[str, Any]) -> str:
+        # Vectors depend on the model and on the encode settings
+        provider = str(embeddings_config.get("provider", "huggingface")).lower()
+        model_key = {
+            "provider": provider,
+            "model_name": str(embeddings_config["model_name"]).lower(),
+            "encode_kwargs": embeddings_config.get("encode_kwargs", {}),
+        }
+        if provider == "onnx":
+            # A quantized model gives different vectors
+            model_key["quantize"] = get_quantization(
+                embeddings_config.get("onnx", None) or {}
+            )
+
+        return json.dumps(model_key, sort_keys=True, default=str)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._embed_with_cache(
+            texts, self.model_key, self.embeddings.embed_documents
+        )
+
+    def embed_query(self, text: str) -> List[float]:
+        # Queries are cached apart because some models embed them with a different instruction
+        return self._embed_with_cache(
+            [text],
+            self.model_key + ":query",
+            lambda texts: [self.embeddings.embed_query(texts[0])],
+        )[0]
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        from chatnerd.langchain.multi_query_retrieval import embed_queries
+
+        return self._embed_with_cache(
+            texts,
+            self.model_key + ":query",
+            lambda missing_texts: embed_queries(self.embeddings, missing_texts),
+        )
+
+    def _embed_with_cache(
+        self, texts: List[str], model_key: str, embed_function: callable
+    ) -> List[List[float]]:
+        vectors = self.cache_store.mget(model_key, texts)
+
+        # Texts with the same normalized content are embedded once
+        missing_indexes: Dict[str, List[int]] = {}
+        for i, vector in enumerate(vectors):
+            if vector is None:
+                text_hash = self.cache_store.get_text_hash(texts[i])
+                missing_indexes.setdefault(text_hash, []).append(i)
+
+        if len(missing_indexes) > 0:
+            missing_texts = [texts[indexes[0]] for indexes in missing_indexes.values()]
+            missing_vectors = embed_function(missing_texts)
+            self.cache_store.mset(model_key, missing_texts, missing_vectors)
+
+            for indexes, vector in zip(missing_indexes.values(), missing_vectors):
+                for i in indexes:
+                    vectors[i] = list(vector)
+
+        return vectors
+
+    def __getattr__(self, name: str) -> Any:
+        if name == "embeddings":
+            raise AttributeError(name)
+        return getattr(self.embeddings, name)
@@ -2,6 +2,7 @@ from typing import Any, Dict, Optional
 from operator import itemgetter
 from langchain_core.language_models import BaseLanguageModel
 from langchain_core.output_parsers import StrOutputParser, NumberedListOutputParser
+from langchain_core.retrievers import BaseRetriever
 from langchain_core.runnables import (
     RunnableParallel,
     RunnablePassthrough,
@@ -11,8 +12,10 @@ from langchain_core.runnables import (
 
 # from langchain.chains.combine_documents import create_stuff_documents_chain
 from chatnerd.stores.store_factory import StoreFactory
+from chatnerd.stores.store_base import StoreBase
 from chatnerd.langchain.llm_factory import LLMFactory
 from chatnerd.langchain.summarizer import Summarizer
+from chatnerd.langchain.hybrid_retrieval import HybridRetriever, SEARCH_TYPE_HYBRID
 from chatnerd.langchain.chain_runnables import (
     retrieve_relevant_documents_runnable,
     rerank_documents_runnable,
@@ -40,14 +43,15 @@ class ChainFactory:
 
     # Source: https://levelup.gitconnected.com/3-query-expansion-methods-implemented-using-langchain-to-improve-your-rag-81078c1330cd
     def get_chat_chain(self) -> Runnable:
-        embeddings = LLMFactory(config=self.config).get_embedding_function()
+        llm_factory = LLMFactory(config=self.config)
+        embeddings = llm_factory.get_embedding_function()
 
         store_factory = StoreFactory(self.config)
         retrieve_store = store_factory.get_vector_store(embeddings=embeddings)
 
-        retriever = retrieve_store.as_retriever(**self.config["retriever"])
+        retriever = self.get_retriever(retrieve_store, store_factory)
 
-        llm, prompt_type = LLMFactory(config=self.config).get_model()
+        llm, prompt_type = llm_factory.get_model()
 
         chat_system_prompt: str = self.config["prompts"].get("chat_system_prompt", None)
         chat_human_prompt: str = self.config["prompts"].get(
@@ -77,6 +81,15 @@ class ChainFactory:
                 f"Invalid value in 'reranker' configuration: {reranker_config}"
             )
 
+        # Preload the cross-encoder shared by the chains of the process (or use the model server)
+        use_cross_encoding_rerank = chat_chain_config.get(
+            "use_cross_encoding_rerank", True
+        )
+        cross_encoder = None
+        if use_cross_encoding_rerank:
+            cross_encoder = llm_factory.get_cross_encoder(reranker_config)
+            cross_encoder.preload()
+
         question_expansion_chain = self.get_question_expansion_chain(
             chat_chain_config, llm, prompt_type
         )
@@ -90,9 +103,8 @@ class ChainFactory:
                 ),
             }
             | rerank_documents_runnable.bind(
-                use_cross_encoding_rerank=chat_chain_config.get(
-                    "use_cross_encoding_rerank", True
-                ),
+                use_cross_encoding_rerank=use_cross_encoding_rerank,
+                cross_encoder=cross_encoder,
                 **reranker_config,
             )
             | get_parent_documents_runnable.bind(
@@ -123,7 +135,7 @@ class ChainFactory:
         store_factory = StoreFactory(self.config)
         retrieve_store = store_factory.get_vector_store(embeddings=embeddings)
 
-        retriever = retrieve_store.as_retriever(**self.config["retriever"])
+        retriever = self.get_retriever(retrieve_store, store_factory)
 
         llm, prompt_type = llm_factory.get_model()
 
@@ -145,6 +157,15 @@ class ChainFactory:
                 f"Invalid value in 'reranker' configuration: {reranker_config}"
             )
 
+        # Preload the cross-encoder shared by the chains of the process (or use the model server)
+        use_cross_encoding_rerank = retrieve_chain_config.get(
+            "use_cross_encoding_rerank", True
+        )
+        cross_encoder = None
+        if use_cross_encoding_rerank:
+            cross_encoder = llm_factory.get_cross_encoder(reranker_config)
+            cross_encoder.preload()
+
         question_expansion_chain = self.get_question_expansion_chain(
             retrieve_chain_config, llm, prompt_type
         )
@@ -163,9 +184,8 @@ class ChainFactory:
                 ),
             }
             | rerank_documents_runnable.bind(
-                use_cross_encoding_rerank=retrieve_chain_config.get(
-                    "use_cross_encoding_rerank", True
-                ),
+                use_cross_encoding_rerank=use_cross_encoding_rerank,
+                cross_encoder=cross_encoder,
                 **reranker_config,
             ),
             question=RunnablePassthrough(),
@@ -192,6 +212,25 @@ class ChainFactory:
 
         return chain
 
+    def get_retriever(
+        self, retrieve_store: StoreBase, store_factory: StoreFactory
+    ) -> BaseRetriever:
+        """
+        Retriever of the section 'retriever' of the config. Search type "hybrid" fuses the
+        "similarity" search with the lexical search configured in 'retriever.hybrid'
+        """
+        retriever_config = dict(self.config["retriever"])
+        hybrid_config = retriever_config.pop("hybrid", None) or {}
+        if retriever_config.get("search_type", None) != SEARCH_TYPE_HYBRID:
+            return retrieve_store.as_retriever(**retriever_config)
+
+        retriever_config["search_type"] = "similarity"
+        return HybridRetriever(
+            dense_retriever=retrieve_store.as_retriever(**retriever_config),
+            store_factory=store_factory,
+            **hybrid_config,
+        )
+
     # Generate similar questions from original query using LLM
     # Source: https://levelup.gitconnected.com/3-query-expansion-methods-implemented-using-langchain-to-improve-your-rag-81078c1330cd
     def get_question_expansion_chain(
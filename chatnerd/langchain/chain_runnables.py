@@ -1,10 +1,30 @@
-from typing import Dict, List
+from typing import Any, Dict, List, Tuple
 from langchain_core.documents import Document
 from langchain_core.runnables import chain, Runnable
 from langchain_core.vectorstores import VectorStoreRetriever
-from sentence_transformers import CrossEncoder
-from langchain_community.vectorstores.chroma import Chroma
 from chatnerd.stores.store_factory import StoreFactory
+from chatnerd.stores.studied_document_cache import (
+    StudiedDocumentCache,
+    DEFAULT_MAX_SIZE_MB as DEFAULT_SOURCE_DOCUMENTS_CACHE_MB,
+)
+from chatnerd.stores.store_base import (
+    StoreBase,
+    CHUNK_ID_KEY,
+    CHUNK_INDEX_KEY,
+    NEXT_CHUNK_ID_KEY,
+    PREV_CHUNK_ID_KEY,
+)
+from chatnerd.langchain.multi_query_retrieval import (
+    log_retrieval_timings,
+    retrieve_multi_query,
+)
+from chatnerd.langchain.rank_fusion import (
+    DEFAULT_FUSION,
+    DEFAULT_N_RERANK_CANDIDATES,
+    DEFAULT_ORIGINAL_QUESTION_WEIGHT,
+    DEFAULT_RRF_K,
+    fuse_results,
+)
 import logging
 
 DEFAULT_RERANKER_MODEL_NAME = "cross-encoder/ms-marco-MiniLM-L-6-v2"
@@ -13,26 +33,29 @@ DEFAULT_BATCH_SIZE = 32  # Default batch size for cross encoder
 
 @chain
 def retrieve_relevant_documents_runnable(
-    questions: List[str] | str, retriever: VectorStoreRetriever, **kwargs
+    questions: List[str] | str,
+    retriever: VectorStoreRetriever,
+    fusion: str = DEFAULT_FUSION,
+    rrf_k: int = DEFAULT_RRF_K,
+    n_rerank_candidates: int = DEFAULT_N_RERANK_CANDIDATES,
+    original_question_weight: float = DEFAULT_ORIGINAL_QUESTION_WEIGHT,
+    **kwargs,
 ) -> Runnable:
     if isinstance(questions, str):
         questions = [questions]
 
-    retrieved_documents: List[Document] = []
-    for i in questions:
-        results = retriever.invoke(i)
-        retrieved_documents.extend(results)
-
-    # Remove duplicates
-    unique_ids = set()
-    unique_documents = [
-        doc
-        for doc in retrieved_documents
-        if doc.page_content not in unique_ids
-        and (unique_ids.add(doc.page_content) or True)
-    ]
-
-    return unique_documents
+    # All the questions are embedded and searched at once (see retrieve_multi_query)
+    results, timings = retrieve_multi_query(retriever, questions)
+    log_retrieval_timings(questions, results, timings)
+
+    # Unique chunks ranked by all the questions (the first one is the original question)
+    return fuse_results(
+        results,
+        fusion=fusion,
+        rrf_k=rrf_k,
+        weights=[float(original_question_weight)] + [1.0] * (len(questions) - 1),
+        top_n=n_rerank_candidates,
+    )
 
 
 # Cross Encoding happens in here
@@ -42,6 +65,7 @@ def rerank_documents_runnable(
     use_cross_encoding_rerank: bool = True,
     model_name: str = DEFAULT_RERANKER_MODEL_NAME,
     batch_size: int = DEFAULT_BATCH_SIZE,
+    cross_encoder: Any = None,
     **kwargs,
 ) -> Runnable:
 
@@ -59,7 +83,12 @@ def rerank_documents_runnable(
         pairs.append([question, doc.page_content])
 
     # Cross Encoder Scoring with batch processing
-    cross_encoder = CrossEncoder(model_name, **kwargs)
+    if cross_encoder is None:
+        from chatnerd.langchain.reranker_registry import RerankerRegistry
+
+        cross_encoder = RerankerRegistry.instance().get(
+            {"model_name": model_name, **kwargs}
+        )
     scores = cross_encoder.predict(pairs, batch_size=batch_size)
 
     # Add score to metadata
@@ -77,87 +106,149 @@ def rerank_documents_runnable(
 @chain
 def get_parent_documents_runnable(
     documents: List[Document],
-    store: Chroma,
+    store: StoreBase,
     n_combined_documents: int,
     **kwargs,
 ) -> Runnable:
+    """
+    Expands each chunk with its previous and next chunks. The neighbours are fetched by id in
+    a single call (see ChunkBatcher._link_chunks). Chunks studied without the ids of their
+    neighbours are expanded with the chunks of the whole source
+    """
     if len(documents) == 0:
         return []
 
-    result_documents = []
+    # (chunk, parent document of the chunks studied without neighbour ids)
+    selected_documents: List[Tuple[Document, Document | None]] = []
     for doc in documents:
-        source = doc.metadata.get("source", None)
-        start_index = doc.metadata.get("start_index", None)
+        if len(selected_documents) == n_combined_documents:
+            break
 
-        if not source or not start_index:
+        if CHUNK_INDEX_KEY in doc.metadata:
+            selected_documents.append((doc, None))
             continue
 
-        try:
-            start_index = int(start_index)
-        except ValueError:
-            continue
+        parent_document = _get_parent_document_by_source(doc, store)
+        if parent_document is not None:
+            selected_documents.append((doc, parent_document))
 
-        # ChromaDB 0.6.x uses a different collection API
+    neighbour_ids = [
+        doc.metadata[key]
+        for doc, parent_document in selected_documents
+        if parent_document is None
+        for key in [PREV_CHUNK_ID_KEY, NEXT_CHUNK_ID_KEY]
+        if doc.metadata.get(key, None)
+    ]
+    neighbours: Dict[str, Document] = {}
+    if len(neighbour_ids) > 0:
         try:
-            sibblings_data = store.get(
-                include=["metadatas", "documents"], where={"source": source}
-            )
+            neighbours = {
+                neighbour.id: neighbour
+                for neighbour in store.get_chunks_by_ids(
+                    list(dict.fromkeys(neighbour_ids))
+                )
+            }
         except Exception as e:
-            logging.warning(f"Error getting siblings data: {str(e)}")
-            continue
+            logging.warning(f"Error getting neighbour chunks: {str(e)}")
 
-        if not sibblings_data or "metadatas" not in sibblings_data:
+    result_documents = []
+    for doc, parent_document in selected_documents:
+        if parent_document is not None:
+            result_documents.append(parent_document)
             continue
 
-        sibbling_documents = []
-        for i in range(len(sibblings_data["metadatas"])):
-            sibbling_documents.append(
-                {
-                    "id": (
-                        sibblings_data.get("ids", [])[i]
-                        if "ids" in sibblings_data
-                        else str(i)
-                    ),
-                    "page_content": sibblings_data["documents"][i],
-                    "metadata": sibblings_data["metadatas"][i],
-                }
+        page_contents = [
+            neighbours[doc.metadata[key]].page_content
+            for key in [PREV_CHUNK_ID_KEY, NEXT_CHUNK_ID_KEY]
+            if doc.metadata.get(key, None) in neighbours
+        ]
+        if doc.metadata.get(PREV_CHUNK_ID_KEY, None) in neighbours:
+            page_contents.insert(1, doc.page_content)
+        else:
+            page_contents.insert(0, doc.page_content)
+
+        result_documents.append(
+            Document(
+                id=doc.id,
+                page_content="\n" + "\n".join(page_contents),
+                metadata=doc.metadata,
             )
+        )
+
+    return result_documents
 
-        sibbling_documents = sorted(
-            sibbling_documents, key=lambda x: int(x["metadata"].get("start_index", 0))
+
+def _get_parent_document_by_source(doc: Document, store: StoreBase) -> Document | None:
+    source = doc.metadata.get("source", None)
+    start_index = doc.metadata.get("start_index", None)
+    chunk_id = doc.id or doc.metadata.get(CHUNK_ID_KEY, None)
+
+    if not source or (start_index is None and not chunk_id):
+        return None
+
+    try:
+        start_index = int(start_index) if start_index is not None else None
+    except ValueError:
+        return None
+
+    # ChromaDB 0.6.x uses a different collection API
+    try:
+        sibblings_data = store.get(
+            include=["metadatas", "documents"], where={"source": source}
+        )
+    except Exception as e:
+        logging.warning(f"Error getting siblings data: {str(e)}")
+        return None
+
+    if not sibblings_data or "metadatas" not in sibblings_data:
+        return None
+
+    sibbling_documents = []
+    for i in range(len(sibblings_data["metadatas"])):
+        sibbling_documents.append(
+            {
+                "id": (
+                    sibblings_data.get("ids", [])[i]
+                    if "ids" in sibblings_data
+                    else str(i)
+                ),
+                "page_content": sibblings_data["documents"][i],
+                "metadata": sibblings_data["metadatas"][i],
+            }
         )
 
-        for sibling_i, sibling in enumerate(sibbling_documents):
-            sibling_start_index = sibling["metadata"].get("start_index", None)
-            sibling_start_index = (
-                int(sibling_start_index) if sibling_start_index else None
-            )
+    sibbling_documents = sorted(
+        sibbling_documents, key=lambda x: int(x["metadata"].get("start_index", 0))
+    )
+
+    for sibling_i, sibling in enumerate(sibbling_documents):
+        sibling_start_index = sibling["metadata"].get("start_index", None)
+        sibling_start_index = (
+            int(sibling_start_index) if sibling_start_index is not None else None
+        )
 
-            if sibling_start_index == start_index:
-                prev_index = max(0, sibling_i - 1)
-                next_index = min(len(sibbling_documents) - 1, sibling_i + 1)
-
-                parent_page_content = ""
-                for i in range(prev_index, next_index + 1):
-                    parent_page_content = (
-                        parent_page_content
-                        + "\n"
-                        + sibbling_documents[i]["page_content"]
-                    )
-
-                result_documents.append(
-                    Document(
-                        page_content=parent_page_content,
-                        metadata=sibling["metadata"],
-                    )
+        # The chunk is found by id, or by start_index if the store gives no id
+        if (
+            sibling["id"] == chunk_id
+            if chunk_id and "ids" in sibblings_data
+            else sibling_start_index == start_index
+        ):
+            prev_index = max(0, sibling_i - 1)
+            next_index = min(len(sibbling_documents) - 1, sibling_i + 1)
+
+            parent_page_content = ""
+            for i in range(prev_index, next_index + 1):
+                parent_page_content = (
+                    parent_page_content + "\n" + sibbling_documents[i]["page_content"]
                 )
 
-                if len(result_documents) == n_combined_documents:
-                    return result_documents
-                else:
-                    break
+            return Document(
+                id=doc.id,
+                page_content=parent_page_content,
+                metadata=doc.metadata,
+            )
 
-    return result_documents
+    return None
 
 
 @chain
@@ -165,35 +256,46 @@ def get_source_documents_runnable(
     documents: List[Document],
     store_factory: StoreFactory,
     n_combined_documents: int,
+    source_documents_cache_mb: float = DEFAULT_SOURCE_DOCUMENTS_CACHE_MB,
     **kwargs,
 ) -> Runnable:
-
+    """
+    Returns the studied documents of the sources of the chunks. The documents not in the
+    process-wide StudiedDocumentCache are read in a single query
+    """
     if len(documents) == 0:
         return []
 
-    unique_result_sources = set()
+    sources = list(
+        dict.fromkeys(
+            doc.metadata["source"]
+            for doc in documents
+            if doc.metadata.get("source", None)
+        )
+    )
+    if len(sources) == 0:
+        return []
+
+    studied_document_cache = StudiedDocumentCache.instance()
+    studied_document_cache.set_max_size_mb(source_documents_cache_mb)
+    studied_documents = studied_document_cache.get_studied_documents(
+        store_factory.get_shared_status_store(), sources
+    )
+
     result_documents = []
-    for doc in documents:
-        source = doc.metadata.get("source", None)
-        if not source:
+    for source in sources:
+        studied_document_data = studied_documents.get(source, None)
+        if not studied_document_data:
             continue
-        if source in unique_result_sources:
-            continue
-
-        with store_factory.get_status_store() as status_store:
-            studied_document_data = status_store.get_studied_document(source)
 
-        if studied_document_data:
-            result_documents.append(
-                Document(
-                    page_content=studied_document_data["page_content"],
-                    metadata=studied_document_data["metadata"],
-                )
+        result_documents.append(
+            Document(
+                page_content=studied_document_data["page_content"],
+                metadata=dict(studied_document_data["metadata"]),
             )
-            unique_result_sources.add(source)
-
-            if len(result_documents) == n_combined_documents:
-                return result_documents
+        )
+        if len(result_documents) == n_combined_documents:
+            break
 
     return result_documents
 
@@ -205,22 +307,3 @@ def combine_documents_runnable(documents: List[Document]) -> Runnable:
 
     page_contents = [document.page_content for document in documents]
     return "\n\n".join(page_contents)
-
-
-# @chain
-# def reciprocal_rank_fusion(results: list[list], k=20) -> Runnable:
-#     fused_scores = {}
-#     for docs in results:
-#         # Assumes the docs are returned in sorted order of relevance
-#         for rank, doc in enumerate(docs):
-#             doc_str = dumps(doc)
-#             if doc_str not in fused_scores:
-#                 fused_scores[doc_str] = 0
-#             fused_scores[doc_str]
-#             fused_scores[doc_str] += 1 / (rank + k)
-
-#     reranked_results = [
-#         (loads(doc), score)
-#         for doc, score in sorted(fused_scores.items(), key=lambda x: x[1], reverse=True)
-#     ]
-#     return reranked_results
@@ -1,20 +1,47 @@
-import os
+import uuid
 import logging
+import threading
 from typing import Any, Dict, List, Tuple
 from datetime import datetime, timezone
-from concurrent.futures import ProcessPoolExecutor, as_completed
 from langchain_core.embeddings import Embeddings
 from langchain_core.documents import Document
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+from langchain_text_splitters import RecursiveCharacterTextSplitter, TextSplitter
 from chatnerd.stores.store_factory import StoreFactory
+from chatnerd.stores.status_store import StatusStore
+from chatnerd.stores.store_base import (
+    StoreBase,
+    CHUNK_INDEX_KEY,
+    NEXT_CHUNK_ID_KEY,
+    PREV_CHUNK_ID_KEY,
+)
 from chatnerd.langchain.llm_factory import LLMFactory
+from chatnerd.langchain.token_text_splitter import (
+    FastTokenTextSplitter,
+    get_embeddings_tokenizer,
+    DEFAULT_SEPARATORS,
+    SPLIT_MODE_CHARACTERS,
+    SPLIT_MODE_TOKENS,
+)
+from chatnerd.langchain.semantic_text_splitter import (
+    SemanticTextSplitter,
+    DEFAULT_BREAKPOINT_PERCENTILE,
+    SPLIT_MODE_SEMANTIC,
+)
+from chatnerd.langchain.embedding_executor import EmbeddingExecutor
+from chatnerd.langchain.hybrid_retrieval import is_hybrid_search
 from chatnerd.tools.event_emitter import EventEmitter
-from chatnerd.config import Config
+from chatnerd.lib.helpers import get_embeddings_client
 
 DEFAULT_CHUNK_SIZE = 1_000
 DEFAULT_CHUNK_OVERLAP = 100
+DEFAULT_EMBED_BATCH_SIZE = (
+    256  # Number of chunks encoded in a single call to the embedding model
+)
 
-_RUN_TASKS_LIMIT = 1_000  # Maximum number of tasks to run in a single call to run()
+_PART_METADATA_KEYS = [
+    "page",
+    "row",
+]  # Metadata of a part of a document (PDF page, CSV row)
 
 
 class DocumentEmbedder(EventEmitter):
@@ -23,11 +50,16 @@ class DocumentEmbedder(EventEmitter):
     def __init__(self, nerd_config: Dict[str, Any]):
         super().__init__()
         self.config = nerd_config
+        self._embeddings: Embeddings = None
 
-    # @staticmethod
     def run(
-        self, documents: List[Document], limit: int = _RUN_TASKS_LIMIT
+        self, documents: List[Document], limit: int | None = None
     ) -> Tuple[List[str], List[any]]:
+        """
+        Split documents in chunks and embed them in fixed-size batches. The embedding model is
+        loaded once and reused by the next runs (batches of a study), the vector store and the
+        status store are opened once per run.
+        """
         logging.debug("Running document embedder...")
 
         if len(documents) == 0:
@@ -35,73 +67,165 @@ class DocumentEmbedder(EventEmitter):
             return [], []
 
         # Limit number of tasks to run
-        if not limit or not 0 < limit < _RUN_TASKS_LIMIT:
-            limit = _RUN_TASKS_LIMIT
-        if len(documents) > limit:
+        if limit and len(documents) > limit:
             logging.warning(
                 f"Number of documents to embeed cut to limit {limit} (out of {len(documents)})"
             )
             documents = documents[:limit]
 
+        # The parts of a document (pages, rows...) come one after the other with the same source
+        last_part_flags = [
+            i == len(documents) - 1
+            or documents[i + 1].metadata.get("source", None)
+            != document.metadata.get("source", None)
+            for i, document in enumerate(documents)
+        ]
+
         # Emit start event (show progress bar in UI)
-        self.emit("start", len(documents))
+        self.emit("start", sum(last_part_flags))
 
-        # Maximum workers depending on vector store thread safety configuration
-        store = StoreFactory(self.config).get_vector_store()
-        if store.is_thread_safe():
-            max_workers = 2 if os.cpu_count() > 4 else 1
-        else:
-            max_workers = 1
-        store.close()
-
-        results = []
-        errors = []
-        with ProcessPoolExecutor(max_workers=max_workers) as executor:
-            response_futures = [
-                executor.submit(self.split_and_embed_document, document)
-                for document in documents
-            ]
+        if self._embeddings is None:
+            self._embeddings = LLMFactory(self.config).get_embedding_function()
+        embeddings = self._embeddings
+        text_splitter = self.get_text_splitter(self.config, embeddings)
+        batch_size = self.get_embed_batch_size(self.config)
 
-            for response_future in as_completed(response_futures):
-                try:
-                    response = response_future.result()
-                    if response:
-                        results.append(response)  # append the id of the source document
+        store_factory = StoreFactory(self.config)
+        chunks_store = store_factory.get_vector_store(embeddings=embeddings)
 
+        try:
+            with store_factory.get_status_store() as status_store:
+                batcher = ChunkBatcher(
+                    chunks_store=chunks_store,
+                    status_store=status_store,
+                    batch_size=batch_size,
+                    on_document_done=self._on_document_done,
+                    lexical_index=is_hybrid_search(self.config),
+                )
+                # Batches are encoded in worker threads and written by this thread
+                executor = EmbeddingExecutor.from_config(
+                    self.config, batcher, embeddings
+                )
+
+                try:
+                    for document, is_last_part in zip(documents, last_part_flags):
                         try:
-                            self.emit(
-                                "write",
-                                f"✔ {response}",
+                            chunks, vectors = self.split_document(
+                                document, text_splitter
                             )
-                        except:
-                            pass
-                except Exception as err:
-                    errors.append(err)
+                        except Exception as err:
+                            batcher.fail(document, err, is_last_part)
+                            continue
+
+                        for result in executor.submit(
+                            batcher.add(document, chunks, is_last_part, vectors=vectors)
+                        ):
+                            batcher.write_result(*result)
+
+                    for result in (
+                        executor.submit(batcher.pop_batches(final=True))
+                        + executor.drain()
+                    ):
+                        batcher.write_result(*result)
                 finally:
-                    self.emit("update")
+                    executor.shutdown()
+                batcher.finish()
+        finally:
+            chunks_store.close()
 
         self.emit("end")
-        return results, errors
+        return batcher.results, batcher.errors
+
+    def _on_document_done(self, source: str, error: Exception | None = None):
+        if error is None:
+            try:
+                self.emit("write", f"✔ {source}")
+            except:
+                pass
+        self.emit("update")
+
+    @staticmethod
+    def split_document(
+        document: Document, text_splitter: TextSplitter
+    ) -> Tuple[List[Document], List[List[float]] | None]:
+        # Add created_at metadata
+        created_at_utc_iso = datetime.now(timezone.utc).isoformat()
+        document.metadata["created_at"] = created_at_utc_iso
+
+        return DocumentEmbedder.split_documents([document], text_splitter)
 
     @staticmethod
-    def split_and_embed_document(document: Document) -> str:
-        config = Config().get_project_config()
-        embeddings: Embeddings = LLMFactory(config).get_embedding_function()
+    def get_text_splitter(
+        config: Dict[str, Any], embeddings: Embeddings
+    ) -> TextSplitter:
+        """
+        Creates the text splitter once per run. By default, chunk_size is counted in tokens
+        with the tokenizer of the embedding model (see FastTokenTextSplitter). With mode
+        "semantic", the splitter also returns the vectors of the chunks (see
+        SemanticTextSplitter)
+        """
+        splitter_kwargs = DocumentEmbedder.get_splitter_kwargs(config, embeddings)
+        mode = splitter_kwargs.pop("mode", SPLIT_MODE_TOKENS)
+        breakpoint_percentile = splitter_kwargs.pop(
+            "breakpoint_percentile", DEFAULT_BREAKPOINT_PERCENTILE
+        )
+
+        if mode != SPLIT_MODE_CHARACTERS:
+            tokenizer = get_embeddings_tokenizer(embeddings)
+            if tokenizer is not None:
+                # The special tokens added by the model count in max_seq_length
+                max_seq_length = DocumentEmbedder.get_max_seq_length(embeddings)
+                if max_seq_length:
+                    splitter_kwargs["chunk_size"] = min(
+                        splitter_kwargs["chunk_size"],
+                        max_seq_length - tokenizer.num_special_tokens_to_add(),
+                    )
+                splitter_kwargs["chunk_overlap"] = min(
+                    splitter_kwargs["chunk_overlap"], splitter_kwargs["chunk_size"] // 2
+                )
+                if mode == SPLIT_MODE_SEMANTIC:
+                    return SemanticTextSplitter(
+                        tokenizer=tokenizer,
+                        embeddings=embeddings,
+                        breakpoint_percentile=breakpoint_percentile,
+                        **splitter_kwargs,
+                    )
+                return FastTokenTextSplitter(
+                    tokenizer=tokenizer, mode=mode, **splitter_kwargs
+                )
 
+            logging.warning(
+                "The embedding model has no fast tokenizer, chunk_size is counted in characters"
+            )
+
+        return RecursiveCharacterTextSplitter(**splitter_kwargs)
+
+    @staticmethod
+    def get_max_seq_length(embeddings: Embeddings) -> int | None:
+        model_kwargs = getattr(embeddings, "model_kwargs", None) or {}
+        client = get_embeddings_client(embeddings)
+        return (
+            model_kwargs.get("max_seq_length", None)
+            or getattr(client, "max_seq_length", None)
+            or getattr(embeddings, "max_seq_length", None)
+        )
+
+    @staticmethod
+    def get_splitter_kwargs(
+        config: Dict[str, Any], embeddings: Embeddings
+    ) -> Dict[str, Any]:
         chunk_splitter_config = {
-            "separators": ["\n\n", "\n", ".", ",", " "],
+            "mode": SPLIT_MODE_TOKENS,
+            "separators": DEFAULT_SEPARATORS,
             "keep_separator": False,
             "chunk_overlap": DEFAULT_CHUNK_OVERLAP,
             "chunk_size": DEFAULT_CHUNK_SIZE,
             "add_start_index": True,
-        } | config["splitter"]
+        } | (config.get("splitter", None) or {})
 
         try:
             # Get max sequence length from the embedding model
-            max_seq_length = (
-                embeddings.model_kwargs.get("max_seq_length")
-                or embeddings.max_seq_length
-            )
+            max_seq_length = DocumentEmbedder.get_max_seq_length(embeddings)
             if not max_seq_length:
                 max_seq_length = DEFAULT_CHUNK_SIZE
                 logging.warning(
@@ -119,59 +243,448 @@ class DocumentEmbedder(EventEmitter):
             )
             chunk_splitter_config["chunk_size"] = DEFAULT_CHUNK_SIZE
 
-        # Add created_at metadata
-        created_at_utc_iso = datetime.now(timezone.utc).isoformat()
-        document.metadata["created_at"] = created_at_utc_iso
-
-        chunks = DocumentEmbedder.split_documents(
-            [document],
-            splitter_kwargs=chunk_splitter_config,
-        )
-
-        store_factory = StoreFactory(config)
-        chunks_database = store_factory.get_vector_store(embeddings=embeddings)
+        return chunk_splitter_config
 
+    @staticmethod
+    def get_embed_batch_size(config: Dict[str, Any]) -> int:
+        study_config = config.get("study", None) or {}
         try:
-            # Embed and store chunk documents
-            chunk_ids = chunks_database.add_documents(documents=chunks)
-        except Exception as e:
-            logging.error(f"Error embedding documents: {str(e)}")
-            raise
-
-        # Save source document in status store
-        with store_factory.get_status_store() as status_store:
-            status_store.add_studied_document(
-                id=document.metadata.get("source", None),
-                source=document.metadata.get("source", None),
-                page_content=document.page_content,
-                metadata=document.metadata,
+            batch_size = int(
+                study_config.get("embed_batch_size", DEFAULT_EMBED_BATCH_SIZE)
             )
+        except (TypeError, ValueError):
+            batch_size = DEFAULT_EMBED_BATCH_SIZE
 
-        return document.metadata.get("source", None)
+        return max(1, batch_size)
 
     @staticmethod
     def split_documents(
         documents: List[Document],
-        splitter_kwargs: Dict[str, Any] = {},
-    ) -> List[Document]:
+        text_splitter: TextSplitter,
+    ) -> Tuple[List[Document], List[List[float]] | None]:
         """
-        Load documents and split in chunks
+        Split documents in chunks. Returns the chunks and their vectors when the splitter
+        computes them (semantic splitter), None otherwise
         """
-
-        splitter_kwargs = {
-            "separators": ["\n\n", "\n", ".", ",", " "],
-            "chunk_size": DEFAULT_CHUNK_SIZE,
-            "chunk_overlap": DEFAULT_CHUNK_OVERLAP,
-            "keep_separator": False,
-        } | splitter_kwargs
-
-        text_splitter = RecursiveCharacterTextSplitter(**splitter_kwargs)
-
         texts, metadatas = [], []
         for document in documents:
             texts.append(document.page_content)
             metadatas.append(document.metadata)
 
+        if isinstance(text_splitter, SemanticTextSplitter):
+            return text_splitter.create_documents_with_embeddings(
+                texts, metadatas=metadatas
+            )
+
         chunks = text_splitter.create_documents(texts, metadatas=metadatas)
 
-        return chunks
+        return chunks, None
+
+
+class ChunkBatcher:
+    """
+    Collects the chunks of many documents in fixed-size batches. A document can be added in
+    parts (the pages of a PDF loaded lazily), and it is saved in the status store once the
+    chunks of all its parts are written to the vector store. Batches can be embedded and
+    written in different threads. With lexical_index, the chunks are also added to the
+    lexical index of the hybrid search.
+    """
+
+    def __init__(
+        self,
+        chunks_store: StoreBase,
+        status_store: StatusStore,
+        batch_size: int = DEFAULT_EMBED_BATCH_SIZE,
+        on_document_done: callable = None,
+        lexical_index: bool = False,
+    ):
+        self.chunks_store = chunks_store
+        self.status_store = status_store
+        self.batch_size = batch_size
+        self.on_document_done = on_document_done
+        self.lexical_index = lexical_index
+
+        self.results: List[str] = []
+        self.errors: List[any] = []
+
+        self._lock = threading.Lock()
+        self._pending_chunks: List[Tuple[int, Document]] = []
+        self._chunk_vectors: Dict[int, List[float]] = {}  # id(chunk) -> vector
+        self._empty_parts: List[int] = []
+        self._failed_documents: List[int] = []
+        self._documents: Dict[int, Dict[str, Any]] = {}
+        self._parts: Dict[int, Dict[str, Any]] = {}
+        self._open_document: Tuple[int, str] | None = None  # (key, source)
+        self._next_key = 0
+
+    def add(
+        self,
+        document: Document,
+        chunks: List[Document],
+        is_last_part: bool = True,
+        vectors: List[List[float]] | None = None,
+    ) -> List[List[Tuple[int, Document]]]:
+        """
+        Add the chunks of a document (or of a part of a document) and return the batches
+        ready to be embedded. The parts of a document are added one after the other, and
+        the last one with is_last_part=True. The chunks with vectors (computed by the
+        splitter) are not embedded again
+        """
+        with self._lock:
+            document_key = self._get_document_key(document, is_last_part)
+            document_data = self._documents.get(document_key, None)
+            if document_data is None or "error" in document_data:
+                # The document failed while its parts were being added
+                return []
+
+            part_key = self._next_key
+            self._next_key += 1
+            self._parts[part_key] = {
+                "document_key": document_key,
+                "index": document_data["num_parts"],
+                "page_content": document.page_content,
+                "remaining_chunks": len(chunks),
+            }
+            document_data["num_parts"] += 1
+            document_data["pending_parts"] += 1
+            document_data["is_closed"] = is_last_part
+
+            if len(chunks) == 0:
+                self._empty_parts.append(part_key)
+            self._link_chunks(document_data, chunks, is_last_part)
+
+            if vectors is not None:
+                for chunk, vector in zip(chunks, vectors):
+                    self._chunk_vectors[id(chunk)] = vector
+
+        self._pending_chunks.extend((part_key, chunk) for chunk in chunks)
+        return self.pop_batches()
+
+    def fail(self, document: Document, error: Exception, is_last_part: bool = True):
+        """
+        Discard the document of a part that could not be processed (ex: split error). The
+        document is removed in the writer
+        """
+        with self._lock:
+            document_key = self._get_document_key(document, is_last_part)
+            document_data = self._documents.get(document_key, None)
+            if document_data is not None and "error" not in document_data:
+                document_data["error"] = error
+                self._failed_documents.append(document_key)
+
+    def _get_document_key(self, document: Document, is_last_part: bool) -> int:
+        # Key of the document receiving parts (a new one after the last part). Call with lock
+        source = document.metadata.get("source", None)
+        if self._open_document is not None and self._open_document[1] != source:
+            # The previous document stopped in the middle, it is discarded in finish()
+            self._open_document = None
+
+        if self._open_document is None:
+            self._open_document = (self._next_key, source)
+            self._next_key += 1
+            self._documents[self._open_document[0]] = {
+                "source": source,
+                "metadata": document.metadata,
+                "num_parts": 0,
+                "pending_parts": 0,
+                "is_closed": False,
+                "written_ids": [],
+                "num_chunks": 0,
+                "last_chunk_id": None,
+                "next_chunk_id": str(uuid.uuid4()),
+            }
+
+        document_key = self._open_document[0]
+        if is_last_part:
+            self._open_document = None
+
+        return document_key
+
+    @staticmethod
+    def _link_chunks(
+        document_data: Dict[str, Any], chunks: List[Document], is_last_part: bool
+    ):
+        """
+        Give each chunk its id, its index in the document and the ids of the previous and next
+        chunks, so the neighbours of a retrieved chunk are fetched by id. The id of the first
+        chunk of the next part is reserved in advance. Call with lock
+        """
+        for chunk in chunks:
+            chunk.id = document_data["next_chunk_id"]
+            chunk.metadata[CHUNK_INDEX_KEY] = document_data["num_chunks"]
+            if document_data["last_chunk_id"] is not None:
+                chunk.metadata[PREV_CHUNK_ID_KEY] = document_data["last_chunk_id"]
+
+            document_data["num_chunks"] += 1
+            document_data["last_chunk_id"] = chunk.id
+            document_data["next_chunk_id"] = str(uuid.uuid4())
+
+        for chunk, next_chunk in zip(chunks, chunks[1:]):
+            chunk.metadata[NEXT_CHUNK_ID_KEY] = next_chunk.id
+        if len(chunks) > 0 and not is_last_part:
+            chunks[-1].metadata[NEXT_CHUNK_ID_KEY] = document_data["next_chunk_id"]
+
+    def pop_batches(self, final: bool = False) -> List[List[Tuple[int, Document]]]:
+        batches = []
+        while len(self._pending_chunks) >= self.batch_size or (
+            final and len(self._pending_chunks) > 0
+        ):
+            batches.append(self._pending_chunks[: self.batch_size])
+            self._pending_chunks = self._pending_chunks[self.batch_size :]
+
+        return batches
+
+    def embed_batch(
+        self, embeddings: Embeddings, batch: List[Tuple[int, Document]]
+    ) -> List[List[float]]:
+        # Skip chunks of documents that failed in a previous batch
+        with self._lock:
+            vectors = [self._chunk_vectors.pop(id(chunk), None) for _, chunk in batch]
+            kept_indexes = [i for i, item in enumerate(batch) if item[0] in self._parts]
+            batch[:] = [batch[i] for i in kept_indexes]
+            vectors = [vectors[i] for i in kept_indexes]
+
+        if len(batch) == 0:
+            return []
+
+        # Embed only the chunks without vectors
+        missing_indexes = [i for i, vector in enumerate(vectors) if vector is None]
+        if len(missing_indexes) > 0:
+            missing_vectors = embeddings.embed_documents(
+                [batch[i][1].page_content for i in missing_indexes]
+            )
+            for i, vector in zip(missing_indexes, missing_vectors):
+                vectors[i] = vector
+
+        return vectors
+
+    def store_batch(
+        self, batch: List[Tuple[int, Document]], vectors: List[List[float]]
+    ) -> List[str]:
+        """
+        Write the chunks of a batch to the vector store and return their ids. Can be called
+        from the encode workers when the vector store is thread-safe
+        """
+        return self.chunks_store.add_documents_with_embeddings(
+            documents=[chunk for _, chunk in batch],
+            embeddings=vectors,
+            ids=[chunk.id for _, chunk in batch],
+        )
+
+    def write_result(
+        self,
+        batch: List[Tuple[int, Document]],
+        vectors: List[List[float]] | Exception,
+        chunk_ids: List[str] | None = None,
+    ):
+        if isinstance(vectors, Exception):
+            self.fail_batch(batch, vectors)
+        else:
+            self.write_batch(batch, vectors, chunk_ids=chunk_ids)
+
+    def write_batch(
+        self,
+        batch: List[Tuple[int, Document]],
+        vectors: List[List[float]],
+        chunk_ids: List[str] | None = None,
+    ):
+        """
+        Write a batch (unless the encode worker stored it already, with chunk_ids) and save
+        the documents completed. Called from a single thread, the owner of the status store
+        """
+        if len(batch) > 0:
+            if chunk_ids is None:
+                try:
+                    chunk_ids = self.store_batch(batch, vectors)
+                except Exception as e:
+                    self.fail_batch(batch, e)
+                    return
+
+            orphan_ids = []
+            if self.lexical_index:
+                self._index_chunks(batch, chunk_ids)
+            for (part_key, _), chunk_id in zip(batch, chunk_ids):
+                with self._lock:
+                    part_data = self._parts.get(part_key, None)
+                    if part_data is None:
+                        # The document failed after the batch was embedded
+                        orphan_ids.append(chunk_id)
+                        continue
+
+                    document_data = self._documents[part_data["document_key"]]
+                    document_data["written_ids"].append(chunk_id)
+                    part_data["remaining_chunks"] -= 1
+                    is_complete = part_data["remaining_chunks"] == 0
+                if is_complete:
+                    self._complete_part(part_key)
+
+            if len(orphan_ids) > 0:
+                self._delete_chunks(orphan_ids)
+
+        # Parts without chunks are completed (and failed documents removed) in the writer too
+        with self._lock:
+            empty_parts = self._empty_parts
+            self._empty_parts = []
+            failed_documents = self._failed_documents
+            self._failed_documents = []
+        for part_key in empty_parts:
+            self._complete_part(part_key)
+        for document_key in failed_documents:
+            self._fail_document(
+                document_key, self._documents.get(document_key, {}).get("error", None)
+            )
+
+    def fail_batch(self, batch: List[Tuple[int, Document]], error: Exception):
+        logging.error(f"Error embedding documents: {str(error)}")
+        with self._lock:
+            document_keys = dict.fromkeys(
+                self._parts[part_key]["document_key"]
+                for part_key, _ in batch
+                if part_key in self._parts
+            )
+        for document_key in document_keys:
+            self._fail_document(document_key, error)
+
+    def finish(self):
+        """
+        Complete the remaining parts without chunks, and discard the documents still
+        incomplete (their loading stopped in the middle, or the run was aborted)
+        """
+        self.write_batch([], [])
+        self.abort()
+
+    def abort(self):
+        """
+        Discard the documents not completed, and remove their chunks already written. No
+        batch is written after it
+        """
+        with self._lock:
+            incomplete_documents = [
+                (
+                    document_key,
+                    document_data["source"],
+                    document_data.get("error", None),
+                )
+                for document_key, document_data in self._documents.items()
+            ]
+            self._open_document = None
+            self._failed_documents = []
+        for document_key, source, error in incomplete_documents:
+            if error is None:
+                logging.warning(f"Discarding incomplete document {source}")
+            self._fail_document(document_key, error)
+
+    def _complete_part(self, part_key: int):
+        with self._lock:
+            part_data = self._parts.pop(part_key, None)
+            if part_data is None:
+                return
+            document_key = part_data["document_key"]
+            document_data = self._documents[document_key]
+            is_single_part = (
+                document_data["is_closed"] and document_data["num_parts"] == 1
+            )
+
+        if is_single_part:
+            document_data["page_content"] = part_data["page_content"]
+        else:
+            try:
+                # Save the part in the status store, so the whole text is never in memory
+                self.status_store.add_studied_document_part(
+                    document_id=document_data["source"],
+                    part=part_data["index"],
+                    page_content=part_data["page_content"],
+                )
+            except Exception as e:
+                self._fail_document(document_key, e)
+                return
+
+        with self._lock:
+            document_data["pending_parts"] -= 1
+            is_complete = (
+                document_data["is_closed"] and document_data["pending_parts"] == 0
+            )
+        if is_complete:
+            self._complete_document(document_key)
+
+    def _complete_document(self, document_key: int):
+        with self._lock:
+            document_data = self._documents.pop(document_key)
+        source = document_data["source"]
+
+        # The metadata of the first part, without the keys of the part
+        metadata = document_data["metadata"]
+        if document_data["num_parts"] > 1:
+            metadata = {
+                key: value
+                for key, value in metadata.items()
+                if key not in _PART_METADATA_KEYS
+            }
+
+        try:
+            # Save source document in status store
+            self.status_store.add_studied_document(
+                id=source,
+                source=source,
+                page_content=document_data.get("page_content", None),
+                metadata=metadata,
+            )
+        except Exception as e:
+            self.errors.append(e)
+            if self.on_document_done:
+                self.on_document_done(source, e)
+            return
+
+        self.results.append(source)  # append the id of the source document
+        if self.on_document_done:
+            self.on_document_done(source)
+
+    def _fail_document(self, document_key: int, error: Exception | None):
+        with self._lock:
+            document_data = self._documents.pop(document_key, None)
+            if document_data is None:
+                return
+            for part_key in [
+                part_key
+                for part_key, part_data in self._parts.items()
+                if part_data["document_key"] == document_key
+            ]:
+                self._parts.pop(part_key)
+        source = document_data["source"]
+
+        # Remove the chunks already written in previous batches
+        if len(document_data["written_ids"]) > 0:
+            self._delete_chunks(document_data["written_ids"])
+
+        # Remove the parts already saved
+        if document_data["num_parts"] > 1 or not document_data["is_closed"]:
+            try:
+                self.status_store.delete_studied_document(source)
+            except Exception as e:
+                logging.warning(f"Error deleting parts of failed document: {str(e)}")
+
+        if error is None:
+            return
+
+        self.errors.append(error)
+        if self.on_document_done:
+            self.on_document_done(source, error)
+
+    def _index_chunks(self, batch: List[Tuple[int, Document]], chunk_ids: List[str]):
+        # Lexical index of the hybrid search (the chunks of failed documents are removed later)
+        try:
+            self.status_store.add_lexical_chunks(
+                [
+                    (chunk_id, chunk.metadata.get("source", None), chunk.page_content)
+                    for (_, chunk), chunk_id in zip(batch, chunk_ids)
+                ]
+            )
+        except Exception as e:
+            logging.warning(f"Error indexing chunks for the lexical search: {str(e)}")
+
+    def _delete_chunks(self, chunk_ids: List[str]):
+        try:
+            self.chunks_store.delete(ids=chunk_ids)
+            self.status_store.delete_lexical_chunks(chunk_ids)
+        except Exception as e:
+            logging.warning(f"Error deleting chunks of failed document: {str(e)}")
@@ -0,0 +1,171 @@
+import os
+import logging
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Deque, Dict, List, Tuple
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+DEFAULT_ENCODE_WORKERS = 0  # 0: one worker per _CORES_PER_ENCODE_WORKER CPU cores
+DEFAULT_TORCH_THREADS = 0  # 0: the CPU cores shared among the encode workers
+_CORES_PER_ENCODE_WORKER = 8  # Beyond, intra-op threads barely speed up a batch
+
+Batch = List[Tuple[int, Document]]
+# (batch, vectors or the error embedding/storing the batch, ids of the chunks already stored)
+BatchResult = Tuple[Batch, List[List[float]] | Exception, List[str] | None]
+
+
+def get_encode_workers(config: Dict[str, Any]) -> int:
+    study_config = config.get("study", None) or {}
+    try:
+        encode_workers = int(
+            study_config.get("encode_workers", DEFAULT_ENCODE_WORKERS) or 0
+        )
+    except (TypeError, ValueError):
+        encode_workers = DEFAULT_ENCODE_WORKERS
+
+    if encode_workers > 0:
+        return encode_workers
+
+    # A model on a GPU is shared by a single worker
+    embeddings_config = config.get("embeddings", None) or {}
+    model_kwargs = embeddings_config.get("model_kwargs", None) or {}
+    if str(model_kwargs.get("device", "cpu")).lower() != "cpu":
+        return 1
+
+    return max(1, (os.cpu_count() or 1) // _CORES_PER_ENCODE_WORKER)
+
+
+def get_torch_threads(config: Dict[str, Any], encode_workers: int) -> int:
+    """
+    Number of intra-op threads of torch, 0 to keep the default of torch (all the cores)
+    """
+    study_config = config.get("study", None) or {}
+    try:
+        torch_threads = int(
+            study_config.get("torch_threads", DEFAULT_TORCH_THREADS) or 0
+        )
+    except (TypeError, ValueError):
+        torch_threads = DEFAULT_TORCH_THREADS
+
+    if torch_threads > 0 or encode_workers <= 1:
+        return torch_threads
+
+    # Don't oversubscribe the cores: each encode worker runs its own intra-op threads
+    return max(1, (os.cpu_count() or 1) // encode_workers)
+
+
+def configure_torch_threads(torch_threads: int):
+    if torch_threads <= 0:
+        return
+
+    try:
+        import torch
+    except ImportError:
+        return
+
+    if torch.get_num_threads() != torch_threads:
+        logging.debug(f"Setting torch intra-op threads to {torch_threads}")
+        torch.set_num_threads(torch_threads)
+
+
+class EmbeddingExecutor:
+    """
+    Encodes the batches of a ChunkBatcher in encode_workers threads (the model releases the
+    GIL while encoding). The results are returned in the order of the batches to a single
+    writer, the thread submitting the batches or consuming the results, which owns the status
+    store and serializes the writes to the vector stores that are not thread-safe (Chroma).
+    Thread-safe vector stores are written by the encode workers. At most 2 * encode_workers
+    batches are in flight.
+    """
+
+    def __init__(
+        self,
+        batcher: Any,
+        embeddings: Embeddings,
+        encode_workers: int = 1,
+        write_in_workers: bool = False,
+    ):
+        self.batcher = batcher
+        self.embeddings = embeddings
+        self.encode_workers = max(1, encode_workers)
+        self.write_in_workers = write_in_workers
+
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.encode_workers, thread_name_prefix="chatnerd-encode"
+        )
+        self._pending: Deque[Tuple[Batch, Future]] = deque()
+
+    @classmethod
+    def from_config(
+        cls, config: Dict[str, Any], batcher: Any, embeddings: Embeddings
+    ) -> "EmbeddingExecutor":
+        encode_workers = get_encode_workers(config)
+        configure_torch_threads(get_torch_threads(config, encode_workers))
+
+        return cls(
+            batcher,
+            embeddings,
+            encode_workers=encode_workers,
+            write_in_workers=batcher.chunks_store.is_thread_safe(),
+        )
+
+    def submit(self, batches: List[Batch]) -> List[BatchResult]:
+        """
+        Submit batches to the encode workers and return the results completed (in order).
+        Waits for the oldest batches while too many batches are in flight
+        """
+        results = []
+        for batch in batches:
+            self._pending.append((batch, self._executor.submit(self._encode, batch)))
+            while len(self._pending) > 2 * self.encode_workers:
+                results.append(self._pop_result())
+
+        while len(self._pending) > 0 and self._pending[0][1].done():
+            results.append(self._pop_result())
+
+        return results
+
+    def drain(self) -> List[BatchResult]:
+        """
+        Wait for all the batches in flight and return their results (in order)
+        """
+        results = []
+        while len(self._pending) > 0:
+            results.append(self._pop_result())
+
+        return results
+
+    def shutdown(self):
+        """
+        Stop the encode workers. The chunks of the batches in flight written by the workers
+        are deleted
+        """
+        for _, future in self._pending:
+            future.cancel()
+        for _, _, chunk_ids in self.drain():
+            if chunk_ids:
+                try:
+                    self.batcher.chunks_store.delete(ids=chunk_ids)
+                except Exception as e:
+                    logging.warning(
+                        f"Error deleting chunks of discarded batch: {str(e)}"
+                    )
+
+        self._executor.shutdown(wait=True)
+
+    def _pop_result(self) -> BatchResult:
+        batch, future = self._pending.popleft()
+        try:
+            vectors, chunk_ids = future.result()
+        except Exception as e:
+            return batch, e, None
+
+        return batch, vectors, chunk_ids
+
+    def _encode(self, batch: Batch) -> Tuple[List[List[float]], List[str] | None]:
+        vectors = self.batcher.embed_batch(self.embeddings, batch)
+        if not self.write_in_workers or len(batch) == 0:
+            return vectors, None
+
+        return vectors, self.batcher.store_batch(batch, vectors)
@@ -0,0 +1,164 @@
+import re
+import logging
+from typing import Any, Dict, List, Optional
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.vectorstores import VectorStore, VectorStoreRetriever
+from chatnerd.langchain.rank_fusion import FUSION_RRF, DEFAULT_RRF_K, fuse_results
+from chatnerd.stores.store_base import RETRIEVAL_SCORE_KEY
+
+SEARCH_TYPE_HYBRID = "hybrid"
+DEFAULT_LEXICAL_WEIGHT = 1.0  # Weight of the lexical results vs. the dense ones
+# Words, and codes with inner separators (ex. "XK-4821", "v2.1")
+_TERM_PATTERN = re.compile(r"\w+(?:[-./:]\w+)*")
+
+
+def is_hybrid_search(config: Dict[str, Any]) -> bool:
+    """
+    Whether the retriever uses the lexical search, so the chunks are indexed when studied
+    """
+    retriever_config = config.get("retriever", None) or {}
+    return retriever_config.get("search_type", None) == SEARCH_TYPE_HYBRID
+
+
+def build_lexical_query(query: str) -> str:
+    """
+    FTS5 match query of the terms of a question: any term (OR), the codes with separators as
+    phrases of their parts. The syntax characters of FTS5 in the question are ignored
+    """
+    terms = []
+    for term in _TERM_PATTERN.findall(query.lower()):
+        phrase = '"' + " ".join(re.findall(r"\w+", term)) + '"'
+        if phrase not in terms:
+            terms.append(phrase)
+
+    return " OR ".join(terms)
+
+
+def get_lexical_filter_source(filter: Optional[Dict[str, Any]]) -> str | None:
+    source = (filter or {}).get("source", None)
+    return source if isinstance(source, str) else None
+
+
+def matches_filter(document: Document, filter: Optional[Dict[str, Any]]) -> bool:
+    """
+    Filters with plain values (ex. {"source": "..."}) of the dense search, applied to the
+    lexical results. Other filters (operators) are not supported by the lexical search
+    """
+    return all(
+        document.metadata.get(key, None) == value
+        for key, value in (filter or {}).items()
+    )
+
+
+def is_lexical_filter_supported(filter: Optional[Dict[str, Any]]) -> bool:
+    return all(
+        not key.startswith("$") and not isinstance(value, (dict, list))
+        for key, value in (filter or {}).items()
+    )
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Fuses the results of the dense retriever (search type "similarity") and of the lexical
+    search of the chunks (BM25 over the FTS5 index of the status store, built when the
+    documents are studied). Exact terms (codes, names) missed by the embeddings are found by
+    the lexical search. Each query returns the k best fused chunks
+    """
+
+    dense_retriever: VectorStoreRetriever
+    store_factory: Any
+    lexical_k: Optional[int] = None  # Chunks of the lexical search. Default: k
+    lexical_weight: float = DEFAULT_LEXICAL_WEIGHT
+    fusion: str = FUSION_RRF
+    rrf_k: int = DEFAULT_RRF_K
+
+    @property
+    def vectorstore(self) -> VectorStore:
+        return self.dense_retriever.vectorstore
+
+    @property
+    def search_type(self) -> str:
+        return SEARCH_TYPE_HYBRID
+
+    @property
+    def search_kwargs(self) -> Dict[str, Any]:
+        return self.dense_retriever.search_kwargs
+
+    def get_k(self) -> int:
+        return int(self.search_kwargs.get("k", 4))
+
+    def lexical_search(self, queries: List[str]) -> List[List[Document]]:
+        """
+        The lexical results of each query, with their BM25 score in metadata. The chunks are
+        fetched from the vector store in a single call
+        """
+        filter = self.search_kwargs.get("filter", None)
+        if not is_lexical_filter_supported(filter):
+            logging.debug(f"Lexical search skipped, unsupported filter: {filter}")
+            return [[] for _ in queries]
+
+        status_store = self.store_factory.get_shared_status_store()
+        lexical_k = int(self.lexical_k or self.get_k())
+        source = get_lexical_filter_source(filter)
+        query_hits = [
+            status_store.search_lexical_chunks(
+                build_lexical_query(query), k=lexical_k, source=source
+            )
+            for query in queries
+        ]
+
+        chunk_ids = list(
+            dict.fromkeys(chunk_id for hits in query_hits for chunk_id, _ in hits)
+        )
+        if len(chunk_ids) == 0:
+            return [[] for _ in queries]
+        chunks = {
+            chunk.id: chunk for chunk in self.vectorstore.get_chunks_by_ids(chunk_ids)
+        }
+
+        results = []
+        for hits in query_hits:
+            documents = []
+            for chunk_id, score in hits:
+                chunk = chunks.get(chunk_id, None)
+                # Chunks indexed but not in the vector store anymore are skipped
+                if chunk is None or not matches_filter(chunk, filter):
+                    continue
+                documents.append(
+                    Document(
+                        id=chunk.id,
+                        page_content=chunk.page_content,
+                        metadata={**chunk.metadata, RETRIEVAL_SCORE_KEY: score},
+                    )
+                )
+            results.append(documents)
+
+        return results
+
+    def fuse(
+        self, dense_results: List[List[Document]], lexical_results: List[List[Document]]
+    ) -> List[List[Document]]:
+        """
+        The k best chunks of each query, with the fused score as retrieval score
+        """
+        return [
+            fuse_results(
+                [dense_documents, lexical_documents],
+                fusion=self.fusion,
+                rrf_k=self.rrf_k,
+                weights=[1.0, float(self.lexical_weight)],
+                top_n=self.get_k(),
+                fused_score_key=RETRIEVAL_SCORE_KEY,
+            )
+            for dense_documents, lexical_documents in zip(
+                dense_results, lexical_results
+            )
+        ]
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        dense_documents = self.dense_retriever.invoke(query)
+        return self.fuse([dense_documents], self.lexical_search([query]))[0]
@@ -1,4 +1,5 @@
 import logging
+from pathlib import Path
 from typing import Any, Callable, Dict, Optional, Tuple
 from langchain_core.language_models import BaseLanguageModel
 from langchain_core.embeddings import Embeddings
@@ -16,6 +17,84 @@ class LLMFactory:
         self.callback = callback
 
     def get_embedding_function(self) -> Embeddings:
+        provider = str(self.config["embeddings"].get("provider", "huggingface")).lower()
+        model_client = None
+        if provider in ["huggingface", "onnx"]:
+            model_client = self.get_model_client()
+
+        if model_client is not None:
+            from chatnerd.langchain.model_server import RemoteEmbeddings
+
+            embeddings = RemoteEmbeddings(model_client, self.config)
+        else:
+            embeddings = self._get_model_embedding_function()
+
+        # Look up the persistent embedding cache before calling the model
+        cache_config = self.config["embeddings"].get("cache", None) or {}
+        if cache_config.get("enabled", False):
+            from chatnerd.stores.store_factory import StoreFactory
+            from chatnerd.langchain.cached_embeddings import CachedEmbeddings
+
+            try:
+                cache_store = StoreFactory(self.config).get_embedding_cache_store()
+            except Exception as e:
+                logging.warning(
+                    f"Error opening the embedding cache, embeddings are not cached: {str(e)}"
+                )
+                return embeddings
+
+            return CachedEmbeddings(
+                embeddings,
+                cache_store=cache_store,
+                model_key=CachedEmbeddings.get_model_key(self.config["embeddings"]),
+            )
+
+        return embeddings
+
+    def get_model_client(self) -> Any | None:
+        """
+        Returns the client of the model server when it is enabled and running, None to load
+        the models in this process
+        """
+        model_server_config = self.config.get("model_server", None) or {}
+        if not model_server_config.get("enabled", False):
+            return None
+
+        from chatnerd.config import Config
+        from chatnerd.langchain.model_server import get_model_client, get_socket_path
+
+        socket_path = get_socket_path(
+            model_server_config, Config.instance().PROJECTS_DIRECTORY_PATH
+        )
+        model_client = get_model_client(socket_path)
+        if model_client.ping() is None:
+            logging.warning(
+                f"Model server not running on {socket_path}, loading the models in this process. "
+                "Start it with 'chatnerd server start --detach'"
+            )
+            return None
+
+        return model_client
+
+    def get_cross_encoder(self, reranker_config: Dict[str, Any]) -> Any:
+        """
+        Returns the cross-encoder of the reranker: served by the model server if running, or
+        shared by the process (see RerankerRegistry)
+        """
+        model_client = self.get_model_client()
+        if model_client is not None:
+            from chatnerd.langchain.model_server import RemoteCrossEncoder
+            from chatnerd.langchain.reranker_registry import get_cross_encoder_config
+
+            return RemoteCrossEncoder(
+                model_client, get_cross_encoder_config(reranker_config)
+            )
+
+        from chatnerd.langchain.reranker_registry import CrossEncoderReranker
+
+        return CrossEncoderReranker(reranker_config)
+
+    def _get_model_embedding_function(self) -> Embeddings:
         embeddings_config = {**self.config["embeddings"]}
 
         model_name = str(embeddings_config["model_name"]).lower()
@@ -41,6 +120,42 @@ class LLMFactory:
             except Exception as e:
                 logging.error(f"Error initializing HuggingFaceEmbeddings: {str(e)}")
                 raise
+        elif provider == "onnx":
+            from chatnerd.config import Config
+            from chatnerd.langchain.onnx_embeddings import get_onnx_embeddings
+            from chatnerd.langchain.embedding_executor import (
+                get_encode_workers,
+                get_torch_threads,
+            )
+
+            if "normalize_embeddings" not in encode_kwargs:
+                encode_kwargs["normalize_embeddings"] = True
+
+            # onnxruntime threads share the CPU cores among the encode workers like torch
+            onnx_config = embeddings_config.get("onnx", None) or {}
+            if not onnx_config.get("threads", None):
+                onnx_config = onnx_config | {
+                    "threads": get_torch_threads(
+                        self.config, get_encode_workers(self.config)
+                    )
+                }
+
+            try:
+                return get_onnx_embeddings(
+                    model_name=model_name,
+                    store_directory=str(
+                        Path(
+                            self.config["_project_base_path"],
+                            Config._PROJECT_STORE_DIRECTORYNAME,
+                        )
+                    ),
+                    onnx_config=onnx_config,
+                    model_kwargs=model_kwargs,
+                    encode_kwargs=encode_kwargs,
+                )
+            except Exception as e:
+                logging.error(f"Error initializing ONNX embeddings: {str(e)}")
+                raise
         elif provider == "openai":
             from langchain_openai import OpenAIEmbeddings
 
@@ -107,9 +222,29 @@ class LLMFactory:
 
                     llm = OpenAI(**selected_model_config)
             case "llamacpp":
-                llm = self.load_llm_from_config(
-                    device_type=device_type, **selected_model_config
-                )
+                model_client = self.get_model_client()
+                if model_client is not None:
+                    from chatnerd.langchain.model_server import RemoteLLM
+
+                    # The model server loads the model with the same preset
+                    llm = RemoteLLM(
+                        model_client=model_client,
+                        preset_config={
+                            "default_model": selected_model,
+                            "is_chat": is_chat,
+                            "device_type": device_type,
+                            "models": {
+                                selected_model: {
+                                    **selected_model_config,
+                                    "provider": llm_provider,
+                                }
+                            },
+                        },
+                    )
+                else:
+                    llm = self.load_llm_from_config(
+                        device_type=device_type, **selected_model_config
+                    )
             case _:
                 raise ValueError(
                     f"Uknown LLM provider '{llm_provider}'. Please use 'ollama', 'openai' or 'llamacpp'."
@@ -0,0 +1,438 @@
+import os
+import json
+import logging
+import secrets
+import threading
+from pathlib import Path
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Connection, Listener
+from typing import Any, Callable, Dict, List, Optional
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.llms import LLM
+from langchain_core.callbacks import CallbackManagerForLLMRun
+from chatnerd.langchain.reranker_registry import get_cross_encoder_config
+from chatnerd.lib.helpers import get_embeddings_client
+
+DEFAULT_SOCKET_NAME = ".chatnerd_model_server.sock"  # In the projects directory
+_AUTHKEY_SUFFIX = (
+    ".key"  # The authentication key is saved next to the socket (mode 600)
+)
+
+
+def get_socket_path(model_server_config: Dict[str, Any], projects_path: str) -> str:
+    socket_path = model_server_config.get("socket_path", None)
+    if not socket_path:
+        socket_path = str(Path(projects_path, DEFAULT_SOCKET_NAME))
+
+    return str(Path(socket_path).expanduser().resolve())
+
+
+def get_embeddings_config(config: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    The part of the project config defining the embedding model (the key of the model in the
+    server). The embedding cache stays in the client
+    """
+    embeddings_config = {
+        key: value
+        for key, value in (config.get("embeddings", None) or {}).items()
+        if key != "cache"
+    }
+    model_config = {"embeddings": embeddings_config}
+    if str(embeddings_config.get("provider", "")).lower() == "onnx":
+        # The ONNX model is exported in the store directory of the project
+        model_config["_project_base_path"] = config.get("_project_base_path", None)
+        model_config["study"] = config.get("study", None) or {}
+
+    return model_config
+
+
+class ModelServer:
+    """
+    Keeps the embedding models, the cross-encoders and the local LLMs loaded, and serves them
+    on a Unix socket to the chatnerd commands (see ModelClient). The models are loaded on the
+    first request and kept by the key of their config, so many projects can share the server.
+    Each connection is served in a thread, and the calls to a model are serialized.
+    """
+
+    def __init__(self, socket_path: str):
+        self.socket_path = socket_path
+        self._models: Dict[str, Any] = {}
+        self._model_locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self._listener: Listener | None = None
+        self._is_stopping = False
+
+    def serve_forever(self):
+        authkey = secrets.token_bytes(32)
+        authkey_path = Path(self.socket_path + _AUTHKEY_SUFFIX)
+        Path(self.socket_path).parent.mkdir(parents=True, exist_ok=True)
+        if Path(self.socket_path).exists():
+            if ModelClient(self.socket_path).ping():
+                raise RuntimeError(
+                    f"A model server is already running on {self.socket_path}"
+                )
+            os.unlink(self.socket_path)
+
+        # Only the user can read the key and connect to the socket
+        fd = os.open(authkey_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "wb") as authkey_file:
+            # The mode of an existing key file is set before writing the key
+            os.fchmod(authkey_file.fileno(), 0o600)
+            authkey_file.write(authkey)
+        previous_umask = os.umask(0o177)
+        try:
+            self._listener = Listener(
+                self.socket_path, family="AF_UNIX", authkey=authkey
+            )
+        finally:
+            os.umask(previous_umask)
+
+        logging.info(f"Model server listening on {self.socket_path}")
+        try:
+            while not self._is_stopping:
+                try:
+                    connection = self._listener.accept()
+                except Exception as e:
+                    if self._is_stopping:
+                        break
+                    logging.warning(f"Model server connection refused: {str(e)}")
+                    continue
+
+                if self._is_stopping:
+                    connection.close()
+                    break
+
+                threading.Thread(
+                    target=self._serve_connection, args=(connection,), daemon=True
+                ).start()
+        finally:
+            self._close()
+
+    def preload(self, config: Dict[str, Any]):
+        """
+        Loads the embedding model and the cross-encoder of a project before serving
+        """
+        self._call_model("embeddings", get_embeddings_config(config), lambda _: None)
+        reranker_config = config.get("reranker", None) or {}
+        if reranker_config.get("model_name", None):
+            self._call_model(
+                "cross_encoder",
+                get_cross_encoder_config(reranker_config),
+                lambda _: None,
+            )
+
+    def stop(self):
+        self._is_stopping = True
+        if self._listener is not None:
+            try:
+                # Unblock accept()
+                ModelClient(self.socket_path).ping()
+            except Exception:
+                pass
+
+    def _close(self):
+        try:
+            self._listener.close()
+        except Exception:
+            pass
+        for path in [self.socket_path, self.socket_path + _AUTHKEY_SUFFIX]:
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+        logging.info("Model server stopped")
+
+    def _serve_connection(self, connection: Connection):
+        with connection:
+            while True:
+                try:
+                    method, kwargs = connection.recv()
+                except (EOFError, OSError):
+                    return
+                if self._is_stopping:
+                    return
+
+                try:
+                    response = {"result": self._handle(method, **kwargs)}
+                except Exception as e:
+                    logging.error(f"Model server error in '{method}': {str(e)}")
+                    response = {"error": f"{e.__class__.__name__}: {str(e)}"}
+
+                try:
+                    connection.send(response)
+                except (EOFError, OSError):
+                    return
+
+                if method == "stop":
+                    self.stop()
+                    return
+
+    def _handle(self, method: str, **kwargs) -> Any:
+        if method == "ping":
+            return {"pid": os.getpid(), "models": list(self._models.keys())}
+        if method == "stop":
+            return True
+        if method == "embed_documents":
+            return self._call_model(
+                "embeddings",
+                kwargs["config"],
+                lambda embeddings: embeddings.embed_documents(kwargs["texts"]),
+            )
+        if method == "embed_query":
+            return self._call_model(
+                "embeddings",
+                kwargs["config"],
+                lambda embeddings: embeddings.embed_query(kwargs["text"]),
+            )
+        if method == "embed_queries":
+            from chatnerd.langchain.multi_query_retrieval import embed_queries
+
+            return self._call_model(
+                "embeddings",
+                kwargs["config"],
+                lambda embeddings: embed_queries(embeddings, kwargs["texts"]),
+            )
+        if method == "embeddings_info":
+            return self._call_model(
+                "embeddings", kwargs["config"], self._get_embeddings_info
+            )
+        if method == "rerank":
+            return self._call_model(
+                "cross_encoder",
+                kwargs["config"],
+                lambda cross_encoder: [
+                    float(score)
+                    for score in cross_encoder.predict(
+                        kwargs["pairs"], batch_size=kwargs["batch_size"]
+                    )
+                ],
+            )
+        if method == "generate":
+            return self._call_model(
+                "llm",
+                kwargs["config"],
+                lambda llm: llm.invoke(kwargs["prompt"], stop=kwargs.get("stop", None)),
+            )
+
+        raise ValueError(f"Unknown method '{method}'")
+
+    def _call_model(
+        self, model_type: str, config: Dict[str, Any], call: Callable[[Any], Any]
+    ) -> Any:
+        model_key = model_type + ":" + json.dumps(config, sort_keys=True, default=str)
+        with self._lock:
+            model_lock = self._model_locks.setdefault(model_key, threading.Lock())
+
+        with model_lock:
+            model = self._models.get(model_key, None)
+            if model is None:
+                logging.info(f"Loading {model_type} model...")
+                model = self._load_model(model_type, config)
+                self._models[model_key] = model
+
+            return call(model)
+
+    @staticmethod
+    def _load_model(model_type: str, config: Dict[str, Any]) -> Any:
+        from chatnerd.langchain.llm_factory import LLMFactory
+
+        if model_type == "embeddings":
+            return LLMFactory(config)._get_model_embedding_function()
+        if model_type == "cross_encoder":
+            from sentence_transformers import CrossEncoder
+
+            return CrossEncoder(**config)
+        if model_type == "llm":
+            return LLMFactory(config).get_model(
+                selected_model=config["default_model"], is_chat=config["is_chat"]
+            )[0]
+
+        raise ValueError(f"Unknown model type '{model_type}'")
+
+    @staticmethod
+    def _get_embeddings_info(embeddings: Embeddings) -> Dict[str, Any]:
+        from chatnerd.langchain.document_embedder import DocumentEmbedder
+
+        client = get_embeddings_client(embeddings)
+        dimension = None
+        if hasattr(client, "get_sentence_embedding_dimension"):
+            dimension = client.get_sentence_embedding_dimension()
+
+        return {
+            "max_seq_length": DocumentEmbedder.get_max_seq_length(embeddings),
+            "dimension": dimension,
+        }
+
+
+class ModelClient:
+    """
+    Client of the model server. A connection is opened per thread and kept open
+    """
+
+    def __init__(self, socket_path: str):
+        self.socket_path = socket_path
+        self._local = threading.local()
+
+    def call(self, method: str, **kwargs) -> Any:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            authkey = Path(self.socket_path + _AUTHKEY_SUFFIX).read_bytes()
+            connection = Client(self.socket_path, family="AF_UNIX", authkey=authkey)
+            self._local.connection = connection
+
+        try:
+            connection.send((method, kwargs))
+            response = connection.recv()
+        except (EOFError, OSError):
+            self._local.connection = None
+            connection.close()
+            raise
+
+        if "error" in response:
+            raise RuntimeError(f"Model server error: {response['error']}")
+        return response["result"]
+
+    def ping(self) -> Dict[str, Any] | None:
+        """
+        Returns the status of the server, None if it is not running or rejects the key (ex.
+        the key file of a previous server)
+        """
+        try:
+            return self.call("ping")
+        except (
+            FileNotFoundError,
+            ConnectionError,
+            EOFError,
+            OSError,
+            AuthenticationError,
+        ) as e:
+            logging.debug(f"Model server not available: {str(e)}")
+            return None
+
+
+_model_clients: Dict[str, ModelClient] = {}
+_model_clients_lock = threading.Lock()
+
+
+def get_model_client(socket_path: str) -> ModelClient:
+    """
+    Returns the client of the server on socket_path, shared in the process
+    """
+    with _model_clients_lock:
+        if socket_path not in _model_clients:
+            _model_clients[socket_path] = ModelClient(socket_path)
+        return _model_clients[socket_path]
+
+
+class _RemoteModelInfo:
+    """
+    Replaces the sentence-transformers client of the remote embeddings: the tokenizer is
+    loaded locally (only used to split documents) and the model settings come from the server
+    """
+
+    def __init__(self, model_name: str, info: Dict[str, Any]):
+        self.model_name = model_name
+        self.max_seq_length = info.get("max_seq_length", None)
+        self._dimension = info.get("dimension", None)
+        self._tokenizer = None
+
+    @property
+    def tokenizer(self) -> Any:
+        if self._tokenizer is None:
+            from transformers import AutoTokenizer
+
+            try:
+                self._tokenizer = AutoTokenizer.from_pretrained(
+                    self.model_name, use_fast=True
+                )
+            except Exception as e:
+                logging.warning(
+                    f"Error loading the tokenizer of {self.model_name}: {str(e)}"
+                )
+                self._tokenizer = False
+
+        return self._tokenizer or None
+
+    def get_sentence_embedding_dimension(self) -> int | None:
+        return self._dimension
+
+
+class RemoteEmbeddings(Embeddings):
+    """
+    Embedding model running in the model server
+    """
+
+    def __init__(self, model_client: ModelClient, config: Dict[str, Any]):
+        self.model_client = model_client
+        self.config = get_embeddings_config(config)
+        self._client: _RemoteModelInfo | None = None
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if len(texts) == 0:
+            return []
+        return self.model_client.call(
+            "embed_documents", config=self.config, texts=texts
+        )
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.model_client.call("embed_query", config=self.config, text=text)
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        if len(texts) == 0:
+            return []
+        return self.model_client.call("embed_queries", config=self.config, texts=texts)
+
+    @property
+    def client(self) -> _RemoteModelInfo:
+        if self._client is None:
+            self._client = _RemoteModelInfo(
+                self.config["embeddings"]["model_name"],
+                self.model_client.call("embeddings_info", config=self.config),
+            )
+        return self._client
+
+
+class RemoteCrossEncoder:
+    """
+    Cross-encoder running in the model server, with the interface of CrossEncoder.predict
+    """
+
+    def __init__(self, model_client: ModelClient, config: Dict[str, Any]):
+        self.model_client = model_client
+        self.config = config
+
+    def preload(self):
+        # Loaded by the server on its first request (or preloaded on start)
+        pass
+
+    def predict(self, pairs: List[List[str]], batch_size: int = 32) -> List[float]:
+        return self.model_client.call(
+            "rerank",
+            config=self.config,
+            pairs=[list(pair) for pair in pairs],
+            batch_size=batch_size,
+        )
+
+
+class RemoteLLM(LLM):
+    """
+    Local LLM (llamacpp) running in the model server
+    """
+
+    model_client: Any
+    preset_config: Dict[str, Any]
+
+    @property
+    def _llm_type(self) -> str:
+        return "chatnerd_model_server"
+
+    def _call(
+        self,
+        prompt: str,
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> str:
+        return self.model_client.call(
+            "generate", config=self.preset_config, prompt=prompt, stop=stop
+        )
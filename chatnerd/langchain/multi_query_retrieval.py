@@ -0,0 +1,120 @@
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Tuple
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStoreRetriever
+from chatnerd.langchain.hybrid_retrieval import HybridRetriever
+from chatnerd.stores.store_base import StoreBase, MAX_SEARCH_WORKERS
+
+# Embeddings whose embed_query is embed_documents of a single text
+_BATCH_QUERY_EMBEDDINGS = ["HuggingFaceEmbeddings", "OpenAIEmbeddings"]
+
+
+def embed_queries(embeddings: Embeddings, queries: List[str]) -> List[List[float]]:
+    """
+    Embeds many queries in a single call to the model when the queries are embedded like the
+    documents, or one by one otherwise (ex. models with a query instruction)
+    """
+    if len(queries) == 0:
+        return []
+    if hasattr(embeddings, "embed_queries"):
+        return embeddings.embed_queries(queries)
+    if type(embeddings).__name__ in _BATCH_QUERY_EMBEDDINGS and not getattr(
+        embeddings, "query_encode_kwargs", None
+    ):
+        return embeddings.embed_documents(queries)
+
+    return [embeddings.embed_query(query) for query in queries]
+
+
+def retrieve_multi_query(
+    retriever: VectorStoreRetriever | HybridRetriever, queries: List[str]
+) -> Tuple[List[List[Document]], Dict[str, Any]]:
+    """
+    Retrieves the documents of many queries (ex. the expanded questions). With search type
+    "similarity", the queries are embedded in one batch and searched in one batch request.
+    Otherwise ("mmr", "similarity_score_threshold"), the retriever is invoked once per query,
+    concurrently when the store is thread-safe. With search type "hybrid", the dense results
+    are fused with the lexical ones. Returns the documents of each query and the timings in
+    seconds: total, embed and search (batch mode), lexical (hybrid) and per query (other modes)
+    """
+    if isinstance(retriever, HybridRetriever):
+        dense_results, timings = retrieve_multi_query(
+            retriever.dense_retriever, queries
+        )
+        lexical_start = time.perf_counter()
+        lexical_results = retriever.lexical_search(queries)
+        end = time.perf_counter()
+
+        return retriever.fuse(dense_results, lexical_results), {
+            **timings,
+            "total": timings["total"] + end - lexical_start,
+            "lexical": end - lexical_start,
+        }
+
+    store = retriever.vectorstore
+    start = time.perf_counter()
+
+    if (
+        retriever.search_type == "similarity"
+        and isinstance(store, StoreBase)
+        and store.embeddings is not None
+    ):
+        vectors = embed_queries(store.embeddings, queries)
+        embedded = time.perf_counter()
+        results = store.similarity_search_by_vectors(vectors, **retriever.search_kwargs)
+        end = time.perf_counter()
+
+        return results, {
+            "mode": "batch",
+            "total": end - start,
+            "embed": embedded - start,
+            "search": end - embedded,
+            "queries": None,
+        }
+
+    def invoke(query: str) -> Tuple[List[Document], float]:
+        query_start = time.perf_counter()
+        documents = retriever.invoke(query)
+        return documents, time.perf_counter() - query_start
+
+    is_concurrent = (
+        len(queries) > 1 and isinstance(store, StoreBase) and store.is_thread_safe()
+    )
+    if is_concurrent:
+        with ThreadPoolExecutor(
+            max_workers=min(len(queries), MAX_SEARCH_WORKERS)
+        ) as executor:
+            query_results = list(executor.map(invoke, queries))
+    else:
+        query_results = [invoke(query) for query in queries]
+
+    return [documents for documents, _ in query_results], {
+        "mode": "concurrent" if is_concurrent else "sequential",
+        "total": time.perf_counter() - start,
+        "embed": None,
+        "search": None,
+        "queries": [query_time for _, query_time in query_results],
+    }
+
+
+def log_retrieval_timings(
+    queries: List[str], results: List[List[Document]], timings: Dict[str, Any]
+):
+    if not logging.getLogger().isEnabledFor(logging.DEBUG):
+        return
+
+    summary = f"Retrieved {len(queries)} queries in {timings['total'] * 1000:.0f} ms ({timings['mode']}"
+    if timings["embed"] is not None:
+        summary += f", embed {timings['embed'] * 1000:.0f} ms, search {timings['search'] * 1000:.0f} ms"
+    if timings.get("lexical", None) is not None:
+        summary += f", lexical {timings['lexical'] * 1000:.0f} ms"
+    logging.debug(summary + ")")
+
+    for i, (query, documents) in enumerate(zip(queries, results)):
+        query_time = ""
+        if timings["queries"] is not None:
+            query_time = f" in {timings['queries'][i] * 1000:.0f} ms"
+        logging.debug(f"- {len(documents)} documents{query_time}: {query}")
@@ -0,0 +1,119 @@
+import re
+import shutil
+import logging
+from pathlib import Path
+from typing import Any, Dict
+from langchain_core.embeddings import Embeddings
+
+ONNX_DIRECTORY_NAME = "onnx"  # Exported models, in the store directory of the project
+ONNX_MODEL_FILE_NAME = "onnx/model.onnx"
+DEFAULT_QUANTIZATION = "avx2"  # Supported by most x86-64 CPUs
+_QUANTIZATION_CONFIGS = ["arm64", "avx2", "avx512", "avx512_vnni"]
+
+
+def get_quantization(onnx_config: Dict[str, Any]) -> str | None:
+    """
+    Returns the dynamic int8 quantization config ("avx2", "arm64"...), None without quantization
+    """
+    quantize = onnx_config.get("quantize", False)
+    if not quantize:
+        return None
+    if quantize is True:
+        return DEFAULT_QUANTIZATION
+
+    quantize = str(quantize).lower()
+    if quantize not in _QUANTIZATION_CONFIGS:
+        raise ValueError(
+            f"Unknown quantization '{quantize}', expected one of {_QUANTIZATION_CONFIGS}"
+        )
+    return quantize
+
+
+def export_onnx_model(
+    model_name: str, model_directory: Path, quantization: str | None = None
+) -> str:
+    """
+    Exports the sentence-transformers model to ONNX (and quantizes it) once, and returns the
+    path of the ONNX file relative to model_directory
+    """
+    from sentence_transformers import SentenceTransformer
+
+    file_name = ONNX_MODEL_FILE_NAME
+    if quantization:
+        file_name = f"onnx/model_qint8_{quantization}.onnx"
+    if Path(model_directory, file_name).exists():
+        return file_name
+
+    if not Path(model_directory, ONNX_MODEL_FILE_NAME).exists():
+        logging.info(f"Exporting embedding model {model_name} to ONNX...")
+        # Export to a temporary directory, so an interrupted export is never loaded
+        export_directory = model_directory.with_name(model_directory.name + ".tmp")
+        shutil.rmtree(export_directory, ignore_errors=True)
+        model = SentenceTransformer(model_name, backend="onnx", device="cpu")
+        model.save_pretrained(str(export_directory))
+        shutil.rmtree(model_directory, ignore_errors=True)
+        export_directory.rename(model_directory)
+
+    if quantization:
+        from sentence_transformers import export_dynamic_quantized_onnx_model
+
+        logging.info(f"Quantizing embedding model {model_name} ({quantization})...")
+        model = SentenceTransformer(
+            str(model_directory),
+            backend="onnx",
+            device="cpu",
+            model_kwargs={"file_name": ONNX_MODEL_FILE_NAME},
+        )
+        export_dynamic_quantized_onnx_model(
+            model, quantization, str(model_directory), push_to_hub=False
+        )
+
+    return file_name
+
+
+def get_onnx_embeddings(
+    model_name: str,
+    store_directory: str,
+    onnx_config: Dict[str, Any],
+    model_kwargs: Dict[str, Any],
+    encode_kwargs: Dict[str, Any],
+) -> Embeddings:
+    """
+    HuggingFaceEmbeddings running the model exported to ONNX on onnxruntime (CPU). The model
+    is exported in .nerd_store/onnx/ (or onnx.export_directory) on the first run
+    """
+    from langchain_huggingface import HuggingFaceEmbeddings
+
+    export_directory = onnx_config.get("export_directory", None) or str(
+        Path(store_directory, ONNX_DIRECTORY_NAME)
+    )
+    model_directory = Path(
+        export_directory, re.sub(r"[^\w.-]+", "--", model_name)
+    ).expanduser()
+    model_directory.parent.mkdir(parents=True, exist_ok=True)
+    file_name = export_onnx_model(
+        model_name, model_directory, get_quantization(onnx_config)
+    )
+
+    onnx_model_kwargs = {
+        "file_name": file_name,
+        "provider": "CPUExecutionProvider",
+    }
+    threads = int(onnx_config.get("threads", None) or 0)
+    if threads > 0:
+        import onnxruntime
+
+        session_options = onnxruntime.SessionOptions()
+        session_options.intra_op_num_threads = threads
+        onnx_model_kwargs["session_options"] = session_options
+
+    return HuggingFaceEmbeddings(
+        model_name=str(model_directory),
+        model_kwargs={
+            **model_kwargs,
+            "device": "cpu",
+            "backend": "onnx",
+            "model_kwargs": onnx_model_kwargs,
+        },
+        encode_kwargs=encode_kwargs,
+    )
@@ -0,0 +1,93 @@
+from typing import Dict, List, Optional
+from langchain_core.documents import Document
+from chatnerd.stores.store_base import CHUNK_ID_KEY, RETRIEVAL_SCORE_KEY
+
+FUSION_RRF = "rrf"  # Reciprocal rank fusion: sum of 1 / (rrf_k + rank) of each query
+FUSION_WEIGHTED = (
+    "weighted"  # Sum of the min-max normalized retrieval scores of each query
+)
+FUSION_NONE = "none"  # Results of the queries one after the other
+DEFAULT_FUSION = FUSION_RRF
+DEFAULT_RRF_K = 60
+DEFAULT_N_RERANK_CANDIDATES = 20  # Fused documents passed to the cross-encoder. 0: all
+DEFAULT_ORIGINAL_QUESTION_WEIGHT = (
+    1.0  # Weight of the original question vs. the expanded ones
+)
+
+
+def get_chunk_key(document: Document) -> str:
+    """
+    Identifies a chunk by its id in the store, or by its content when the store gives no id
+    """
+    chunk_id = document.id or document.metadata.get(CHUNK_ID_KEY, None)
+    if chunk_id:
+        return str(chunk_id)
+
+    return document.page_content
+
+
+def fuse_results(
+    results: List[List[Document]],
+    fusion: str = DEFAULT_FUSION,
+    rrf_k: int = DEFAULT_RRF_K,
+    weights: Optional[List[float]] = None,
+    top_n: Optional[int] = None,
+    fused_score_key: Optional[str] = None,
+) -> List[Document]:
+    """
+    Merges the ranked results of many queries into a single ranking of unique chunks and
+    returns the top_n chunks. The weights of the queries default to 1. "weighted" fusion falls
+    back to "rrf" when the documents have no retrieval score. The fused score is saved in
+    metadata[fused_score_key] if given
+    """
+    fusion = str(fusion or DEFAULT_FUSION).lower()
+    if weights is None:
+        weights = [1.0] * len(results)
+
+    if fusion == FUSION_WEIGHTED and not all(
+        RETRIEVAL_SCORE_KEY in document.metadata
+        for documents in results
+        for document in documents
+    ):
+        fusion = FUSION_RRF
+
+    documents_by_key: Dict[str, Document] = {}
+    fused_scores: Dict[str, float] = {}
+    for documents, weight in zip(results, weights):
+        if fusion == FUSION_WEIGHTED and len(documents) > 0:
+            scores = [
+                float(document.metadata[RETRIEVAL_SCORE_KEY]) for document in documents
+            ]
+            # Equal scores are all normalized to 1
+            min_score, max_score = min(scores), max(scores)
+            if max_score == min_score:
+                min_score -= 1.0
+            score_range = max_score - min_score
+
+        for rank, document in enumerate(documents):
+            chunk_key = get_chunk_key(document)
+            documents_by_key.setdefault(chunk_key, document)
+
+            if fusion == FUSION_RRF:
+                score = weight / (rrf_k + rank + 1)
+            elif fusion == FUSION_WEIGHTED:
+                score = weight * (scores[rank] - min_score) / score_range
+            else:
+                # Keep the order of the first appearance
+                score = 0.0
+            fused_scores[chunk_key] = fused_scores.get(chunk_key, 0.0) + score
+
+    # sorted() is stable: the ties keep the order of the first appearance
+    fused_keys = sorted(
+        fused_scores.keys(), key=lambda chunk_key: fused_scores[chunk_key], reverse=True
+    )
+    if top_n:
+        fused_keys = fused_keys[:top_n]
+
+    if fused_score_key:
+        for chunk_key in fused_keys:
+            documents_by_key[chunk_key].metadata[fused_score_key] = fused_scores[
+                chunk_key
+            ]
+
+    return [documents_by_key[chunk_key] for chunk_key in fused_keys]
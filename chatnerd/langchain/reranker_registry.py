@@ -0,0 +1,178 @@
+import gc
+import json
+import time
+import logging
+import threading
+from typing import Any, ClassVar, Dict, List
+
+DEFAULT_IDLE_TIMEOUT = 0  # 0: the cross-encoders are never unloaded
+_RERANKER_OPTIONS = ["batch_size", "idle_timeout"]  # Not arguments of CrossEncoder
+_MAX_IDLE_CHECK_INTERVAL = 30  # Seconds between checks of idle cross-encoders
+
+
+def get_cross_encoder_config(reranker_config: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    The arguments of CrossEncoder in the reranker config (the key of the model)
+    """
+    return {
+        key: value
+        for key, value in reranker_config.items()
+        if key not in _RERANKER_OPTIONS
+    }
+
+
+def get_idle_timeout(reranker_config: Dict[str, Any]) -> float:
+    try:
+        return max(0.0, float(reranker_config.get("idle_timeout", None) or 0))
+    except (TypeError, ValueError):
+        return DEFAULT_IDLE_TIMEOUT
+
+
+class RerankerRegistry:
+    """
+    Process-wide registry of the cross-encoders, keyed by model name and arguments. A model
+    is loaded on its first use (or preloaded when a chain is built) and shared by the chains
+    of the process. The models with an idle_timeout are unloaded when they are not used
+    during idle_timeout seconds, and loaded again when needed.
+    """
+
+    _instance: ClassVar = None
+    _instance_lock: ClassVar = threading.Lock()
+
+    def __init__(self):
+        self._models: Dict[str, Any] = {}
+        self._last_used: Dict[str, float] = {}
+        self._idle_timeouts: Dict[str, float] = {}
+        self._load_locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self._idle_thread: threading.Thread | None = None
+
+    @classmethod
+    def instance(cls) -> "RerankerRegistry":
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    def get(self, reranker_config: Dict[str, Any]) -> Any:
+        """
+        Returns the cross-encoder of the reranker config, loading it if needed
+        """
+        cross_encoder_config = get_cross_encoder_config(reranker_config)
+        model_key = json.dumps(cross_encoder_config, sort_keys=True, default=str)
+
+        with self._lock:
+            self._last_used[model_key] = time.monotonic()
+            model = self._models.get(model_key, None)
+            if model is not None:
+                return model
+            load_lock = self._load_locks.setdefault(model_key, threading.Lock())
+
+        with load_lock:
+            model = self._models.get(model_key, None)
+            if model is None:
+                from sentence_transformers import CrossEncoder
+
+                logging.debug(
+                    f"Loading cross-encoder {cross_encoder_config.get('model_name', '')}"
+                )
+                model = CrossEncoder(**cross_encoder_config)
+
+                with self._lock:
+                    self._models[model_key] = model
+                    self._last_used[model_key] = time.monotonic()
+                    self._idle_timeouts[model_key] = get_idle_timeout(reranker_config)
+                    if self._idle_timeouts[model_key] > 0:
+                        self._start_idle_thread()
+
+        return model
+
+    def preload(self, reranker_config: Dict[str, Any]):
+        self.get(reranker_config)
+
+    def unload(self, reranker_config: Dict[str, Any] | None = None):
+        """
+        Unloads the cross-encoder of the reranker config, or all of them
+        """
+        with self._lock:
+            if reranker_config is None:
+                model_keys = list(self._models.keys())
+            else:
+                model_keys = [
+                    json.dumps(
+                        get_cross_encoder_config(reranker_config),
+                        sort_keys=True,
+                        default=str,
+                    )
+                ]
+
+            for model_key in model_keys:
+                self._forget(model_key)
+
+        # Release the memory of the models not used by a running prediction
+        gc.collect()
+
+    def unload_idle(self) -> List[str]:
+        """
+        Unloads the cross-encoders not used during their idle_timeout. Returns their keys
+        """
+        now = time.monotonic()
+        with self._lock:
+            model_keys = [
+                model_key
+                for model_key in self._models.keys()
+                if 0 < self._idle_timeouts.get(model_key, 0)
+                and self._idle_timeouts[model_key] < now - self._last_used[model_key]
+            ]
+            for model_key in model_keys:
+                logging.debug(f"Unloading idle cross-encoder {model_key}")
+                self._forget(model_key)
+
+        if len(model_keys) > 0:
+            gc.collect()
+
+        return model_keys
+
+    def _forget(self, model_key: str):
+        # The model and its usage are removed together. Call with lock
+        self._models.pop(model_key, None)
+        self._last_used.pop(model_key, None)
+        self._idle_timeouts.pop(model_key, None)
+
+    def _start_idle_thread(self):
+        if self._idle_thread is not None:
+            return
+
+        self._idle_thread = threading.Thread(
+            target=self._check_idle, name="chatnerd-reranker-idle", daemon=True
+        )
+        self._idle_thread.start()
+
+    def _check_idle(self):
+        while True:
+            with self._lock:
+                idle_timeouts = [
+                    self._idle_timeouts[model_key]
+                    for model_key in self._models.keys()
+                    if self._idle_timeouts.get(model_key, 0) > 0
+                ]
+            interval = min(idle_timeouts + [_MAX_IDLE_CHECK_INTERVAL * 2]) / 2
+            time.sleep(max(1.0, interval))
+            self.unload_idle()
+
+
+class CrossEncoderReranker:
+    """
+    Cross-encoder of the RerankerRegistry with the interface of CrossEncoder.predict. The
+    model is looked up on each prediction, so it can be unloaded while the chain is idle
+    """
+
+    def __init__(self, reranker_config: Dict[str, Any]):
+        self.reranker_config = reranker_config
+
+    def preload(self):
+        RerankerRegistry.instance().preload(self.reranker_config)
+
+    def predict(self, pairs: List[List[str]], batch_size: int = 32) -> List[float]:
+        cross_encoder = RerankerRegistry.instance().get(self.reranker_config)
+        return cross_encoder.predict(pairs, batch_size=batch_size)
@@ -0,0 +1,181 @@
+from typing import Any, List, Optional, Tuple
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from chatnerd.langchain.token_text_splitter import (
+    FastTokenTextSplitter,
+    SPLIT_MODE_SENTENCES,
+    TOKENIZE_BATCH_SIZE,
+)
+
+SPLIT_MODE_SEMANTIC = "semantic"  # Chunks cut where the topic of the sentences changes
+DEFAULT_BREAKPOINT_PERCENTILE = 95  # Percentile of the distances between sentences
+
+
+class SemanticTextSplitter(FastTokenTextSplitter):
+    """
+    Splits texts in chunks of consecutive sentences, cut where the similarity between two
+    adjacent sentences drops: the distances between adjacent sentences above the
+    breakpoint_percentile of the text are breakpoints. A chunk is also cut before it exceeds
+    chunk_size tokens. The sentences of a batch of texts are embedded in a single call, and
+    the vector of each chunk is the mean of the vectors of its sentences (weighted by their
+    number of tokens), so the chunks are not embedded a second time.
+    """
+
+    def __init__(
+        self,
+        tokenizer: Any,
+        embeddings: Embeddings,
+        breakpoint_percentile: float = DEFAULT_BREAKPOINT_PERCENTILE,
+        **kwargs: Any,
+    ):
+        kwargs.pop("mode", None)
+        kwargs["chunk_overlap"] = 0  # Sentences belong to a single chunk
+        super().__init__(tokenizer, mode=SPLIT_MODE_SENTENCES, **kwargs)
+        self._embeddings = embeddings
+        self._breakpoint_percentile = float(breakpoint_percentile)
+
+    def create_documents(
+        self, texts: List[str], metadatas: Optional[List[dict]] = None
+    ) -> List[Document]:
+        return self.create_documents_with_embeddings(texts, metadatas)[0]
+
+    def create_documents_with_embeddings(
+        self, texts: List[str], metadatas: Optional[List[dict]] = None
+    ) -> Tuple[List[Document], List[List[float]]]:
+        """
+        Returns the chunks of the texts and their vectors
+        """
+        metadatas = metadatas or [{}] * len(texts)
+
+        documents, vectors = [], []
+        for i in range(0, len(texts), TOKENIZE_BATCH_SIZE):
+            batch = texts[i : i + TOKENIZE_BATCH_SIZE]
+            for text, metadata, (spans, chunk_vectors) in zip(
+                batch,
+                metadatas[i : i + TOKENIZE_BATCH_SIZE],
+                self._split_semantic(batch),
+            ):
+                for (chunk_start, chunk_end), vector in zip(spans, chunk_vectors):
+                    document = self._create_chunk(
+                        text, metadata, chunk_start, chunk_end
+                    )
+                    if document is not None:
+                        documents.append(document)
+                        vectors.append(vector.tolist())
+
+        return documents, vectors
+
+    def _split_semantic(
+        self, texts: List[str]
+    ) -> List[Tuple[List[Tuple[int, int]], np.ndarray]]:
+        offsets_list = self._tokenize(texts)
+        sentences_list = [
+            self._get_sentences(text, offsets)
+            for text, offsets in zip(texts, offsets_list)
+        ]
+
+        # Embed the sentences of all the texts at once
+        sentence_texts = [
+            text[offsets[start, 0] : offsets[end - 1, 1]]
+            for text, offsets, sentences in zip(texts, offsets_list, sentences_list)
+            for start, end in sentences
+        ]
+        if len(sentence_texts) == 0:
+            return [([], np.empty((0, 0)))] * len(texts)
+        sentence_vectors = np.asarray(
+            self._embeddings.embed_documents(sentence_texts), dtype=np.float32
+        )
+
+        results = []
+        position = 0
+        for offsets, sentences in zip(offsets_list, sentences_list):
+            vectors = sentence_vectors[position : position + len(sentences)]
+            position += len(sentences)
+
+            spans, chunk_vectors = [], []
+            for first, last in self._group_sentences(sentences, vectors):
+                spans.append(
+                    (
+                        int(offsets[sentences[first][0], 0]),
+                        int(offsets[sentences[last - 1][1] - 1, 1]),
+                    )
+                )
+                chunk_vectors.append(
+                    self._mean_vector(vectors[first:last], sentences[first:last])
+                )
+            results.append((spans, chunk_vectors))
+
+        return results
+
+    def _get_sentences(self, text: str, offsets: np.ndarray) -> List[Tuple[int, int]]:
+        """
+        (start, end) token positions of the sentences. Sentences longer than chunk_size are
+        cut in windows of chunk_size tokens
+        """
+        num_tokens = len(offsets)
+        if num_tokens == 0:
+            return []
+
+        positions = self._get_boundaries(text, offsets[:, 0])[0]
+        ends = positions[positions < num_tokens].tolist() + [num_tokens]
+
+        sentences = []
+        start = 0
+        for end in ends:
+            while end - start > self._chunk_size:
+                sentences.append((start, start + self._chunk_size))
+                start += self._chunk_size
+            if end > start:
+                sentences.append((start, end))
+                start = end
+
+        return sentences
+
+    def _group_sentences(
+        self, sentences: List[Tuple[int, int]], vectors: np.ndarray
+    ) -> List[Tuple[int, int]]:
+        """
+        (first, last) indexes of the sentences of each chunk
+        """
+        if len(sentences) == 0:
+            return []
+
+        is_breakpoint = np.zeros(len(sentences), dtype=bool)
+        if len(sentences) > 2:
+            norms = np.linalg.norm(vectors, axis=1)
+            normalized = vectors / np.maximum(norms, 1e-12)[:, None]
+            distances = 1.0 - np.sum(normalized[:-1] * normalized[1:], axis=1)
+            threshold = np.percentile(distances, self._breakpoint_percentile)
+            is_breakpoint[1:] = distances > threshold
+
+        groups = []
+        first = 0
+        size = 0
+        for i, (start, end) in enumerate(sentences):
+            if i > first and (
+                is_breakpoint[i] or size + end - start > self._chunk_size
+            ):
+                groups.append((first, i))
+                first = i
+                size = 0
+            size += end - start
+        groups.append((first, len(sentences)))
+
+        return groups
+
+    @staticmethod
+    def _mean_vector(
+        vectors: np.ndarray, sentences: List[Tuple[int, int]]
+    ) -> np.ndarray:
+        # Mean weighted by the number of tokens, with the mean norm of the sentence vectors
+        weights = np.asarray(
+            [end - start for start, end in sentences], dtype=np.float32
+        )
+        weights /= weights.sum()
+        vector = weights @ vectors
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector *= (weights @ np.linalg.norm(vectors, axis=1)) / norm
+
+        return vector
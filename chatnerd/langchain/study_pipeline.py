@@ -0,0 +1,279 @@
+import logging
+import threading
+from typing import Any, Dict, List, Tuple
+from langchain_core.embeddings import Embeddings
+from langchain_text_splitters import TextSplitter
+from chatnerd.document_loaders.document_loader import (
+    DocumentLoader,
+    DEFAULT_BATCH_SIZE,
+)
+from chatnerd.langchain.document_embedder import ChunkBatcher, DocumentEmbedder
+from chatnerd.langchain.embedding_executor import EmbeddingExecutor
+from chatnerd.langchain.hybrid_retrieval import is_hybrid_search
+from chatnerd.langchain.llm_factory import LLMFactory
+from chatnerd.stores.store_factory import StoreFactory
+from chatnerd.stores.status_store import StatusStore
+from chatnerd.tools.bounded_queue import BoundedQueue, QueueClosed
+from chatnerd.tools.event_emitter import EventEmitter
+
+DEFAULT_QUEUE_SIZE = 64  # Maximum number of items waiting between two stages
+DEFAULT_MAX_MEMORY_MB = 512  # Maximum size of the text waiting in the queues (in MB)
+
+
+class StudyPipeline(EventEmitter):
+    """
+    Streaming study: the loaded documents flow through bounded queues into the stages
+    split -> embed -> store, which run at the same time in separate threads. A full queue
+    blocks the previous stage (backpressure), so the text in flight is bounded by
+    study.max_memory_mb instead of by the size of the corpus.
+    """
+
+    config: Dict[str, Any] = {}
+
+    def __init__(self, project_config: Dict[str, Any], document_loader: DocumentLoader):
+        super().__init__()
+        self.config = project_config
+        self.document_loader = document_loader
+
+        study_config = self.config.get("study", None) or {}
+        queue_size = int(study_config.get("queue_size", DEFAULT_QUEUE_SIZE))
+        # The progress is saved after each batch of files, as in the batched study
+        self._checkpoint_size = max(
+            1, int(study_config.get("batch_size", None) or DEFAULT_BATCH_SIZE)
+        )
+        max_memory_bytes = int(
+            float(study_config.get("max_memory_mb", DEFAULT_MAX_MEMORY_MB)) * 1024**2
+        )
+
+        # The memory ceiling is shared among the queues
+        self._documents_queue = BoundedQueue(
+            maxsize=queue_size,
+            max_bytes=max_memory_bytes // 3,
+            sizeof=lambda item: len(item[0].page_content or ""),
+        )
+        self._chunks_queue = BoundedQueue(
+            maxsize=queue_size,
+            max_bytes=max_memory_bytes // 3,
+            sizeof=lambda item: (
+                sum(len(chunk.page_content) for chunk in item[1])
+                if isinstance(item[1], list)
+                else 0
+            ),
+        )
+        self._batches_queue = BoundedQueue(
+            maxsize=queue_size,
+            max_bytes=max_memory_bytes // 3,
+            sizeof=lambda item: sum(len(chunk.page_content) for _, chunk in item[0]),
+        )
+
+        self._errors: List[any] = []
+        self._errors_lock = threading.Lock()
+        self._aborted = False
+        self._checkpoint = (
+            0,
+            0,
+        )  # (studied files, failed files) saved in the status store
+
+    def run(self, limit: int = None) -> Tuple[List[str], List[any]]:
+        logging.debug("Running streaming study pipeline...")
+
+        embeddings: Embeddings = LLMFactory(self.config).get_embedding_function()
+        text_splitter = DocumentEmbedder.get_text_splitter(self.config, embeddings)
+        batch_size = DocumentEmbedder.get_embed_batch_size(self.config)
+
+        store_factory = StoreFactory(self.config)
+        chunks_store = store_factory.get_vector_store(embeddings=embeddings)
+
+        # Forward the progress of the loader
+        self.document_loader.on(
+            "start", lambda *args, **kwargs: self.emit("start", *args, **kwargs)
+        )
+        self.document_loader.on(
+            "update", lambda *args, **kwargs: self.emit("update", *args, **kwargs)
+        )
+
+        # The status store is opened by the store stage (SQLite connections are bound to a thread)
+        batcher = ChunkBatcher(
+            chunks_store=chunks_store,
+            status_store=None,
+            batch_size=batch_size,
+            on_document_done=self._on_document_done,
+            lexical_index=is_hybrid_search(self.config),
+        )
+
+        try:
+            stages = [
+                threading.Thread(
+                    target=self._run_stage,
+                    args=(self._load_stage, limit),
+                    name="chatnerd-load",
+                ),
+                threading.Thread(
+                    target=self._run_stage,
+                    args=(self._split_stage, text_splitter),
+                    name="chatnerd-split",
+                ),
+                threading.Thread(
+                    target=self._run_stage,
+                    args=(self._store_stage, batcher, store_factory),
+                    name="chatnerd-store",
+                ),
+            ]
+            for stage in stages:
+                stage.start()
+
+            # Embed in the main thread
+            self._run_stage(self._embed_stage, batcher, embeddings)
+
+            for stage in stages:
+                stage.join()
+        finally:
+            chunks_store.close()
+
+        self.emit("end")
+        return batcher.results, self._errors + batcher.errors
+
+    def _run_stage(self, stage: callable, *args):
+        try:
+            stage(*args)
+        except QueueClosed:
+            pass
+        except BaseException as err:
+            logging.error(f"Study pipeline stopped: {str(err)}")
+            self._add_error(err)
+            self._abort()
+
+    def _load_stage(self, limit: int = None):
+        try:
+            # PDF files are loaded lazily, page by page, while the pages are queued
+            for _, documents, error in self.document_loader.irun(
+                limit=limit, lazy=True
+            ):
+                if error is not None:
+                    self._add_error(error)
+                    continue
+
+                # Queue the parts of the document one behind, to flag the last one
+                previous_document = None
+                try:
+                    for document in documents or []:
+                        if previous_document is not None:
+                            self._documents_queue.put((previous_document, False))
+                        previous_document = document
+                except QueueClosed:
+                    raise
+                except Exception as err:
+                    # The parts already queued are discarded when the run finishes
+                    self._add_error(err)
+                    continue
+
+                if previous_document is not None:
+                    self._documents_queue.put((previous_document, True))
+        finally:
+            self._documents_queue.close()
+
+    def _split_stage(self, text_splitter: TextSplitter):
+        try:
+            while True:
+                document, is_last_part = self._documents_queue.get()
+                try:
+                    chunks, vectors = DocumentEmbedder.split_document(
+                        document, text_splitter
+                    )
+                except Exception as err:
+                    chunks, vectors = err, None
+
+                self._chunks_queue.put((document, chunks, is_last_part, vectors))
+        finally:
+            self._chunks_queue.close()
+
+    def _embed_stage(self, batcher: ChunkBatcher, embeddings: Embeddings):
+        # Batches are encoded in worker threads and written by the store stage
+        executor = EmbeddingExecutor.from_config(self.config, batcher, embeddings)
+
+        def embed_batches(batches):
+            for result in executor.submit(batches):
+                self._batches_queue.put(result)
+
+        try:
+            while True:
+                try:
+                    document, chunks, is_last_part, vectors = self._chunks_queue.get()
+                except QueueClosed:
+                    break
+
+                if isinstance(chunks, Exception):
+                    batcher.fail(document, chunks, is_last_part)
+                    continue
+
+                embed_batches(
+                    batcher.add(document, chunks, is_last_part, vectors=vectors)
+                )
+
+            embed_batches(batcher.pop_batches(final=True))
+            for result in executor.drain():
+                self._batches_queue.put(result)
+        finally:
+            executor.shutdown()
+            self._batches_queue.close()
+
+    def _store_stage(self, batcher: ChunkBatcher, store_factory: StoreFactory):
+        with store_factory.get_status_store() as status_store:
+            batcher.status_store = status_store
+
+            try:
+                while True:
+                    try:
+                        batch, vectors, chunk_ids = self._batches_queue.get()
+                    except QueueClosed:
+                        break
+
+                    batcher.write_result(batch, vectors, chunk_ids)
+
+                    self._save_checkpoint(batcher, status_store)
+            except BaseException:
+                # Remove the chunks of the documents not completed before the stage stops
+                batcher.abort()
+                raise
+
+            # Complete the remaining documents without chunks and discard the incomplete ones
+            # (also the documents with batches dropped when the run is aborted)
+            batcher.finish()
+            self._save_checkpoint(batcher, status_store, final=True)
+
+            if not self._aborted:
+                self.document_loader.finish_study_run(status_store=status_store)
+
+    def _save_checkpoint(
+        self, batcher: ChunkBatcher, status_store: StatusStore, final: bool = False
+    ):
+        # Save the progress of the run once per batch of files (a batch of the study run)
+        with self._errors_lock:
+            checkpoint = (len(batcher.results), len(batcher.errors) + len(self._errors))
+
+        num_files = sum(checkpoint) - sum(self._checkpoint)
+        if num_files == 0 or (not final and num_files < self._checkpoint_size):
+            return
+
+        self.document_loader.save_checkpoint(
+            checkpoint[0] - self._checkpoint[0],
+            checkpoint[1] - self._checkpoint[1],
+            status_store=status_store,
+        )
+        self._checkpoint = checkpoint
+
+    def _on_document_done(self, source: str, error: Exception | None = None):
+        if error is None:
+            try:
+                self.emit("write", f"✔ {source}")
+            except:
+                pass
+
+    def _add_error(self, error: Exception):
+        with self._errors_lock:
+            self._errors.append(error)
+
+    def _abort(self):
+        self._aborted = True
+        for queue in [self._documents_queue, self._chunks_queue, self._batches_queue]:
+            queue.abort()
@@ -0,0 +1,197 @@
+import re
+import copy
+from typing import Any, Iterable, Iterator, List, Optional, Tuple
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_text_splitters import TextSplitter
+from chatnerd.lib.helpers import get_embeddings_client
+
+SPLIT_MODE_TOKENS = "tokens"  # Windows of tokens cut at the best separator
+SPLIT_MODE_SENTENCES = "sentences"  # Whole sentences packed in chunks
+SPLIT_MODE_CHARACTERS = (
+    "characters"  # RecursiveCharacterTextSplitter (chunk_size in characters)
+)
+
+DEFAULT_SEPARATORS = ["\n\n", "\n", ".", ",", " "]
+SENTENCE_END_PATTERN = re.compile(r"[.!?…]+[\"'”’)\]]*\s+|\n\s*\n")
+TOKENIZE_BATCH_SIZE = 64  # Number of texts tokenized in a single call
+
+
+def get_embeddings_tokenizer(embeddings: Embeddings) -> Optional[Any]:
+    """
+    Returns a copy of the fast (Rust) tokenizer of a sentence-transformers embedding model, or
+    None. The splitter runs at the same time as the encode workers, which set the truncation
+    of the model's tokenizer on every batch: sharing it raises "Already borrowed" or truncates
+    the texts being split
+    """
+    client = get_embeddings_client(embeddings)
+    tokenizer = getattr(client, "tokenizer", None)
+    if tokenizer is None or not getattr(tokenizer, "is_fast", False):
+        return None
+
+    return copy.deepcopy(tokenizer)
+
+
+class FastTokenTextSplitter(TextSplitter):
+    """
+    Splits texts in chunks of at most chunk_size tokens counted with the fast tokenizer of the
+    embedding model, so the chunks are not truncated by the model. The texts of a batch are
+    tokenized in a single call and the chunks are slices of the original texts.
+    With mode "tokens", a chunk ends at the separator of highest priority found in the second
+    half of its window of chunk_size tokens. With mode "sentences", whole sentences are packed
+    in the chunks (only a sentence longer than chunk_size is cut). The candidate boundaries of
+    a text are found with one regex pass per separator and mapped to token positions at once.
+    """
+
+    def __init__(
+        self,
+        tokenizer: Any,
+        mode: str = SPLIT_MODE_TOKENS,
+        separators: Optional[List[str]] = None,
+        **kwargs: Any,
+    ):
+        kwargs.pop("keep_separator", None)  # Chunks always end after the separator
+        super().__init__(
+            length_function=lambda text: len(self._tokenize([text])[0]),
+            **kwargs,
+        )
+        if mode not in [SPLIT_MODE_TOKENS, SPLIT_MODE_SENTENCES]:
+            raise ValueError(f"Unknown split mode '{mode}'")
+
+        self._tokenizer = tokenizer
+        self._mode = mode
+        self._separator_patterns = [
+            re.compile(re.escape(separator))
+            for separator in (separators or DEFAULT_SEPARATORS)
+            if separator
+        ]
+
+    def split_text(self, text: str) -> List[str]:
+        return [
+            chunk.page_content
+            for chunk in self.create_documents([text], metadatas=[{}])
+        ]
+
+    def create_documents(
+        self, texts: List[str], metadatas: Optional[List[dict]] = None
+    ) -> List[Document]:
+        metadatas = metadatas or [{}] * len(texts)
+
+        documents = []
+        for text, metadata, spans in zip(texts, metadatas, self.isplit_spans(texts)):
+            for chunk_start, chunk_end in spans:
+                document = self._create_chunk(text, metadata, chunk_start, chunk_end)
+                if document is not None:
+                    documents.append(document)
+
+        return documents
+
+    def _create_chunk(
+        self, text: str, metadata: dict, chunk_start: int, chunk_end: int
+    ) -> Optional[Document]:
+        chunk = text[chunk_start:chunk_end]
+        if self._strip_whitespace:
+            chunk_start += len(chunk) - len(chunk.lstrip())
+            chunk = chunk.strip()
+        if not chunk:
+            return None
+
+        chunk_metadata = copy.deepcopy(metadata)
+        if self._add_start_index:
+            chunk_metadata["start_index"] = chunk_start
+        return Document(page_content=chunk, metadata=chunk_metadata)
+
+    def isplit_spans(self, texts: Iterable[str]) -> Iterator[List[Tuple[int, int]]]:
+        """
+        Yields the (start, end) character offsets of the chunks of each text
+        """
+        batch = []
+        for text in texts:
+            batch.append(text)
+            if len(batch) >= TOKENIZE_BATCH_SIZE:
+                yield from self._split_batch(batch)
+                batch = []
+
+        if batch:
+            yield from self._split_batch(batch)
+
+    def _split_batch(self, texts: List[str]) -> Iterator[List[Tuple[int, int]]]:
+        for text, offsets in zip(texts, self._tokenize(texts)):
+            yield self._split_offsets(text, offsets)
+
+    def _tokenize(self, texts: List[str]) -> List[np.ndarray]:
+        encoding = self._tokenizer(
+            texts,
+            add_special_tokens=False,
+            return_offsets_mapping=True,
+            return_attention_mask=False,
+            return_token_type_ids=False,
+            verbose=False,
+        )
+        return [
+            np.asarray(offsets, dtype=np.int64).reshape(-1, 2)
+            for offsets in encoding["offset_mapping"]
+        ]
+
+    def _get_boundaries(self, text: str, token_starts: np.ndarray) -> List[np.ndarray]:
+        """
+        Token positions where a chunk can end, per separator (by priority)
+        """
+        if self._mode == SPLIT_MODE_SENTENCES:
+            patterns = [SENTENCE_END_PATTERN]
+        else:
+            patterns = self._separator_patterns
+
+        boundaries = []
+        for pattern in patterns:
+            match_ends = np.fromiter(
+                (match.end() for match in pattern.finditer(text)), dtype=np.int64
+            )
+            # Number of tokens starting before the end of the separator
+            positions = np.unique(np.searchsorted(token_starts, match_ends))
+            boundaries.append(positions[positions > 0])
+
+        return boundaries
+
+    def _split_offsets(self, text: str, offsets: np.ndarray) -> List[Tuple[int, int]]:
+        num_tokens = len(offsets)
+        if num_tokens == 0:
+            return []
+
+        token_starts, token_ends = offsets[:, 0], offsets[:, 1]
+        boundaries = self._get_boundaries(text, token_starts)
+        is_sentences = self._mode == SPLIT_MODE_SENTENCES
+
+        spans = []
+        start = 0
+        while start < num_tokens:
+            limit = start + self._chunk_size
+            end = min(limit, num_tokens)
+            if limit < num_tokens:
+                # Sentences are packed whole, other separators cut the second half
+                min_end = start + 1 if is_sentences else start + self._chunk_size // 2
+                for positions in boundaries:
+                    index = np.searchsorted(positions, limit, side="right") - 1
+                    if index >= 0 and positions[index] >= max(min_end, start + 1):
+                        end = int(positions[index])
+                        break
+
+            spans.append((int(token_starts[start]), int(token_ends[end - 1])))
+            if end >= num_tokens:
+                break
+
+            next_start = end
+            if self._chunk_overlap > 0:
+                next_start = max(end - self._chunk_overlap, start + 1)
+                if is_sentences:
+                    # Overlap whole sentences
+                    positions = boundaries[0]
+                    index = np.searchsorted(positions, next_start, side="left")
+                    if index < len(positions) and positions[index] < end:
+                        next_start = int(positions[index])
+                    else:
+                        next_start = end
+            start = next_start
+
+        return spans
@@ -1,11 +1,14 @@
 import os
 import sys
+import logging
+import hashlib
+import fnmatch
 import importlib.util
 import glob
 import shutil
 import time
 from pathlib import Path
-from typing import List
+from typing import Any, Iterable, Iterator, List, Optional
 
 
 class TimeTaken:
@@ -51,6 +54,74 @@ def get_filtered_directories(
     return filtered_directories
 
 
+def iwalk_files(
+    base_path: Path | str,
+    extensions: Iterable[str],
+    include: Optional[Iterable[str]] = None,
+    exclude: Optional[Iterable[str]] = None,
+) -> Iterator[str]:
+    """
+    Walks the directory tree once with os.scandir and yields lazily the paths of the files with
+    any of the extensions (case-insensitive). Hidden files and directories are skipped, like glob does.
+    include / exclude are glob patterns matched against the path relative to base_path
+    (ex: "books/*", "*.draft.md"). A directory matching an exclude pattern is not walked.
+    """
+    base_path = str(base_path)
+    extensions = {str(extension).lower() for extension in extensions}
+    include = list(include or [])
+    exclude = list(exclude or [])
+
+    def matches(relative_path: str, patterns: List[str]) -> bool:
+        return any(fnmatch.fnmatch(relative_path, pattern) for pattern in patterns)
+
+    visited_directories = set()
+    pending_directories = [(base_path, "")]  # (path, path relative to base_path)
+    while pending_directories:
+        directory, relative_directory = pending_directories.pop()
+        subdirectories = []
+        try:
+            directory_stat = os.stat(directory)
+            directory_id = (directory_stat.st_dev, directory_stat.st_ino)
+            if directory_id in visited_directories:
+                continue  # Symlink loop
+            visited_directories.add(directory_id)
+
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.name.startswith("."):
+                        continue
+
+                    relative_path = (
+                        os.path.join(relative_directory, entry.name)
+                        if relative_directory
+                        else entry.name
+                    )
+
+                    if entry.is_dir():
+                        if not exclude or not (
+                            matches(relative_path, exclude)
+                            or matches(relative_path + os.sep, exclude)
+                        ):
+                            subdirectories.append((entry.path, relative_path))
+                        continue
+
+                    extension = os.path.splitext(entry.name)[1].lower()
+                    if extension not in extensions:
+                        continue
+                    if include and not matches(relative_path, include):
+                        continue
+                    if exclude and matches(relative_path, exclude):
+                        continue
+
+                    yield entry.path
+        except OSError as err:
+            logging.warning(f"Error reading directory {directory}: {str(err)}")
+            continue
+
+        # Walk subdirectories in alphabetical order
+        pending_directories.extend(sorted(subdirectories, reverse=True))
+
+
 def copy_files_between_directories(
     glob_search: str, src_dir: Path | str, dst_dir: Path | str
 ) -> int:
@@ -68,6 +139,30 @@ def copy_files_between_directories(
     return file_counter
 
 
+def get_file_hash(file_path: Path | str, block_size: int = 1024**2) -> str:
+    """
+    Returns the sha256 hex digest of the file content, read in blocks
+    """
+    file_hash = hashlib.sha256()
+    with open(file_path, "rb") as file_handler:
+        while block := file_handler.read(block_size):
+            file_hash.update(block)
+
+    return file_hash.hexdigest()
+
+
+def get_embeddings_client(embeddings: Any) -> Any | None:
+    """
+    Returns the sentence-transformers model of an embedding function, or None. It is a private
+    attribute (_client) of HuggingFaceEmbeddings in langchain-huggingface
+    """
+    client = getattr(embeddings, "client", None)
+    if client is None:
+        client = getattr(embeddings, "_client", None)
+
+    return client
+
+
 # borrowed from: https://stackoverflow.com/a/1051266/656011
 def check_for_package(package):
     if package in sys.modules:
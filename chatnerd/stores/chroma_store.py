@@ -1,13 +1,19 @@
 # Resources:
 # https://github.com/pprados/langchain-rag/blob/master/docs/integrations/vectorstores/rag_vectorstore.ipynb
 
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Iterable, Optional, Tuple
 import uuid
-from langchain_community.vectorstores.chroma import Chroma
+import numpy as np
+from langchain_community.vectorstores.chroma import Chroma, DEFAULT_K
+from langchain_community.vectorstores.utils import maximal_marginal_relevance
 from langchain_core.documents import Document
 from langchain_core.embeddings import Embeddings
 from chromadb.config import Settings
-from chatnerd.stores.store_base import StoreBase
+from chatnerd.stores.store_base import (
+    StoreBase,
+    CHUNK_ID_KEY,
+    RETRIEVAL_SCORE_KEY,
+)
 
 DEFAULT_CHUNKS_COLLECTION_NAME = "chatnerd_chunks"
 
@@ -62,9 +68,15 @@ class ChromaStore(Chroma, StoreBase):
         ids: Optional[List[str]] = None,
         **add_metadatas,
     ) -> List[str]:
+        # Generate ids
+        if ids is None:
+            ids = [str(uuid.uuid1()) for _ in documents]
+
         page_contents = []
         metadatas = []
-        for document in documents:
+        vectors = []
+        kept_ids = []
+        for document, vector, id in zip(documents, embeddings, ids):
             if document.page_content is None:
                 continue
             page_contents.append(document.page_content)
@@ -74,16 +86,15 @@ class ChromaStore(Chroma, StoreBase):
                 document.metadata[key] = value
 
             metadatas.append(document.metadata)
-
-        # Generate ids
-        if ids is None:
-            ids = [str(uuid.uuid1()) for _ in page_contents]
+            vectors.append(vector)
+            kept_ids.append(id)
+        ids = kept_ids
 
         try:
             # ChromaDB 0.6.x uses a different upsert API
             self._collection.upsert(
                 metadatas=metadatas,
-                embeddings=embeddings,
+                embeddings=vectors,
                 documents=page_contents,
                 ids=ids,
             )
@@ -99,6 +110,212 @@ class ChromaStore(Chroma, StoreBase):
 
         return ids
 
+    def delete_by_source(self, source: str):
+        self._collection.delete(where={"source": source})
+
+    def update_source(self, source: str, new_source: str):
+        chunks_data = self._collection.get(
+            where={"source": source}, include=["metadatas"]
+        )
+        if not chunks_data or len(chunks_data.get("ids", [])) == 0:
+            return
+
+        metadatas = [
+            {**metadata, "source": new_source} for metadata in chunks_data["metadatas"]
+        ]
+
+        # Update metadata only (embeddings are kept)
+        self._collection.update(ids=chunks_data["ids"], metadatas=metadatas)
+
+    def get_chunks_by_ids(self, ids: List[str]) -> List[Document]:
+        if len(ids) == 0:
+            return []
+
+        results = self._collection.get(ids=ids, include=["documents", "metadatas"])
+        return [
+            Document(
+                id=chunk_id,
+                page_content=page_content,
+                metadata={**(metadata or {}), CHUNK_ID_KEY: chunk_id},
+            )
+            for chunk_id, page_content, metadata in zip(
+                results["ids"], results["documents"], results["metadatas"]
+            )
+        ]
+
+    def iget_chunks(self, batch_size: int = 1000) -> Iterable[List[Document]]:
+        offset = 0
+        while True:
+            results = self._collection.get(
+                include=["documents", "metadatas"], limit=batch_size, offset=offset
+            )
+            if len(results["ids"]) == 0:
+                return
+
+            yield [
+                Document(
+                    id=chunk_id,
+                    page_content=page_content,
+                    metadata={**(metadata or {}), CHUNK_ID_KEY: chunk_id},
+                )
+                for chunk_id, page_content, metadata in zip(
+                    results["ids"], results["documents"], results["metadatas"]
+                )
+            ]
+            offset += len(results["ids"])
+
+    # The searches of Chroma are overridden to keep the ids and the relevance scores of the chunks
+
+    def similarity_search_by_vector(
+        self,
+        embedding: List[float],
+        k: int = DEFAULT_K,
+        filter: Optional[Dict[str, str]] = None,
+        where_document: Optional[Dict[str, str]] = None,
+        **kwargs: Any,
+    ) -> List[Document]:
+        return [
+            document
+            for document, _ in self.similarity_search_by_vector_with_relevance_scores(
+                embedding, k, filter=filter, where_document=where_document, **kwargs
+            )
+        ]
+
+    def similarity_search_by_vector_with_relevance_scores(
+        self,
+        embedding: List[float],
+        k: int = DEFAULT_K,
+        filter: Optional[Dict[str, str]] = None,
+        where_document: Optional[Dict[str, str]] = None,
+        **kwargs: Any,
+    ) -> List[Tuple[Document, float]]:
+        results = self._query_collection(
+            query_embeddings=[embedding],
+            n_results=k,
+            where=filter,
+            where_document=where_document,
+            **kwargs,
+        )
+        return self._results_to_documents_and_distances(results)[0]
+
+    def similarity_search_with_score(
+        self,
+        query: str,
+        k: int = DEFAULT_K,
+        filter: Optional[Dict[str, str]] = None,
+        where_document: Optional[Dict[str, str]] = None,
+        **kwargs: Any,
+    ) -> List[Tuple[Document, float]]:
+        if self._embedding_function is None:
+            results = self._query_collection(
+                query_texts=[query],
+                n_results=k,
+                where=filter,
+                where_document=where_document,
+                **kwargs,
+            )
+            return self._results_to_documents_and_distances(results)[0]
+
+        return self.similarity_search_by_vector_with_relevance_scores(
+            self._embedding_function.embed_query(query),
+            k,
+            filter=filter,
+            where_document=where_document,
+            **kwargs,
+        )
+
+    def max_marginal_relevance_search_by_vector(
+        self,
+        embedding: List[float],
+        k: int = DEFAULT_K,
+        fetch_k: int = 20,
+        lambda_mult: float = 0.5,
+        filter: Optional[Dict[str, str]] = None,
+        where_document: Optional[Dict[str, str]] = None,
+        **kwargs: Any,
+    ) -> List[Document]:
+        results = self._query_collection(
+            query_embeddings=[embedding],
+            n_results=fetch_k,
+            where=filter,
+            where_document=where_document,
+            include=["metadatas", "documents", "distances", "embeddings"],
+            **kwargs,
+        )
+        mmr_selected = maximal_marginal_relevance(
+            np.array(embedding, dtype=np.float32),
+            results["embeddings"][0],
+            k=k,
+            lambda_mult=lambda_mult,
+        )
+
+        candidates = self._results_to_documents_and_distances(results)[0]
+        return [candidates[i][0] for i in mmr_selected]
+
+    def similarity_search_by_vectors(
+        self,
+        embeddings: List[List[float]],
+        k: int = 4,
+        filter: Optional[Dict[str, str]] = None,
+        where_document: Optional[Dict[str, str]] = None,
+        **kwargs: Any,
+    ) -> List[List[Document]]:
+        if len(embeddings) == 0:
+            return []
+
+        # A single query with all the vectors
+        results = self._query_collection(
+            query_embeddings=embeddings,
+            n_results=k,
+            where=filter,
+            where_document=where_document,
+        )
+        return [
+            [document for document, _ in documents_and_distances]
+            for documents_and_distances in self._results_to_documents_and_distances(
+                results
+            )
+        ]
+
+    def _query_collection(self, **kwargs: Any) -> Dict[str, Any]:
+        return self._collection.query(
+            **{"include": ["documents", "metadatas", "distances"], **kwargs}
+        )
+
+    def _results_to_documents_and_distances(
+        self, results: Dict[str, Any]
+    ) -> List[List[Tuple[Document, float]]]:
+        """
+        The documents and distances of each query, with the chunk id and the relevance score
+        in the metadata
+        """
+        relevance_score_fn = self._select_relevance_score_fn()
+        return [
+            [
+                (
+                    Document(
+                        id=chunk_id,
+                        page_content=page_content,
+                        metadata={
+                            **(metadata or {}),
+                            CHUNK_ID_KEY: chunk_id,
+                            RETRIEVAL_SCORE_KEY: relevance_score_fn(distance),
+                        },
+                    ),
+                    distance,
+                )
+                for chunk_id, page_content, metadata, distance in zip(
+                    query_ids, query_documents, query_metadatas, query_distances
+                )
+            ]
+            for query_ids, query_documents, query_metadatas, query_distances in zip(
+                results["ids"],
+                results["documents"],
+                results["metadatas"],
+                results["distances"],
+            )
+        ]
+
     def is_thread_safe(self) -> bool:
         return False
 
@@ -0,0 +1,203 @@
+import logging
+import hashlib
+import threading
+import time
+from array import array
+from typing import Any, Dict, List, Optional
+from pathlib import Path
+import sqlite3
+
+DEFAULT_DATABASE_FILENAME = "embedding_cache.sqlite"
+DEFAULT_MAX_SIZE_MB = 1024  # Maximum size of the cached vectors (in MB)
+_EVICTION_TARGET_RATIO = (
+    0.9  # Evict until the cache size is below this ratio of max size
+)
+_MAX_QUERY_PARAMS = 900  # Maximum number of parameters in a single SQLite query
+
+
+class EmbeddingCacheStore:
+    """
+    Persistent cache of embeddings keyed by (model key, hash of the normalized text).
+    Vectors are stored as float32 blobs in a SQLite database read through memory-mapped I/O.
+    The least recently used vectors are evicted when the cache exceeds max_size_mb.
+    """
+
+    connection: sqlite3.Connection = None
+    database_path: Path = None
+    max_size_bytes: int = 0
+
+    def __init__(
+        self,
+        store_directory_path: str | Path,
+        max_size_mb: float = DEFAULT_MAX_SIZE_MB,
+        **kwargs: Any,
+    ):
+        if not Path(store_directory_path).exists():
+            raise FileNotFoundError(
+                f"Store directory path not found at {store_directory_path}"
+            )
+
+        self.database_path = Path(store_directory_path, DEFAULT_DATABASE_FILENAME)
+        self.max_size_bytes = int(float(max_size_mb) * 1024**2)
+        self._lock = threading.Lock()
+
+        self.connection = sqlite3.connect(
+            self.database_path,
+            timeout=300,
+            check_same_thread=False,
+            isolation_level=None,
+            **kwargs,
+        )
+
+        # Map the database file in memory (with some room for the index)
+        self.connection.execute(f"PRAGMA mmap_size = {self.max_size_bytes * 2}")
+        self.connection.execute("PRAGMA journal_mode = WAL")
+        self.connection.execute("PRAGMA synchronous = NORMAL")
+
+        self.migrate_up()
+
+        self._size_bytes = self.connection.execute(
+            "SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings"
+        ).fetchone()[0]
+
+    def migrate_up(self):
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (\
+                model_key TEXT, \
+                text_hash TEXT, \
+                vector BLOB, \
+                last_used REAL, \
+                PRIMARY KEY (model_key, text_hash))"
+        )
+        self.connection.execute(
+            "CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)"
+        )
+
+    @staticmethod
+    def get_text_hash(text: str) -> str:
+        # Normalize whitespaces, so the same paragraph with different line breaks is reused
+        normalized_text = " ".join(text.split())
+        return hashlib.sha256(normalized_text.encode("utf-8")).hexdigest()
+
+    def mget(self, model_key: str, texts: List[str]) -> List[Optional[List[float]]]:
+        """
+        Returns the cached vectors of the texts (None if not found)
+        """
+        text_hashes = [self.get_text_hash(text) for text in texts]
+        unique_hashes = list(dict.fromkeys(text_hashes))
+
+        found_vectors: Dict[str, List[float]] = {}
+        with self._lock:
+            for i in range(0, len(unique_hashes), _MAX_QUERY_PARAMS):
+                batch_hashes = unique_hashes[i : i + _MAX_QUERY_PARAMS]
+                placeholders = ", ".join(["?"] * len(batch_hashes))
+                cursor = self.connection.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model_key = ? AND text_hash IN ({placeholders})",
+                    (model_key, *batch_hashes),
+                )
+                for text_hash, vector_blob in cursor.fetchall():
+                    found_vectors[text_hash] = array("f", vector_blob).tolist()
+
+            # Refresh last_used of the hits (used by the eviction)
+            if found_vectors:
+                now = time.time()
+                self.connection.execute("BEGIN")
+                self.connection.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE model_key = ? AND text_hash = ?",
+                    [(now, model_key, text_hash) for text_hash in found_vectors],
+                )
+                self.connection.execute("COMMIT")
+
+        return [found_vectors.get(text_hash, None) for text_hash in text_hashes]
+
+    def mset(self, model_key: str, texts: List[str], vectors: List[List[float]]):
+        now = time.time()
+        rows = {}
+        for text, vector in zip(texts, vectors):
+            rows[self.get_text_hash(text)] = array("f", vector).tobytes()
+
+        with self._lock:
+            try:
+                self.connection.execute("BEGIN")
+                for text_hash, vector_blob in rows.items():
+                    cursor = self.connection.execute(
+                        "INSERT OR IGNORE INTO embeddings (model_key, text_hash, vector, last_used) VALUES (?, ?, ?, ?)",
+                        (model_key, text_hash, vector_blob, now),
+                    )
+                    if cursor.rowcount > 0:
+                        self._size_bytes += len(vector_blob)
+                self.connection.execute("COMMIT")
+            except Exception:
+                self.connection.execute("ROLLBACK")
+                raise
+
+            if self._size_bytes > self.max_size_bytes:
+                self._evict()
+
+    def _evict(self):
+        target_size_bytes = int(self.max_size_bytes * _EVICTION_TARGET_RATIO)
+        evicted_bytes = 0
+        evicted_rows = 0
+
+        while self._size_bytes > target_size_bytes:
+            cursor = self.connection.execute(
+                "SELECT rowid, LENGTH(vector) FROM embeddings ORDER BY last_used LIMIT ?",
+                (_MAX_QUERY_PARAMS,),
+            )
+            rows = cursor.fetchall()
+            if len(rows) == 0:
+                self._size_bytes = 0
+                break
+
+            rowids = []
+            for rowid, vector_size in rows:
+                rowids.append(rowid)
+                self._size_bytes -= vector_size
+                evicted_bytes += vector_size
+                if self._size_bytes <= target_size_bytes:
+                    break
+
+            placeholders = ", ".join(["?"] * len(rowids))
+            self.connection.execute(
+                f"DELETE FROM embeddings WHERE rowid IN ({placeholders})", rowids
+            )
+            evicted_rows += len(rowids)
+
+        logging.debug(
+            f"Embedding cache: evicted {evicted_rows} vectors ({evicted_bytes / 1024**2:.1f} MB)"
+        )
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            count = self.connection.execute(
+                "SELECT COUNT(*) FROM embeddings"
+            ).fetchone()[0]
+
+        return {
+            "database_path": str(self.database_path),
+            "count": count,
+            "size_mb": self._size_bytes / 1024**2,
+            "max_size_mb": self.max_size_bytes / 1024**2,
+        }
+
+    def clear(self):
+        with self._lock:
+            self.connection.execute("DELETE FROM embeddings")
+            self._size_bytes = 0
+
+    def close(self):
+        if self.connection:
+            try:
+                self.connection.close()
+                self.connection = None
+            except Exception:
+                pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, ext_type, exc_value, traceback):
+        self.close()
+
+    def __del__(self):
+        self.close()
@@ -0,0 +1,776 @@
+import os
+import json
+import uuid
+import logging
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+import numpy as np
+from numpy.lib.format import open_memmap
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+from langchain_community.vectorstores.utils import maximal_marginal_relevance
+from chatnerd.stores.store_base import (
+    StoreBase,
+    CHUNK_ID_KEY,
+    RETRIEVAL_SCORE_KEY,
+)
+
+try:
+    import simsimd
+except ImportError:
+    simsimd = None
+
+DEFAULT_CHUNKS_COLLECTION_NAME = "chatnerd_chunks"
+DEFAULT_DTYPE = "float32"
+DEFAULT_K = 4
+_DTYPES = {"float32": np.float32, "float16": np.float16}
+_LOG_FILENAME = "chunks.jsonl"
+_INITIAL_CAPACITY = 1024  # Rows of a new vectors file (doubled when full)
+_MIN_COMPACT_ROWS = 1024  # Deleted rows before the files are compacted
+
+# Operators of the metadata filters (same syntax than Chroma)
+_FILTER_OPERATORS: Dict[str, Callable[[Any, Any], bool]] = {
+    "$eq": lambda value, operand: value == operand,
+    "$ne": lambda value, operand: value != operand,
+    "$gt": lambda value, operand: value is not None and value > operand,
+    "$gte": lambda value, operand: value is not None and value >= operand,
+    "$lt": lambda value, operand: value is not None and value < operand,
+    "$lte": lambda value, operand: value is not None and value <= operand,
+    "$in": lambda value, operand: value in operand,
+    "$nin": lambda value, operand: value not in operand,
+}
+
+
+def matches_filter(metadata: Dict[str, Any], filter: Dict[str, Any]) -> bool:
+    """
+    Metadata filter with the syntax of Chroma: {"key": value}, {"key": {"$in": [...]}},
+    {"$and": [...]}, {"$or": [...]}
+    """
+    for key, condition in filter.items():
+        if key == "$and":
+            if not all(matches_filter(metadata, item) for item in condition):
+                return False
+        elif key == "$or":
+            if not any(matches_filter(metadata, item) for item in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = metadata.get(key, None)
+            for operator, operand in condition.items():
+                if operator not in _FILTER_OPERATORS:
+                    raise ValueError(f"Unsupported filter operator '{operator}'")
+                if not _FILTER_OPERATORS[operator](value, operand):
+                    return False
+        elif metadata.get(key, None) != condition:
+            return False
+
+    return True
+
+
+class NumpyStore(VectorStore, StoreBase):
+    """
+    In-process vector store for small and medium projects, without a database client. The
+    files are in <path>/<collection_name>/: vectors.<generation>.npy with the normalized
+    vectors (memory-mapped, float32 or float16) and chunks.jsonl, an append-only log of the
+    ids, texts and metadata of the rows. The search is a brute-force cosine similarity with
+    simsimd (if installed) or numpy. The files are read on first use, so opening the store
+    is immediate. The deleted rows are removed when they outnumber the live ones
+    """
+
+    def __init__(
+        self,
+        config: Dict[str, Any],
+        collection_name: Optional[str] = DEFAULT_CHUNKS_COLLECTION_NAME,
+        embeddings: Optional[Embeddings] = None,
+        **kwargs: Any,
+    ):
+        self.config = config
+        self.collection_name = collection_name
+        self.directory_path = Path(config["path"], collection_name)
+        self._embeddings = embeddings
+
+        dtype = str(config.get("dtype", None) or DEFAULT_DTYPE)
+        if dtype not in _DTYPES:
+            raise ValueError(
+                f"Invalid dtype '{dtype}' of the numpy store: {', '.join(_DTYPES.keys())}"
+            )
+        self.dtype = _DTYPES[dtype]
+        self.use_simsimd = simsimd is not None and config.get("simsimd", True)
+
+        self._lock = threading.RLock()
+        self._is_loaded = False
+        self._log_file = None
+        self._reset()
+
+    def _reset(self):
+        self._generation = 0
+        self._dim: int | None = None
+        self._vectors: np.memmap | None = None
+        self._valid: np.ndarray | None = None
+        self._num_rows = 0
+        self._ids: List[str | None] = []
+        self._page_contents: List[str | None] = []
+        self._metadatas: List[Dict[str, Any] | None] = []
+        self._row_by_id: Dict[str, int] = {}
+        self._rows_by_source: Dict[str, Set[int]] = {}
+
+    @property
+    def embeddings(self) -> Optional[Embeddings]:
+        return self._embeddings
+
+    # Files
+
+    def _get_vectors_path(self, generation: int) -> Path:
+        return self.directory_path / f"vectors.{generation}.npy"
+
+    def _load(self):
+        # Replay the log and map the vectors of the current generation. Call with lock
+        if self._is_loaded:
+            return
+
+        self.directory_path.mkdir(parents=True, exist_ok=True)
+        log_path = self.directory_path / _LOG_FILENAME
+        if log_path.exists():
+            valid_size = 0
+            with open(log_path, "rb") as log_file:
+                for line in log_file:
+                    try:
+                        if not line.endswith(b"\n"):
+                            raise ValueError("Incomplete line")
+                        if line.strip():
+                            self._apply(json.loads(line))
+                        valid_size += len(line)
+                    except ValueError:
+                        # Last line of an interrupted write
+                        logging.warning(f"Skipping invalid line in {log_path}")
+                        break
+
+            # Cut the invalid line, so the next records are not appended to it
+            if valid_size < log_path.stat().st_size:
+                os.truncate(log_path, valid_size)
+
+        if self._dim is not None:
+            self._vectors = np.load(
+                self._get_vectors_path(self._generation), mmap_mode="r+"
+            )
+            self._valid = np.zeros(self._vectors.shape[0], dtype=bool)
+            self._valid[list(self._row_by_id.values())] = True
+
+        # Vectors of a generation interrupted before it was logged
+        for vectors_path in self.directory_path.glob("vectors.*.npy"):
+            if vectors_path != self._get_vectors_path(self._generation):
+                vectors_path.unlink(missing_ok=True)
+
+        self._is_loaded = True
+
+    def _apply(self, record: Dict[str, Any]):
+        # Apply a record of the log to the rows in memory. Call with lock
+        if "generation" in record:
+            self._generation = record["generation"]
+            self._dim = record["dim"]
+            if record["dtype"] in _DTYPES and _DTYPES[record["dtype"]] != self.dtype:
+                logging.debug(
+                    f"Numpy store saved as {record['dtype']}, the dtype of the config is ignored"
+                )
+                self.dtype = _DTYPES[record["dtype"]]
+
+        elif "add" in record:
+            chunk_id, row = record["add"], record["row"]
+            if chunk_id in self._row_by_id:
+                self._apply({"delete": [chunk_id]})
+
+            missing_rows = row + 1 - len(self._ids)
+            if missing_rows > 0:
+                self._ids.extend([None] * missing_rows)
+                self._page_contents.extend([None] * missing_rows)
+                self._metadatas.extend([None] * missing_rows)
+            self._ids[row] = chunk_id
+            self._page_contents[row] = record["page_content"]
+            self._metadatas[row] = record["metadata"]
+            self._row_by_id[chunk_id] = row
+            self._rows_by_source.setdefault(
+                record["metadata"].get("source", None), set()
+            ).add(row)
+            self._num_rows = max(self._num_rows, row + 1)
+            if self._valid is not None:
+                self._valid[row] = True
+
+        elif "delete" in record:
+            for chunk_id in record["delete"]:
+                row = self._row_by_id.pop(chunk_id, None)
+                if row is None:
+                    continue
+                self._rows_by_source.get(
+                    self._metadatas[row].get("source", None), set()
+                ).discard(row)
+                self._ids[row] = None
+                self._page_contents[row] = None
+                self._metadatas[row] = None
+                if self._valid is not None:
+                    self._valid[row] = False
+
+        elif "update" in record:
+            row = self._row_by_id.get(record["update"], None)
+            if row is None:
+                return
+            self._rows_by_source.get(
+                self._metadatas[row].get("source", None), set()
+            ).discard(row)
+            self._metadatas[row] = record["metadata"]
+            self._rows_by_source.setdefault(
+                record["metadata"].get("source", None), set()
+            ).add(row)
+
+    def _append_log(self, records: List[Dict[str, Any]]):
+        # Call with lock, after the vectors of the records are flushed
+        if self._log_file is None:
+            self._log_file = open(
+                self.directory_path / _LOG_FILENAME, "a", encoding="utf-8"
+            )
+        self._log_file.write(
+            "".join(
+                json.dumps(record, ensure_ascii=False, default=str) + "\n"
+                for record in records
+            )
+        )
+        self._log_file.flush()
+
+    def _get_generation_record(self, generation: int) -> Dict[str, Any]:
+        return {
+            "generation": generation,
+            "dim": self._dim,
+            "dtype": np.dtype(self.dtype).name,
+        }
+
+    def _create_vectors(self, generation: int, capacity: int) -> np.memmap:
+        return open_memmap(
+            self._get_vectors_path(generation),
+            mode="w+",
+            dtype=self.dtype,
+            shape=(capacity, self._dim),
+        )
+
+    def _ensure_capacity(self, num_rows: int):
+        # Call with lock
+        if self._vectors is None:
+            self._vectors = self._create_vectors(
+                self._generation, max(_INITIAL_CAPACITY, num_rows)
+            )
+            self._valid = np.zeros(self._vectors.shape[0], dtype=bool)
+            self._append_log([self._get_generation_record(self._generation)])
+            return
+
+        capacity = self._vectors.shape[0]
+        if num_rows <= capacity:
+            return
+
+        # Copy the rows to a bigger file of the next generation
+        generation = self._generation + 1
+        vectors = self._create_vectors(generation, max(num_rows, capacity * 2))
+        vectors[: self._num_rows] = self._vectors[: self._num_rows]
+        vectors.flush()
+        self._append_log([self._get_generation_record(generation)])
+
+        old_vectors_path = self._get_vectors_path(self._generation)
+        self._generation = generation
+        self._vectors = vectors
+        self._valid = np.concatenate(
+            [self._valid, np.zeros(vectors.shape[0] - capacity, dtype=bool)]
+        )
+        old_vectors_path.unlink(missing_ok=True)
+
+    def compact(self):
+        """
+        Rewrite the vectors and the log without the deleted rows
+        """
+        with self._lock:
+            self._load()
+            if self._vectors is None:
+                return
+
+            rows = sorted(self._row_by_id.values())
+            generation = self._generation + 1
+            vectors = self._create_vectors(
+                generation, max(_INITIAL_CAPACITY, len(rows))
+            )
+            if len(rows) > 0:
+                vectors[: len(rows)] = self._vectors[rows]
+            vectors.flush()
+
+            records = [
+                {
+                    "add": self._ids[row],
+                    "row": new_row,
+                    "page_content": self._page_contents[row],
+                    "metadata": self._metadatas[row],
+                }
+                for new_row, row in enumerate(rows)
+            ]
+            dim = self._dim
+            log_path = self.directory_path / _LOG_FILENAME
+            temp_log_path = self.directory_path / (_LOG_FILENAME + ".tmp")
+            with open(temp_log_path, "w", encoding="utf-8") as log_file:
+                for record in [self._get_generation_record(generation)] + records:
+                    log_file.write(
+                        json.dumps(record, ensure_ascii=False, default=str) + "\n"
+                    )
+                log_file.flush()
+                os.fsync(log_file.fileno())
+
+            if self._log_file is not None:
+                self._log_file.close()
+                self._log_file = None
+            os.replace(temp_log_path, log_path)
+            self._get_vectors_path(self._generation).unlink(missing_ok=True)
+
+            self._reset()
+            self._generation, self._dim = generation, dim
+            for record in records:
+                self._apply(record)
+            self._vectors = vectors
+            self._valid = np.zeros(vectors.shape[0], dtype=bool)
+            self._valid[: len(rows)] = True
+
+    # Writes
+
+    def add_documents_with_embeddings(
+        self,
+        documents: List[Document],
+        embeddings: List[List[float]],
+        ids: Optional[List[str]] = None,
+        **add_metadatas,
+    ) -> List[str]:
+        # Generate ids
+        if ids is None:
+            ids = [str(uuid.uuid4()) for _ in documents]
+
+        page_contents = []
+        metadatas = []
+        vectors = []
+        kept_ids = []
+        for document, vector, id in zip(documents, embeddings, ids):
+            if document.page_content is None:
+                continue
+            page_contents.append(document.page_content)
+
+            # Add extra metadata
+            for key, value in add_metadatas.items():
+                document.metadata[key] = value
+
+            metadatas.append(document.metadata)
+            vectors.append(vector)
+            kept_ids.append(id)
+        ids = kept_ids
+        if len(ids) == 0:
+            return []
+
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.where(norms == 0, 1, norms)
+
+        with self._lock:
+            self._load()
+            if self._dim is None:
+                self._dim = vectors.shape[1]
+            elif vectors.shape[1] != self._dim:
+                raise ValueError(
+                    f"Vectors of dimension {vectors.shape[1]} added to a numpy store of dimension {self._dim}"
+                )
+
+            start_row = self._num_rows
+            self._ensure_capacity(start_row + len(ids))
+            self._vectors[start_row : start_row + len(ids)] = vectors
+            self._vectors.flush()
+
+            records = [
+                {
+                    "add": chunk_id,
+                    "row": start_row + i,
+                    "page_content": page_content,
+                    "metadata": metadata,
+                }
+                for i, (chunk_id, page_content, metadata) in enumerate(
+                    zip(ids, page_contents, metadatas)
+                )
+            ]
+            self._append_log(records)
+            for record in records:
+                self._apply(record)
+
+        return ids
+
+    def add_texts(
+        self,
+        texts: Iterable[str],
+        metadatas: Optional[List[dict]] = None,
+        ids: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> List[str]:
+        texts = list(texts)
+        documents = [
+            Document(
+                page_content=text, metadata=dict(metadatas[i]) if metadatas else {}
+            )
+            for i, text in enumerate(texts)
+        ]
+        return self.add_documents_with_embeddings(
+            documents, self._embeddings.embed_documents(texts), ids=ids
+        )
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> bool:
+        if not ids:
+            return True
+
+        with self._lock:
+            self._load()
+            chunk_ids = [chunk_id for chunk_id in ids if chunk_id in self._row_by_id]
+            if len(chunk_ids) == 0:
+                return True
+
+            record = {"delete": chunk_ids}
+            self._append_log([record])
+            self._apply(record)
+
+            num_deleted_rows = self._num_rows - len(self._row_by_id)
+            if num_deleted_rows >= max(_MIN_COMPACT_ROWS, len(self._row_by_id)):
+                self.compact()
+
+        return True
+
+    def delete_by_source(self, source: str):
+        with self._lock:
+            self._load()
+            rows = self._rows_by_source.get(source, set())
+            self.delete([self._ids[row] for row in rows])
+
+    def update_source(self, source: str, new_source: str):
+        with self._lock:
+            self._load()
+            records = [
+                {
+                    "update": self._ids[row],
+                    "metadata": {**self._metadatas[row], "source": new_source},
+                }
+                for row in sorted(self._rows_by_source.get(source, set()))
+            ]
+            if len(records) == 0:
+                return
+
+            self._append_log(records)
+            for record in records:
+                self._apply(record)
+
+    # Reads
+
+    def _get_document(self, row: int, score: Optional[float] = None) -> Document:
+        metadata = {**self._metadatas[row], CHUNK_ID_KEY: self._ids[row]}
+        if score is not None:
+            metadata[RETRIEVAL_SCORE_KEY] = score
+
+        return Document(
+            id=self._ids[row], page_content=self._page_contents[row], metadata=metadata
+        )
+
+    def _get_rows(self, filter: Optional[Dict[str, Any]] = None) -> np.ndarray:
+        # Rows of the live chunks matching the filter. Call with lock
+        if not filter:
+            return np.flatnonzero(self._valid[: self._num_rows])
+
+        if list(filter.keys()) == ["source"] and isinstance(filter["source"], str):
+            return np.array(
+                sorted(self._rows_by_source.get(filter["source"], set())),
+                dtype=np.int64,
+            )
+
+        return np.array(
+            [
+                row
+                for row in self._row_by_id.values()
+                if matches_filter(self._metadatas[row], filter)
+            ],
+            dtype=np.int64,
+        )
+
+    def get_chunks_by_ids(self, ids: List[str]) -> List[Document]:
+        with self._lock:
+            self._load()
+            return [
+                self._get_document(self._row_by_id[chunk_id])
+                for chunk_id in ids
+                if chunk_id in self._row_by_id
+            ]
+
+    def get_by_ids(self, ids: List[str], /) -> List[Document]:
+        return self.get_chunks_by_ids(list(ids))
+
+    def iget_chunks(self, batch_size: int = 1000) -> Iterable[List[Document]]:
+        with self._lock:
+            self._load()
+            rows = sorted(self._row_by_id.values())
+            chunks = [self._get_document(row) for row in rows]
+
+        for i in range(0, len(chunks), batch_size):
+            yield chunks[i : i + batch_size]
+
+    def get(
+        self,
+        ids: Optional[List[str]] = None,
+        where: Optional[Dict[str, Any]] = None,
+        limit: Optional[int] = None,
+        offset: Optional[int] = None,
+        include: List[str] = ["metadatas", "documents"],
+        **kwargs: Any,
+    ) -> Dict[str, Any]:
+        """
+        Chunks by ids and/or metadata filter, in the format of Chroma's get
+        """
+        with self._lock:
+            self._load()
+            if ids is not None:
+                rows = [
+                    self._row_by_id[chunk_id]
+                    for chunk_id in ids
+                    if chunk_id in self._row_by_id
+                ]
+                if where:
+                    rows = [
+                        row
+                        for row in rows
+                        if matches_filter(self._metadatas[row], where)
+                    ]
+            else:
+                rows = self._get_rows(where).tolist()
+
+            rows = rows[offset or 0 :]
+            if limit is not None:
+                rows = rows[:limit]
+
+            return {
+                "ids": [self._ids[row] for row in rows],
+                "metadatas": (
+                    [dict(self._metadatas[row]) for row in rows]
+                    if "metadatas" in include
+                    else None
+                ),
+                "documents": (
+                    [self._page_contents[row] for row in rows]
+                    if "documents" in include
+                    else None
+                ),
+                "embeddings": (
+                    np.asarray(self._vectors[rows], dtype=np.float32).tolist()
+                    if "embeddings" in include and len(rows) > 0
+                    else None
+                ),
+            }
+
+    # Search
+
+    def _similarities(self, queries: np.ndarray, vectors: np.ndarray) -> np.ndarray:
+        # Cosine similarity of the normalized queries and rows, shape (queries, rows)
+        if self.use_simsimd:
+            try:
+                return 1 - np.asarray(
+                    simsimd.cdist(
+                        queries.astype(vectors.dtype), vectors, metric="cosine"
+                    ),
+                    dtype=np.float32,
+                )
+            except Exception as e:
+                logging.debug(f"simsimd not supported, using numpy: {str(e)}")
+                self.use_simsimd = False
+
+        return queries @ np.asarray(vectors, dtype=np.float32).T
+
+    def _search_rows(
+        self,
+        embeddings: List[List[float]],
+        k: int,
+        filter: Optional[Dict[str, Any]] = None,
+        with_vectors: bool = False,
+    ) -> List[List[Tuple[Document, float, np.ndarray | None]]]:
+        """
+        The k most similar chunks of each query vector, with their cosine similarity (and
+        their vectors)
+        """
+        queries = np.asarray(embeddings, dtype=np.float32).reshape(len(embeddings), -1)
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        queries = queries / np.where(norms == 0, 1, norms)
+
+        with self._lock:
+            self._load()
+            if self._vectors is None or len(queries) == 0:
+                return [[] for _ in queries]
+
+            if filter:
+                rows = self._get_rows(filter)
+                num_rows = len(rows)
+                if num_rows == 0:
+                    return [[] for _ in queries]
+                vectors = self._vectors[rows]
+                similarities = self._similarities(queries, vectors)
+            else:
+                # A slice of the memory-mapped file is not copied, the deleted rows are masked
+                rows = range(self._num_rows)
+                num_rows = len(self._row_by_id)
+                if num_rows == 0:
+                    return [[] for _ in queries]
+                vectors = self._vectors[: self._num_rows]
+                similarities = self._similarities(queries, vectors)
+                similarities[:, ~self._valid[: self._num_rows]] = -np.inf
+
+            k = min(k, num_rows)
+            top_indexes = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+
+            results = []
+            for query_similarities, indexes in zip(similarities, top_indexes):
+                indexes = indexes[np.argsort(-query_similarities[indexes])]
+                results.append(
+                    [
+                        (
+                            self._get_document(
+                                int(rows[i]), float(query_similarities[i])
+                            ),
+                            float(query_similarities[i]),
+                            (
+                                np.asarray(vectors[i], dtype=np.float32)
+                                if with_vectors
+                                else None
+                            ),
+                        )
+                        for i in indexes
+                    ]
+                )
+
+            return results
+
+    def similarity_search_by_vectors(
+        self,
+        embeddings: List[List[float]],
+        k: int = DEFAULT_K,
+        filter: Optional[Dict[str, Any]] = None,
+        **kwargs: Any,
+    ) -> List[List[Document]]:
+        return [
+            [document for document, _, _ in query_results]
+            for query_results in self._search_rows(embeddings, k, filter)
+        ]
+
+    def similarity_search_by_vector_with_score(
+        self,
+        embedding: List[float],
+        k: int = DEFAULT_K,
+        filter: Optional[Dict[str, Any]] = None,
+        **kwargs: Any,
+    ) -> List[Tuple[Document, float]]:
+        return [
+            (document, similarity)
+            for document, similarity, _ in self._search_rows([embedding], k, filter)[0]
+        ]
+
+    def similarity_search_by_vector(
+        self,
+        embedding: List[float],
+        k: int = DEFAULT_K,
+        filter: Optional[Dict[str, Any]] = None,
+        **kwargs: Any,
+    ) -> List[Document]:
+        return [
+            document
+            for document, _ in self.similarity_search_by_vector_with_score(
+                embedding, k, filter
+            )
+        ]
+
+    def similarity_search_with_score(
+        self,
+        query: str,
+        k: int = DEFAULT_K,
+        filter: Optional[Dict[str, Any]] = None,
+        **kwargs: Any,
+    ) -> List[Tuple[Document, float]]:
+        return self.similarity_search_by_vector_with_score(
+            self._embeddings.embed_query(query), k, filter
+        )
+
+    def similarity_search(
+        self,
+        query: str,
+        k: int = DEFAULT_K,
+        filter: Optional[Dict[str, Any]] = None,
+        **kwargs: Any,
+    ) -> List[Document]:
+        return [
+            document
+            for document, _ in self.similarity_search_with_score(query, k, filter)
+        ]
+
+    def _select_relevance_score_fn(self) -> Callable[[float], float]:
+        # The scores are cosine similarities already
+        return lambda similarity: similarity
+
+    def max_marginal_relevance_search_by_vector(
+        self,
+        embedding: List[float],
+        k: int = DEFAULT_K,
+        fetch_k: int = 20,
+        lambda_mult: float = 0.5,
+        filter: Optional[Dict[str, Any]] = None,
+        **kwargs: Any,
+    ) -> List[Document]:
+        candidates = self._search_rows([embedding], fetch_k, filter, with_vectors=True)[
+            0
+        ]
+        if len(candidates) == 0:
+            return []
+
+        mmr_selected = maximal_marginal_relevance(
+            np.array(embedding, dtype=np.float32),
+            [vector for _, _, vector in candidates],
+            k=k,
+            lambda_mult=lambda_mult,
+        )
+        return [candidates[i][0] for i in mmr_selected]
+
+    def max_marginal_relevance_search(
+        self,
+        query: str,
+        k: int = DEFAULT_K,
+        fetch_k: int = 20,
+        lambda_mult: float = 0.5,
+        filter: Optional[Dict[str, Any]] = None,
+        **kwargs: Any,
+    ) -> List[Document]:
+        return self.max_marginal_relevance_search_by_vector(
+            self._embeddings.embed_query(query), k, fetch_k, lambda_mult, filter
+        )
+
+    @classmethod
+    def from_texts(
+        cls,
+        texts: List[str],
+        embedding: Embeddings,
+        metadatas: Optional[List[dict]] = None,
+        config: Optional[Dict[str, Any]] = None,
+        collection_name: str = DEFAULT_CHUNKS_COLLECTION_NAME,
+        **kwargs: Any,
+    ) -> "NumpyStore":
+        store = cls(config or {}, collection_name=collection_name, embeddings=embedding)
+        store.add_texts(texts, metadatas=metadatas, **kwargs)
+        return store
+
+    def is_thread_safe(self) -> bool:
+        return True
+
+    def close(self):
+        with self._lock:
+            if self._vectors is not None:
+                self._vectors.flush()
+            if self._log_file is not None:
+                self._log_file.close()
+                self._log_file = None
+
+    @classmethod
+    def does_vectorstore_exist(cls) -> bool:
+        return True
@@ -0,0 +1,226 @@
+import os
+import gzip
+import json
+import hashlib
+import logging
+import threading
+from functools import lru_cache
+from importlib import metadata as importlib_metadata
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+from pathlib import Path
+from langchain_core.documents import Document
+
+DEFAULT_DIRECTORY_NAME = "parsed"
+DEFAULT_MAX_SIZE_MB = 2048  # Maximum size of the cached files (in MB)
+_CACHE_FORMAT_VERSION = 1  # Increase to invalidate the cache when the loaders change
+_EVICTION_TARGET_RATIO = (
+    0.9  # Evict until the cache size is below this ratio of max size
+)
+_PARSER_PACKAGES = ["langchain-community", "unstructured", "pdfminer.six"]
+_FILE_EXTENSION = ".jsonl.gz"
+
+
+class ParsedDocumentCacheStore:
+    """
+    Content addressed cache of the documents returned by the loaders, keyed by (hash of the file
+    content, loader key). Each entry is a gzip compressed JSON Lines file (one document per line)
+    under .nerd_store/parsed/ (or directory_name), so cached documents can be read one at a time.
+    The least recently used entries are evicted when the cache exceeds max_size_mb (0: never).
+    """
+
+    cache_directory_path: Path = None
+    max_size_bytes: int = 0
+
+    def __init__(
+        self,
+        store_directory_path: str | Path,
+        max_size_mb: float = DEFAULT_MAX_SIZE_MB,
+        directory_name: str = DEFAULT_DIRECTORY_NAME,
+    ):
+        if not Path(store_directory_path).exists():
+            raise FileNotFoundError(
+                f"Store directory path not found at {store_directory_path}"
+            )
+
+        self.cache_directory_path = Path(store_directory_path, directory_name)
+        self.cache_directory_path.mkdir(exist_ok=True)
+        self.max_size_bytes = int(float(max_size_mb) * 1024**2)
+        self._lock = threading.Lock()
+
+        self._size_bytes = sum(
+            entry_stat.st_size for _, entry_stat in self._iscan_entries()
+        )
+
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def get_loader_key(loader_class: type, loader_args_json: str = "{}") -> str:
+        """
+        Identifies the parser: loader class, loader arguments and versions of the parser
+        packages. Documents cached with another loader key are not reused
+        """
+        package_versions = {}
+        for package_name in _PARSER_PACKAGES:
+            try:
+                package_versions[package_name] = importlib_metadata.version(
+                    package_name
+                )
+            except importlib_metadata.PackageNotFoundError:
+                package_versions[package_name] = None
+
+        loader_key_json = json.dumps(
+            {
+                "loader": f"{loader_class.__module__}.{loader_class.__qualname__}",
+                "args": loader_args_json,
+                "packages": package_versions,
+                "version": _CACHE_FORMAT_VERSION,
+            },
+            sort_keys=True,
+        )
+        return hashlib.sha256(loader_key_json.encode("utf-8")).hexdigest()[:16]
+
+    def get_entry_path(self, content_hash: str, loader_key: str) -> Path:
+        return Path(
+            self.cache_directory_path,
+            content_hash[:2],
+            f"{content_hash}-{loader_key}{_FILE_EXTENSION}",
+        )
+
+    def has(self, content_hash: str, loader_key: str) -> bool:
+        return self.get_entry_path(content_hash, loader_key).exists()
+
+    def iget(
+        self, content_hash: str, loader_key: str, source: Optional[str] = None
+    ) -> Iterator[Document]:
+        """
+        Yields the cached documents one at a time. The source in the metadata is replaced
+        with the given one (the same content can be found in other path)
+        """
+        entry_path = self.get_entry_path(content_hash, loader_key)
+
+        # Refresh the modification time (used by the eviction)
+        os.utime(entry_path)
+
+        with gzip.open(entry_path, "rt", encoding="utf-8") as entry_file:
+            for line in entry_file:
+                document_data = json.loads(line)
+                metadata = document_data["metadata"]
+                if source is not None:
+                    metadata["source"] = source
+
+                yield Document(
+                    page_content=document_data["page_content"], metadata=metadata
+                )
+
+    def get(
+        self, content_hash: str, loader_key: str, source: Optional[str] = None
+    ) -> Optional[List[Document]]:
+        """
+        Returns the cached documents (None if not found)
+        """
+        try:
+            return list(self.iget(content_hash, loader_key, source=source))
+        except FileNotFoundError:
+            return None
+
+    def delete(self, content_hash: str, loader_key: str):
+        entry_path = self.get_entry_path(content_hash, loader_key)
+        try:
+            entry_size = entry_path.stat().st_size
+            os.remove(entry_path)
+        except FileNotFoundError:
+            return
+
+        with self._lock:
+            self._size_bytes = max(0, self._size_bytes - entry_size)
+
+    def set(self, content_hash: str, loader_key: str, documents: Iterable[Document]):
+        for _ in self.iset(content_hash, loader_key, documents):
+            pass
+
+    def iset(
+        self, content_hash: str, loader_key: str, documents: Iterable[Document]
+    ) -> Iterator[Document]:
+        """
+        Yields the documents while they are written in the cache. The entry is only saved
+        when all the documents are consumed
+        """
+        entry_path = self.get_entry_path(content_hash, loader_key)
+        entry_path.parent.mkdir(exist_ok=True)
+        temp_path = entry_path.with_name(f"{entry_path.name}.{os.getpid()}.tmp")
+
+        is_complete = False
+        try:
+            with gzip.open(temp_path, "wt", encoding="utf-8") as entry_file:
+                for document in documents:
+                    entry_file.write(
+                        json.dumps(
+                            {
+                                "page_content": document.page_content,
+                                "metadata": document.metadata,
+                            },
+                            default=str,
+                        )
+                        + "\n"
+                    )
+                    yield document
+            is_complete = True
+        finally:
+            if is_complete:
+                os.replace(temp_path, entry_path)
+                self._add_size(entry_path.stat().st_size)
+            else:
+                temp_path.unlink(missing_ok=True)
+
+    def _add_size(self, size_bytes: int):
+        with self._lock:
+            self._size_bytes += size_bytes
+            if 0 < self.max_size_bytes < self._size_bytes:
+                self._evict()
+
+    def _evict(self):
+        target_size_bytes = int(self.max_size_bytes * _EVICTION_TARGET_RATIO)
+        evicted_bytes = 0
+        evicted_entries = 0
+
+        entries = sorted(self._iscan_entries(), key=lambda entry: entry[1].st_mtime_ns)
+        for entry_path, entry_stat in entries:
+            if self._size_bytes <= target_size_bytes:
+                break
+
+            try:
+                os.remove(entry_path)
+            except OSError as e:
+                logging.warning(f"Error evicting parsed document {entry_path}: {e}")
+                continue
+
+            self._size_bytes -= entry_stat.st_size
+            evicted_bytes += entry_stat.st_size
+            evicted_entries += 1
+
+        logging.debug(
+            f"Parsed document cache: evicted {evicted_entries} files ({evicted_bytes / 1024**2:.1f} MB)"
+        )
+
+    def _iscan_entries(self) -> Iterator[tuple[str, os.stat_result]]:
+        for shard_entry in os.scandir(self.cache_directory_path):
+            if not shard_entry.is_dir():
+                continue
+            for entry in os.scandir(shard_entry.path):
+                if entry.name.endswith(_FILE_EXTENSION):
+                    yield entry.path, entry.stat()
+
+    def get_stats(self) -> Dict[str, Any]:
+        count = sum(1 for _ in self._iscan_entries())
+
+        return {
+            "directory_path": str(self.cache_directory_path),
+            "count": count,
+            "size_mb": self._size_bytes / 1024**2,
+            "max_size_mb": self.max_size_bytes / 1024**2,
+        }
+
+    def clear(self):
+        with self._lock:
+            for entry_path, _ in list(self._iscan_entries()):
+                os.remove(entry_path)
+            self._size_bytes = 0
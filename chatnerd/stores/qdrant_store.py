@@ -1,14 +1,115 @@
 import logging
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Iterable, Optional, Tuple
 import threading
+import uuid
 from qdrant_client import QdrantClient, models
 from langchain_community.vectorstores.qdrant import Qdrant
 from langchain_core.documents import Document
 from langchain_core.embeddings import Embeddings
 from langchain_community.embeddings.fake import FakeEmbeddings
-from chatnerd.stores.store_base import StoreBase
+from chatnerd.stores.store_base import (
+    StoreBase,
+    CHUNK_ID_KEY,
+    RETRIEVAL_SCORE_KEY,
+)
+from chatnerd.lib.helpers import get_embeddings_client
 
 DEFAULT_CHUNKS_COLLECTION_NAME = "chatnerd_chunks"
+# Keys of the qdrant config that are collection and search settings, not client arguments
+INDEX_CONFIG_KEYS = ["on_disk", "hnsw", "optimizers", "quantization", "search"]
+QUANTIZATION_TYPES = ["scalar", "product", "binary"]
+
+
+def get_hnsw_config(config: Dict[str, Any]) -> models.HnswConfigDiff | None:
+    hnsw_config = config.get("hnsw", None)
+    return models.HnswConfigDiff(**hnsw_config) if hnsw_config else None
+
+
+def get_optimizers_config(
+    config: Dict[str, Any],
+) -> models.OptimizersConfigDiff | None:
+    optimizers_config = config.get("optimizers", None)
+    return (
+        models.OptimizersConfigDiff(**optimizers_config) if optimizers_config else None
+    )
+
+
+def get_quantization_config(
+    config: Dict[str, Any],
+) -> models.QuantizationConfig | None:
+    """
+    Quantization of the vectors from the config: {"type": "scalar", "quantile": 0.99},
+    {"type": "product", "compression": "x16"} or {"type": "binary"}, with "always_ram"
+    """
+    quantization_config = dict(config.get("quantization", None) or {})
+    if not quantization_config:
+        return None
+
+    quantization_type = str(quantization_config.pop("type", "")).lower()
+    if quantization_type == "scalar":
+        return models.ScalarQuantization(
+            scalar=models.ScalarQuantizationConfig(
+                type=models.ScalarType.INT8, **quantization_config
+            )
+        )
+    elif quantization_type == "product":
+        return models.ProductQuantization(
+            product=models.ProductQuantizationConfig(
+                compression=quantization_config.pop("compression", "x16"),
+                **quantization_config,
+            )
+        )
+    elif quantization_type == "binary":
+        return models.BinaryQuantization(
+            binary=models.BinaryQuantizationConfig(**quantization_config)
+        )
+    else:
+        raise ValueError(
+            f"Invalid quantization type '{quantization_type}' in qdrant config: {', '.join(QUANTIZATION_TYPES)}"
+        )
+
+
+def get_search_params(config: Dict[str, Any]) -> models.SearchParams | None:
+    """
+    Search parameters from the config: hnsw_ef, exact, and for quantized vectors rescore,
+    oversampling and ignore_quantization
+    """
+    search_config = dict(config.get("search", None) or {})
+    if not search_config:
+        return None
+
+    quantization_params = {
+        key: search_config.pop(config_key)
+        for key, config_key in [
+            ("ignore", "ignore_quantization"),
+            ("rescore", "rescore"),
+            ("oversampling", "oversampling"),
+        ]
+        if config_key in search_config
+    }
+    return models.SearchParams(
+        **search_config,
+        quantization=(
+            models.QuantizationSearchParams(**quantization_params)
+            if quantization_params
+            else None
+        ),
+    )
+
+
+def split_index_config(
+    config: Dict[str, Any],
+) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    (client config, index config) of the qdrant config
+    """
+    client_config = {
+        key: value for key, value in config.items() if key not in INDEX_CONFIG_KEYS
+    }
+    index_config = {
+        key: value for key, value in config.items() if key in INDEX_CONFIG_KEYS
+    }
+    return client_config, index_config
 
 
 class QdrantStore(Qdrant, StoreBase):
@@ -21,24 +122,30 @@ class QdrantStore(Qdrant, StoreBase):
         config: Dict[str, Any],
         collection_name: Optional[str] = DEFAULT_CHUNKS_COLLECTION_NAME,
         embeddings: Optional[Embeddings] = None,
+        vector_size: Optional[int] = None,
         **kwargs: Any,
     ):
         self.config = config
+        client_config, self.index_config = split_index_config(config)
+        self.search_params = get_search_params(self.index_config)
 
         # Keep a singleton and thread safe instance of the QdrantClient
         if not hasattr(self.__local, "qdrant_client"):
             self.__local.qdrant_client = QdrantClient(
                 # path=config["path"],
-                **config,
+                **client_config,
             )
 
-        # Create collection if it does not exist
-        if embeddings and not self.__local.qdrant_client.collection_exists(
+        # Create collection if it does not exist (vector_size: without embeddings)
+        if (
+            embeddings or vector_size
+        ) and not self.__local.qdrant_client.collection_exists(
             collection_name=collection_name
         ):
             # Get sentence_embedding_dimension from embeddings
             sentence_embedding_dimension = (
-                embeddings.client.get_sentence_embedding_dimension()
+                vector_size
+                or get_embeddings_client(embeddings).get_sentence_embedding_dimension()
             )
 
             self.__local.qdrant_client.create_collection(
@@ -46,9 +153,11 @@ class QdrantStore(Qdrant, StoreBase):
                 vectors_config=models.VectorParams(
                     distance=models.Distance.COSINE,
                     size=sentence_embedding_dimension,
+                    on_disk=self.index_config.get("on_disk", None),
                 ),
-                # optimizers_config=models.OptimizersConfigDiff(memmap_threshold=0),
-                # hnsw_config=models.HnswConfigDiff(on_disk=True, m=16, ef_construct=100)
+                hnsw_config=get_hnsw_config(self.index_config),
+                optimizers_config=get_optimizers_config(self.index_config),
+                quantization_config=get_quantization_config(self.index_config),
             )
 
         # Create Fake embeddings if embeddings are not provided
@@ -62,6 +171,24 @@ class QdrantStore(Qdrant, StoreBase):
             **kwargs,
         )
 
+    def update_index_config(self):
+        """
+        Apply the index settings of the config to the existing collection. Qdrant rebuilds the
+        index and the quantized vectors in the background
+        """
+        on_disk = self.index_config.get("on_disk", None)
+        self.client.update_collection(
+            collection_name=self.collection_name,
+            vectors_config=(
+                {self.vector_name or "": models.VectorParamsDiff(on_disk=on_disk)}
+                if on_disk is not None
+                else None
+            ),
+            hnsw_config=get_hnsw_config(self.index_config),
+            optimizers_config=get_optimizers_config(self.index_config),
+            quantization_config=get_quantization_config(self.index_config),
+        )
+
     def close(self):
         if hasattr(self.__local, "qdrant_client"):
             self.__local.qdrant_client.close()
@@ -94,6 +221,231 @@ class QdrantStore(Qdrant, StoreBase):
             ids.extend(batch_ids)
         return ids
 
+    def add_documents_with_embeddings(
+        self,
+        documents: List[Document],
+        embeddings: List[List[float]],
+        ids: Optional[List[str]] = None,
+        **add_metadatas,
+    ) -> List[str]:
+        # Generate ids
+        if ids is None:
+            ids = [str(uuid.uuid4()) for _ in documents]
+
+        page_contents = []
+        metadatas = []
+        vectors = []
+        kept_ids = []
+        for document, vector, id in zip(documents, embeddings, ids):
+            if document.page_content is None:
+                continue
+            page_contents.append(document.page_content)
+
+            # Add extra metadata
+            for key, value in add_metadatas.items():
+                document.metadata[key] = value
+
+            metadatas.append(document.metadata)
+            vectors.append(vector)
+            kept_ids.append(id)
+        ids = kept_ids
+
+        payloads = self._build_payloads(
+            page_contents,
+            metadatas,
+            self.content_payload_key,
+            self.metadata_payload_key,
+        )
+
+        points = [
+            models.PointStruct(
+                id=point_id,
+                vector=(
+                    vector if self.vector_name is None else {self.vector_name: vector}
+                ),
+                payload=payload,
+            )
+            for point_id, vector, payload in zip(ids, vectors, payloads)
+        ]
+
+        self.client.upsert(collection_name=self.collection_name, points=points)
+
+        return ids
+
+    def delete_by_source(self, source: str):
+        self.client.delete(
+            collection_name=self.collection_name,
+            points_selector=models.FilterSelector(filter=self._source_filter(source)),
+        )
+
+    def update_source(self, source: str, new_source: str):
+        # Overwrite the nested key 'source' in the metadata payload (vectors are kept)
+        self.client.set_payload(
+            collection_name=self.collection_name,
+            payload={"source": new_source},
+            key=self.metadata_payload_key,
+            points=self._source_filter(source),
+        )
+
+    def _source_filter(self, source: str) -> models.Filter:
+        return models.Filter(
+            must=[
+                models.FieldCondition(
+                    key=f"{self.metadata_payload_key}.source",
+                    match=models.MatchValue(value=source),
+                )
+            ]
+        )
+
+    def get_chunks_by_ids(self, ids: List[str]) -> List[Document]:
+        if len(ids) == 0:
+            return []
+
+        points = self.client.retrieve(
+            collection_name=self.collection_name,
+            ids=ids,
+            with_payload=True,
+            with_vectors=False,
+        )
+        return [
+            self._document_from_scored_point(
+                point,
+                self.collection_name,
+                self.content_payload_key,
+                self.metadata_payload_key,
+            )
+            for point in points
+        ]
+
+    def iget_chunks(self, batch_size: int = 1000) -> Iterable[List[Document]]:
+        offset = None
+        while True:
+            points, offset = self.client.scroll(
+                collection_name=self.collection_name,
+                limit=batch_size,
+                offset=offset,
+                with_payload=True,
+                with_vectors=False,
+            )
+            if len(points) > 0:
+                yield [
+                    self._document_from_scored_point(
+                        point,
+                        self.collection_name,
+                        self.content_payload_key,
+                        self.metadata_payload_key,
+                    )
+                    for point in points
+                ]
+            if offset is None:
+                return
+
+    def similarity_search_with_score_by_vector(
+        self,
+        embedding: List[float],
+        k: int = 4,
+        filter: Optional[Dict[str, Any] | models.Filter] = None,
+        search_params: Optional[models.SearchParams] = None,
+        **kwargs: Any,
+    ) -> List[Tuple[Document, float]]:
+        # Used by all the similarity searches: search params of the config by default
+        return super().similarity_search_with_score_by_vector(
+            embedding,
+            k=k,
+            filter=filter,
+            search_params=search_params or self.search_params,
+            **kwargs,
+        )
+
+    def max_marginal_relevance_search_with_score_by_vector(
+        self,
+        embedding: List[float],
+        k: int = 4,
+        fetch_k: int = 20,
+        lambda_mult: float = 0.5,
+        filter: Optional[Dict[str, Any] | models.Filter] = None,
+        search_params: Optional[models.SearchParams] = None,
+        **kwargs: Any,
+    ) -> List[Tuple[Document, float]]:
+        return super().max_marginal_relevance_search_with_score_by_vector(
+            embedding,
+            k=k,
+            fetch_k=fetch_k,
+            lambda_mult=lambda_mult,
+            filter=filter,
+            search_params=search_params or self.search_params,
+            **kwargs,
+        )
+
+    def similarity_search_by_vectors(
+        self,
+        embeddings: List[List[float]],
+        k: int = 4,
+        filter: Optional[Dict[str, Any] | models.Filter] = None,
+        search_params: Optional[models.SearchParams] = None,
+        score_threshold: Optional[float] = None,
+        **kwargs: Any,
+    ) -> List[List[Document]]:
+        if len(embeddings) == 0:
+            return []
+
+        qdrant_filter = filter
+        if isinstance(filter, dict):
+            qdrant_filter = self._qdrant_filter_from_dict(filter)
+
+        # A single request with all the vectors
+        results = self.client.search_batch(
+            collection_name=self.collection_name,
+            requests=[
+                models.SearchRequest(
+                    vector=(
+                        vector
+                        if self.vector_name is None
+                        else models.NamedVector(name=self.vector_name, vector=vector)
+                    ),
+                    filter=qdrant_filter,
+                    params=search_params or self.search_params,
+                    limit=k,
+                    with_payload=True,
+                    with_vector=False,
+                    score_threshold=score_threshold,
+                )
+                for vector in embeddings
+            ],
+        )
+
+        return [
+            [
+                self._document_from_scored_point(
+                    point,
+                    self.collection_name,
+                    self.content_payload_key,
+                    self.metadata_payload_key,
+                )
+                for point in points
+            ]
+            for points in results
+        ]
+
+    @classmethod
+    def _document_from_scored_point(
+        cls,
+        scored_point: Any,
+        collection_name: str,
+        content_payload_key: str,
+        metadata_payload_key: str,
+    ) -> Document:
+        # Used by all the searches: keep the id and the score of the chunk
+        document = super()._document_from_scored_point(
+            scored_point, collection_name, content_payload_key, metadata_payload_key
+        )
+        document.id = str(scored_point.id)
+        document.metadata[CHUNK_ID_KEY] = document.id
+        if getattr(scored_point, "score", None) is not None:
+            document.metadata[RETRIEVAL_SCORE_KEY] = scored_point.score
+
+        return document
+
     def get(self, **kwargs: Any) -> Dict[str, Any]:
         raise NotImplementedError("Method 'get' not implemented for QdrantStore")
 
@@ -1,18 +1,103 @@
 import logging
-from typing import Any, List, Dict, Optional, Iterable
+import threading
+from typing import Any, ClassVar, List, Dict, Optional, Iterable, Tuple
 from pathlib import Path
 import sqlite3
 import json
+from datetime import datetime, timezone
+from chatnerd.stores.studied_document_cache import StudiedDocumentCache
 
 DEFAULT_DATABASE_FILENAME = "project_status.sqlite"
+_MAX_QUERY_PARAMS = 900  # Maximum number of parameters in a single SQLite query
+
+
+def _add_column(table: str, column: str, definition: str):
+    # ALTER TABLE has no IF NOT EXISTS: the column is only added when missing
+    def migration(connection: sqlite3.Connection):
+        columns = [row[1] for row in connection.execute(f"PRAGMA table_info({table})")]
+        if column not in columns:
+            connection.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+    return migration
+
+
+# Schema migrations (statements, or functions of the connection). The index of the last
+# applied migration is saved in PRAGMA user_version
+_MIGRATIONS = [
+    [
+        "CREATE TABLE IF NOT EXISTS studied_documents (\
+            id TEXT PRIMARY KEY, \
+            source TEXT, \
+            page_content TEXT, \
+            metadata TEXT, \
+            created_at TEXT, \
+            updated_at TEXT)",
+    ],
+    [
+        "CREATE TABLE IF NOT EXISTS source_files (\
+            source TEXT PRIMARY KEY, \
+            size INTEGER, \
+            mtime_ns INTEGER, \
+            content_hash TEXT, \
+            updated_at TEXT)",
+        "CREATE INDEX IF NOT EXISTS source_files_content_hash ON source_files (content_hash)",
+    ],
+    [
+        "CREATE TABLE IF NOT EXISTS studied_document_parts (\
+            document_id TEXT, \
+            part INTEGER, \
+            page_content TEXT, \
+            PRIMARY KEY (document_id, part))",
+    ],
+    [
+        "CREATE TABLE IF NOT EXISTS failed_files (\
+            source TEXT PRIMARY KEY, \
+            content_hash TEXT, \
+            error TEXT, \
+            failed_at TEXT)",
+    ],
+    [
+        "CREATE TABLE IF NOT EXISTS study_runs (\
+            id INTEGER PRIMARY KEY AUTOINCREMENT, \
+            total_files INTEGER, \
+            studied_files INTEGER, \
+            failed_files INTEGER, \
+            batches INTEGER, \
+            started_at TEXT, \
+            updated_at TEXT, \
+            finished_at TEXT)",
+    ],
+    [
+        "CREATE TABLE IF NOT EXISTS lexical_chunks (\
+            id INTEGER PRIMARY KEY AUTOINCREMENT, \
+            chunk_id TEXT UNIQUE, \
+            source TEXT)",
+        "CREATE INDEX IF NOT EXISTS lexical_chunks_source ON lexical_chunks (source)",
+    ],
+    [
+        _add_column("failed_files", "size", "INTEGER"),
+        _add_column("failed_files", "mtime_ns", "INTEGER"),
+    ],
+]
+
+# Full-text index of the chunks (rowid: lexical_chunks.id). Not a migration: SQLite may be
+# compiled without FTS5, then the lexical search is disabled
+_LEXICAL_INDEX_STATEMENT = "CREATE VIRTUAL TABLE IF NOT EXISTS lexical_chunks_fts USING fts5(\
+    page_content, \
+    tokenize = 'unicode61 remove_diacritics 2')"
 
 
 # Reference: https://codereview.stackexchange.com/questions/182700/python-class-to-manage-a-table-in-sqlite
 class StatusStore:
-    connection = sqlite3.Connection = None
+    connection: sqlite3.Connection = None
     # cursor: sqlite3.Cursor
     database_path: Path = None
     connect_kwargs: Dict[str, Any] = {}
+    has_lexical_index: bool = False
+
+    # Shared stores by (database path, thread id if SQLite is not thread safe)
+    _shared_stores: ClassVar[Dict[Tuple[str, int | None], "StatusStore"]] = {}
+    _shared_stores_lock: ClassVar[threading.Lock] = threading.Lock()
 
     def __init__(
         self,
@@ -33,7 +118,6 @@ class StatusStore:
             )
 
         database_path = Path(store_directory_path, DEFAULT_DATABASE_FILENAME)
-        database_exists = database_path.exists()
 
         self.database_path = database_path
         self.connect_kwargs = {
@@ -45,14 +129,32 @@ class StatusStore:
 
         self.connect()
 
-        # Create the database if it does not exist
-        if not database_exists:
-            self.migrate_up()
+        # Create the database or apply the pending migrations
+        self.migrate_up()
+        self.create_lexical_index()
+
+    @classmethod
+    def shared(cls, store_directory_path: str | Path) -> "StatusStore":
+        """
+        Store kept open for the process (or the thread if SQLite is not thread safe), so
+        frequent reads don't pay the connection and the migration check. Don't close it
+        """
+        thread_id = None if sqlite3.threadsafety == 3 else threading.get_ident()
+        key = (str(Path(store_directory_path).resolve()), thread_id)
+
+        with cls._shared_stores_lock:
+            status_store = cls._shared_stores.get(key, None)
+            if status_store is None or status_store.connection is None:
+                status_store = cls(store_directory_path)
+                cls._shared_stores[key] = status_store
+
+        return status_store
 
     def add_studied_document(
         self, id: str, source: str, page_content: str, metadata: Dict[str, Any]
     ):
         metadata_json = json.dumps(metadata, indent=4)
+        self._invalidate_cached_document(id)
 
         self.execute(
             "INSERT INTO studied_documents (id, source, page_content, metadata) VALUES (?, ?, ?, ?)",
@@ -64,8 +166,311 @@ class StatusStore:
             ),
         )
 
+    def add_studied_document_part(self, document_id: str, part: int, page_content: str):
+        """
+        Save a part (page) of a document loaded in parts. The page_content of the document is
+        saved as NULL and is composed from its parts when it is read
+        """
+        self._invalidate_cached_document(document_id)
+        self.execute(
+            "INSERT OR REPLACE INTO studied_document_parts (document_id, part, page_content) VALUES (?, ?, ?)",
+            (
+                document_id,
+                part,
+                page_content,
+            ),
+        )
+
     def delete_studied_document(self, id: str):
+        self._invalidate_cached_document(id)
         self.execute("DELETE FROM studied_documents WHERE id = ?", (id,))
+        self.execute("DELETE FROM studied_document_parts WHERE document_id = ?", (id,))
+        self.delete_lexical_chunks_by_source(id)
+
+    def rename_studied_document(self, id: str, new_id: str, new_source: str):
+        self._invalidate_cached_document(id)
+        self._invalidate_cached_document(new_id)
+        cursor = self.query(
+            "SELECT metadata FROM studied_documents WHERE id = ?",
+            (id,),
+        )
+        row = cursor.fetchone()
+        if not row:
+            return
+
+        metadata = json.loads(row[0])
+        metadata["source"] = new_source
+        metadata_json = json.dumps(metadata, indent=4)
+
+        self.execute(
+            "UPDATE studied_documents SET id = ?, source = ?, metadata = ? WHERE id = ?",
+            (
+                new_id,
+                new_source,
+                metadata_json,
+                id,
+            ),
+        )
+        self.execute(
+            "UPDATE studied_document_parts SET document_id = ? WHERE document_id = ?",
+            (
+                new_id,
+                id,
+            ),
+        )
+        self.execute(
+            "UPDATE lexical_chunks SET source = ? WHERE source = ?",
+            (
+                new_source,
+                id,
+            ),
+        )
+
+    def set_source_file(self, source: str, size: int, mtime_ns: int, content_hash: str):
+        self.execute(
+            "INSERT OR REPLACE INTO source_files (source, size, mtime_ns, content_hash, updated_at) VALUES (?, ?, ?, ?, ?)",
+            (
+                source,
+                size,
+                mtime_ns,
+                content_hash,
+                datetime.now(timezone.utc).isoformat(),
+            ),
+        )
+
+    def delete_source_file(self, source: str):
+        self.execute("DELETE FROM source_files WHERE source = ?", (source,))
+
+    def get_source_files(self) -> Dict[str, Dict[str, Any]]:
+        cursor = self.query(
+            "SELECT source, size, mtime_ns, content_hash FROM source_files"
+        )
+
+        return {
+            row[0]: {
+                "source": row[0],
+                "size": row[1],
+                "mtime_ns": row[2],
+                "content_hash": row[3],
+            }
+            for row in cursor.fetchall()
+        }
+
+    def set_failed_file(
+        self,
+        source: str,
+        content_hash: str,
+        error: str,
+        size: int | None = None,
+        mtime_ns: int | None = None,
+    ):
+        self.execute(
+            "INSERT OR REPLACE INTO failed_files (source, size, mtime_ns, content_hash, error, failed_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                source,
+                size,
+                mtime_ns,
+                content_hash,
+                error,
+                datetime.now(timezone.utc).isoformat(),
+            ),
+        )
+
+    def delete_failed_file(self, source: str):
+        self.execute("DELETE FROM failed_files WHERE source = ?", (source,))
+
+    def delete_failed_files(self):
+        self.execute("DELETE FROM failed_files")
+
+    def get_failed_files(self) -> Dict[str, Dict[str, Any]]:
+        cursor = self.query(
+            "SELECT source, size, mtime_ns, content_hash, error, failed_at FROM failed_files"
+        )
+
+        return {
+            row[0]: {
+                "source": row[0],
+                "size": row[1],
+                "mtime_ns": row[2],
+                "content_hash": row[3],
+                "error": row[4],
+                "failed_at": row[5],
+            }
+            for row in cursor.fetchall()
+        }
+
+    def start_study_run(self, total_files: int) -> int:
+        now = datetime.now(timezone.utc).isoformat()
+        cursor = self.execute(
+            "INSERT INTO study_runs (total_files, studied_files, failed_files, batches, started_at, updated_at) VALUES (?, 0, 0, 0, ?, ?)",
+            (
+                total_files,
+                now,
+                now,
+            ),
+        )
+        return cursor.lastrowid
+
+    def resume_study_run(self, id: int, pending_files: int):
+        """
+        Set the total of an interrupted run to the files already done plus the pending ones
+        """
+        self.execute(
+            "UPDATE study_runs SET total_files = studied_files + failed_files + ?, updated_at = ? WHERE id = ?",
+            (
+                pending_files,
+                datetime.now(timezone.utc).isoformat(),
+                id,
+            ),
+        )
+
+    def checkpoint_study_run(self, id: int, studied_files: int, failed_files: int):
+        """
+        Add the files of a finished batch to the progress of the run
+        """
+        self.execute(
+            "UPDATE study_runs SET studied_files = studied_files + ?, failed_files = failed_files + ?, batches = batches + 1, updated_at = ? WHERE id = ?",
+            (
+                studied_files,
+                failed_files,
+                datetime.now(timezone.utc).isoformat(),
+                id,
+            ),
+        )
+
+    def finish_study_run(self, id: int):
+        now = datetime.now(timezone.utc).isoformat()
+        self.execute(
+            "UPDATE study_runs SET updated_at = ?, finished_at = ? WHERE id = ?",
+            (
+                now,
+                now,
+                id,
+            ),
+        )
+
+    def get_last_study_run(self, unfinished: bool = False) -> Dict[str, Any] | None:
+        cursor = self.query(
+            "SELECT id, total_files, studied_files, failed_files, batches, started_at, updated_at, finished_at FROM study_runs"
+            + (" WHERE finished_at IS NULL" if unfinished else "")
+            + " ORDER BY id DESC LIMIT 1"
+        )
+
+        row = cursor.fetchone()
+        if not row:
+            return None
+
+        return {
+            "id": row[0],
+            "total_files": row[1],
+            "studied_files": row[2],
+            "failed_files": row[3],
+            "batches": row[4],
+            "started_at": row[5],
+            "updated_at": row[6],
+            "finished_at": row[7],
+        }
+
+    def create_lexical_index(self):
+        try:
+            self.execute(_LEXICAL_INDEX_STATEMENT)
+            self.has_lexical_index = True
+        except sqlite3.OperationalError as e:
+            logging.debug(f"Lexical index disabled, SQLite without FTS5: {str(e)}")
+            self.has_lexical_index = False
+
+    def add_lexical_chunks(self, chunks: List[Tuple[str, str, str]]):
+        """
+        Index the text of the chunks for the lexical search, in a single transaction. Each
+        chunk is a tuple (chunk id in the vector store, source, page_content)
+        """
+        if not self.has_lexical_index or len(chunks) == 0:
+            return
+
+        self.validate_connection()
+        try:
+            self.connection.execute("BEGIN")
+            for chunk_id, source, page_content in chunks:
+                # A chunk indexed again replaces its previous text
+                self.connection.execute(
+                    "DELETE FROM lexical_chunks_fts WHERE rowid IN (SELECT id FROM lexical_chunks WHERE chunk_id = ?)",
+                    (chunk_id,),
+                )
+                cursor = self.connection.execute(
+                    "INSERT OR REPLACE INTO lexical_chunks (chunk_id, source) VALUES (?, ?)",
+                    (chunk_id, source),
+                )
+                self.connection.execute(
+                    "INSERT INTO lexical_chunks_fts (rowid, page_content) VALUES (?, ?)",
+                    (cursor.lastrowid, page_content),
+                )
+            self.connection.execute("COMMIT")
+        except Exception:
+            self.connection.execute("ROLLBACK")
+            raise
+
+    def delete_lexical_chunks(self, chunk_ids: List[str]):
+        if not self.has_lexical_index:
+            return
+
+        for i in range(0, len(chunk_ids), _MAX_QUERY_PARAMS):
+            ids_batch = chunk_ids[i : i + _MAX_QUERY_PARAMS]
+            placeholders = ", ".join("?" * len(ids_batch))
+            self.execute(
+                "DELETE FROM lexical_chunks_fts WHERE rowid IN (SELECT id FROM lexical_chunks WHERE chunk_id IN ("
+                + placeholders
+                + "))",
+                ids_batch,
+            )
+            self.execute(
+                "DELETE FROM lexical_chunks WHERE chunk_id IN (" + placeholders + ")",
+                ids_batch,
+            )
+
+    def delete_lexical_chunks_by_source(self, source: str):
+        if not self.has_lexical_index:
+            return
+
+        self.execute(
+            "DELETE FROM lexical_chunks_fts WHERE rowid IN (SELECT id FROM lexical_chunks WHERE source = ?)",
+            (source,),
+        )
+        self.execute("DELETE FROM lexical_chunks WHERE source = ?", (source,))
+
+    def delete_all_lexical_chunks(self):
+        if not self.has_lexical_index:
+            return
+
+        self.execute("DELETE FROM lexical_chunks_fts")
+        self.execute("DELETE FROM lexical_chunks")
+
+    def count_lexical_chunks(self) -> int:
+        if not self.has_lexical_index:
+            return 0
+
+        return self.query("SELECT COUNT(*) FROM lexical_chunks").fetchone()[0]
+
+    def search_lexical_chunks(
+        self, match_query: str, k: int = 4, source: Optional[str] = None
+    ) -> List[Tuple[str, float]]:
+        """
+        The k chunks best ranked by BM25 for an FTS5 match query, optionally of a single
+        source. Returns tuples (chunk id, score), higher scores are more relevant
+        """
+        if not self.has_lexical_index or not match_query:
+            return []
+
+        cursor = self.query(
+            "SELECT lexical_chunks.chunk_id, bm25(lexical_chunks_fts) AS rank \
+            FROM lexical_chunks_fts JOIN lexical_chunks ON lexical_chunks.id = lexical_chunks_fts.rowid \
+            WHERE lexical_chunks_fts MATCH ?"
+            + (" AND lexical_chunks.source = ?" if source is not None else "")
+            + " ORDER BY rank LIMIT ?",
+            [match_query] + ([source] if source is not None else []) + [k],
+        )
+
+        # bm25() is negative, lower is more relevant
+        return [(row[0], -row[1]) for row in cursor.fetchall()]
 
     def iget_studied_document_ids(self) -> Iterable[List[str]]:
         cursor = self.query("SELECT id FROM studied_documents")
@@ -78,23 +483,57 @@ class StatusStore:
     def get_studied_document_ids(self) -> set[str]:
         return set(self.iget_studied_document_ids())
 
-    def iget_studied_documents(self) -> Iterable[List[Dict[str, Any]]]:
-        cursor = self.query(
-            "SELECT id, source, page_content, metadata FROM studied_documents"
-        )
+    def iget_studied_documents(
+        self, ids: Optional[List[str]] = None
+    ) -> Iterable[List[Dict[str, Any]]]:
+        """
+        Iterate the studied documents, or the ones with the given ids (the missing ids are
+        skipped) with one query per _MAX_QUERY_PARAMS ids
+        """
+        if ids is None:
+            cursor = self.query(
+                "SELECT id, source, page_content, metadata FROM studied_documents"
+            )
+            rows = cursor.fetchall()
+        else:
+            rows = []
+            for i in range(0, len(ids), _MAX_QUERY_PARAMS):
+                ids_batch = ids[i : i + _MAX_QUERY_PARAMS]
+                cursor = self.query(
+                    "SELECT id, source, page_content, metadata FROM studied_documents WHERE id IN ("
+                    + ", ".join("?" * len(ids_batch))
+                    + ")",
+                    ids_batch,
+                )
+                rows.extend(cursor.fetchall())
 
-        rows = cursor.fetchall()
+        # Compose the documents loaded in parts with a single query
+        parts_contents = {}
+        if ids is not None:
+            parts_contents = self._get_parts_contents(
+                [row[0] for row in rows if row[2] is None]
+            )
 
         for row in rows:
+            page_content = row[2]
+            if page_content is None:
+                page_content = (
+                    parts_contents.get(row[0], "")
+                    if ids is not None
+                    else self._get_parts_content(row[0])
+                )
+
             yield {
                 "id": row[0],
                 "source": row[1],
-                "page_content": row[2],
+                "page_content": page_content,
                 "metadata": json.loads(row[3]),
             }
 
-    def get_studied_documents(self) -> List[Dict[str, Any]]:
-        return list(self.iget_studied_documents())
+    def get_studied_documents(
+        self, ids: Optional[List[str]] = None
+    ) -> List[Dict[str, Any]]:
+        return list(self.iget_studied_documents(ids))
 
     def get_studied_document(self, id: str) -> Dict[str, Any]:
         cursor = self.query(
@@ -107,21 +546,68 @@ class StatusStore:
         return {
             "id": row[0],
             "source": row[1],
-            "page_content": row[2],
+            "page_content": (
+                row[2] if row[2] is not None else self._get_parts_content(row[0])
+            ),
             "metadata": json.loads(row[3]),
         }
 
-    def migrate_up(self):
-        self.execute(
-            "CREATE TABLE IF NOT EXISTS studied_documents (\
-                id TEXT PRIMARY KEY, \
-                source TEXT, \
-                page_content TEXT, \
-                metadata TEXT, \
-                created_at TEXT, \
-                updated_at TEXT)"
+    def _get_parts_content(self, document_id: str) -> str:
+        cursor = self.query(
+            "SELECT page_content FROM studied_document_parts WHERE document_id = ? ORDER BY part",
+            (document_id,),
         )
 
+        return "\n\n".join(row[0] or "" for row in cursor.fetchall())
+
+    def _invalidate_cached_document(self, id: str):
+        StudiedDocumentCache.instance().invalidate(str(self.database_path), id)
+
+    def _get_parts_contents(self, document_ids: List[str]) -> Dict[str, str]:
+        parts: Dict[str, List[str]] = {}
+        for i in range(0, len(document_ids), _MAX_QUERY_PARAMS):
+            ids_batch = document_ids[i : i + _MAX_QUERY_PARAMS]
+            cursor = self.query(
+                "SELECT document_id, page_content FROM studied_document_parts WHERE document_id IN ("
+                + ", ".join("?" * len(ids_batch))
+                + ") ORDER BY document_id, part",
+                ids_batch,
+            )
+            for row in cursor.fetchall():
+                parts.setdefault(row[0], []).append(row[1] or "")
+
+        return {
+            document_id: "\n\n".join(page_contents)
+            for document_id, page_contents in parts.items()
+        }
+
+    def migrate_up(self):
+        """
+        Apply the pending migrations in a single write transaction. Connections opening the
+        database at the same time (threads, load workers, model server) wait for the lock and
+        read user_version again, so each migration runs once
+        """
+        user_version = self.query("PRAGMA user_version").fetchone()[0]
+        if user_version >= len(_MIGRATIONS):
+            return
+
+        try:
+            self.connection.execute("BEGIN IMMEDIATE")
+            user_version = self.connection.execute("PRAGMA user_version").fetchone()[0]
+            for migration_index in range(user_version, len(_MIGRATIONS)):
+                for statement in _MIGRATIONS[migration_index]:
+                    if callable(statement):
+                        statement(self.connection)
+                    else:
+                        self.connection.execute(statement)
+
+                self.connection.execute(f"PRAGMA user_version = {migration_index + 1}")
+            self.connection.execute("COMMIT")
+        except Exception:
+            if self.connection.in_transaction:
+                self.connection.execute("ROLLBACK")
+            raise
+
     def get_pragma_compile_options(self):
         cursor = self.query("SELECT * FROM pragma_compile_options")
         rows = cursor.fetchall()
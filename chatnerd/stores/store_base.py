@@ -1,11 +1,20 @@
 # Resources:
 # https://github.com/pprados/langchain-rag/blob/master/docs/integrations/vectorstores/rag_vectorstore.ipynb
 
-from typing import List, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 from langchain_core.documents import Document
 from langchain_core.vectorstores import VectorStore
 
 DEFAULT_CHUNKS_COLLECTION_NAME = "chatnerd_chunks"
+CHUNK_ID_KEY = "chunk_id"  # Metadata key of the id of a chunk in the store
+RETRIEVAL_SCORE_KEY = "retrieval_score"  # Metadata key of the relevance of a chunk
+CHUNK_INDEX_KEY = (
+    "chunk_index"  # Metadata key of the position of a chunk in its document
+)
+PREV_CHUNK_ID_KEY = "prev_chunk_id"  # Metadata key of the id of the previous chunk
+NEXT_CHUNK_ID_KEY = "next_chunk_id"  # Metadata key of the id of the next chunk
+MAX_SEARCH_WORKERS = 8  # Concurrent searches in stores without batch search
 
 
 class StoreBase:
@@ -15,6 +24,30 @@ class StoreBase:
     def close(self):
         pass
 
+    def add_documents_with_embeddings(
+        self,
+        documents: List[Document],
+        embeddings: List[List[float]],
+        ids: Optional[List[str]] = None,
+        **add_metadatas,
+    ) -> List[str]:
+        raise NotImplementedError(
+            f"Method 'add_documents_with_embeddings' not implemented for {self.__class__.__name__}"
+        )
+
+    def delete_by_source(self, source: str):
+        raise NotImplementedError(
+            f"Method 'delete_by_source' not implemented for {self.__class__.__name__}"
+        )
+
+    def update_source(self, source: str, new_source: str):
+        """
+        Change the source of the chunks keeping their embeddings
+        """
+        raise NotImplementedError(
+            f"Method 'update_source' not implemented for {self.__class__.__name__}"
+        )
+
     def find_similar_docs(
         self, query: str, k: int = 4, with_score: bool = False
     ) -> List[Document] | List[Tuple[Document, float]]:
@@ -26,6 +59,52 @@ class StoreBase:
         else:
             return self.similarity_search(query, k)
 
+    def get_chunks_by_ids(self, ids: List[str]) -> List[Document]:
+        """
+        Returns the chunks with the given ids (the ids not found are skipped) in a single call
+        """
+        raise NotImplementedError(
+            f"Method 'get_chunks_by_ids' not implemented for {self.__class__.__name__}"
+        )
+
+    def iget_chunks(self, batch_size: int = 1000) -> Iterable[List[Document]]:
+        """
+        Iterate all the chunks of the store (with their ids) in batches
+        """
+        raise NotImplementedError(
+            f"Method 'iget_chunks' not implemented for {self.__class__.__name__}"
+        )
+
+    def similarity_search_by_vectors(
+        self,
+        embeddings: List[List[float]],
+        k: int = 4,
+        filter: Optional[Dict[str, Any]] = None,
+        **kwargs: Any,
+    ) -> List[List[Document]]:
+        """
+        Returns the k most similar chunks of each query vector, with their id in
+        metadata[CHUNK_ID_KEY] and their relevance score in metadata[RETRIEVAL_SCORE_KEY] when
+        the store gives them (higher is more relevant). Stores
+        without a batch search run one search per vector, in threads when the store is
+        thread-safe
+        """
+        if not isinstance(self, VectorStore):
+            raise ValueError("StoreBase should only be used by VectorStore instances")
+
+        def search(embedding: List[float]) -> List[Document]:
+            return self.similarity_search_by_vector(
+                embedding, k=k, filter=filter, **kwargs
+            )
+
+        if len(embeddings) <= 1 or not self.is_thread_safe():
+            return [search(embedding) for embedding in embeddings]
+
+        with ThreadPoolExecutor(
+            max_workers=min(len(embeddings), MAX_SEARCH_WORKERS)
+        ) as executor:
+            return list(executor.map(search, embeddings))
+
     @classmethod
     def does_vectorstore_exist(cls) -> bool:
         return True
@@ -2,8 +2,17 @@ from pathlib import Path
 from typing import Any, Dict, Optional, Tuple
 from langchain_core.embeddings import Embeddings
 from chatnerd.stores.status_store import StatusStore
+from chatnerd.stores.embedding_cache_store import (
+    EmbeddingCacheStore,
+    DEFAULT_MAX_SIZE_MB as DEFAULT_CACHE_MAX_SIZE_MB,
+)
+from chatnerd.stores.parsed_document_cache_store import (
+    ParsedDocumentCacheStore,
+    DEFAULT_MAX_SIZE_MB as DEFAULT_PARSED_CACHE_MAX_SIZE_MB,
+)
 from chatnerd.stores.chroma_store import ChromaStore
 from chatnerd.stores.qdrant_store import QdrantStore
+from chatnerd.stores.numpy_store import NumpyStore
 from chatnerd.config import Config
 
 DEFAULT_STORE_DIRECTORY = ".nerd_store"
@@ -25,7 +34,7 @@ class StoreFactory:
         self,
         embeddings: Optional[Embeddings] = None,
         collection_name: str = DEFAULT_CHUNKS_COLLECTION_NAME,
-    ) -> ChromaStore | QdrantStore:
+    ) -> ChromaStore | QdrantStore | NumpyStore:
         if self.selected_store == "chroma":
             return self.get_chroma_store(
                 self.selected_store_config, embeddings, collection_name
@@ -34,14 +43,22 @@ class StoreFactory:
             return self.get_qdrant_store(
                 self.selected_store_config, embeddings, collection_name
             )
+        elif self.selected_store == "numpy":
+            return self.get_numpy_store(
+                self.selected_store_config, embeddings, collection_name
+            )
         else:
             raise ValueError(f"Unknown store '{self.selected_store}' in config file")
 
-    def get_vector_store_class(self) -> ChromaStore.__class__ | QdrantStore.__class__:
+    def get_vector_store_class(
+        self,
+    ) -> ChromaStore.__class__ | QdrantStore.__class__ | NumpyStore.__class__:
         if self.selected_store == "chroma":
             return ChromaStore
         elif self.selected_store == "qdrant":
             return QdrantStore
+        elif self.selected_store == "numpy":
+            return NumpyStore
         else:
             raise ValueError(f"Unknown store '{self.selected_store}' in config file")
 
@@ -51,6 +68,38 @@ class StoreFactory:
         )
         return StatusStore(store_directory_path, **kwargs)
 
+    def get_shared_status_store(self) -> StatusStore:
+        """
+        Status store kept open for the process. Don't close it
+        """
+        store_directory_path = str(
+            Path(self.config["_project_base_path"], Config._PROJECT_STORE_DIRECTORYNAME)
+        )
+        return StatusStore.shared(store_directory_path)
+
+    def get_embedding_cache_store(self, **kwargs: Any) -> EmbeddingCacheStore:
+        store_directory_path = str(
+            Path(self.config["_project_base_path"], Config._PROJECT_STORE_DIRECTORYNAME)
+        )
+        cache_config = self.config.get("embeddings", {}).get("cache", None) or {}
+        return EmbeddingCacheStore(
+            store_directory_path,
+            max_size_mb=cache_config.get("max_size_mb", DEFAULT_CACHE_MAX_SIZE_MB),
+            **kwargs,
+        )
+
+    def get_parsed_document_cache_store(self) -> ParsedDocumentCacheStore:
+        store_directory_path = str(
+            Path(self.config["_project_base_path"], Config._PROJECT_STORE_DIRECTORYNAME)
+        )
+        cache_config = self.config.get("loader", {}).get("cache", None) or {}
+        return ParsedDocumentCacheStore(
+            store_directory_path,
+            max_size_mb=cache_config.get(
+                "max_size_mb", DEFAULT_PARSED_CACHE_MAX_SIZE_MB
+            ),
+        )
+
     def get_chroma_store(
         self,
         chroma_config: Dict[str, Any],
@@ -87,6 +136,24 @@ class StoreFactory:
             embeddings=embeddings,
         )
 
+    def get_numpy_store(
+        self,
+        numpy_config: Dict[str, Any],
+        embeddings: Embeddings,
+        collection_name: str = DEFAULT_CHUNKS_COLLECTION_NAME,
+    ) -> NumpyStore:
+        path = str(
+            Path(self.config["_project_base_path"], DEFAULT_STORE_DIRECTORY, "numpy")
+        )
+        return NumpyStore(
+            config={
+                **numpy_config,
+                "path": path,
+            },
+            collection_name=collection_name,
+            embeddings=embeddings,
+        )
+
     def get_selected_store_and_config(self) -> Tuple[str, Dict[str, Any]]:
         selected_store = self.config.get("vector_store", None)
 
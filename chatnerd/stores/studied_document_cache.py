@@ -0,0 +1,100 @@
+import sys
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, ClassVar, Dict, List, Tuple
+
+DEFAULT_MAX_SIZE_MB = 64  # Maximum size of the cached documents (in MB)
+
+
+class StudiedDocumentCache:
+    """
+    Process-wide LRU cache of the decoded studied documents (page_content and metadata), keyed
+    by (status database path, document id). The least recently used documents are evicted when
+    the estimated size of the cached documents exceeds max_size_mb (0: no cache). The
+    StatusStore invalidates the documents it changes
+    """
+
+    _instance: ClassVar = None
+
+    def __init__(self, max_size_mb: float = DEFAULT_MAX_SIZE_MB):
+        self._documents: OrderedDict[Tuple[str, str], Tuple[Dict[str, Any], int]] = (
+            OrderedDict()
+        )
+        self._size_bytes = 0
+        self._lock = threading.Lock()
+        self.max_size_bytes = 0
+        self.set_max_size_mb(max_size_mb)
+
+    @classmethod
+    def instance(cls) -> "StudiedDocumentCache":
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def set_max_size_mb(self, max_size_mb: float):
+        with self._lock:
+            self.max_size_bytes = int(float(max_size_mb or 0) * 1024**2)
+            self._evict()
+
+    def get_studied_documents(
+        self, status_store: Any, ids: List[str]
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        The studied documents with the given ids, by id. The documents not cached are read with
+        a single status_store.get_studied_documents(ids) call. Missing ids are skipped
+        """
+        database_path = str(status_store.database_path)
+        studied_documents = {}
+        with self._lock:
+            for id in ids:
+                entry = self._documents.get((database_path, id), None)
+                if entry is not None:
+                    self._documents.move_to_end((database_path, id))
+                    studied_documents[id] = entry[0]
+
+        missing_ids = [id for id in dict.fromkeys(ids) if id not in studied_documents]
+        if len(missing_ids) == 0:
+            return studied_documents
+
+        for studied_document in status_store.get_studied_documents(missing_ids):
+            studied_documents[studied_document["id"]] = studied_document
+            self._add(database_path, studied_document)
+
+        return studied_documents
+
+    def invalidate(self, database_path: str, id: str):
+        with self._lock:
+            entry = self._documents.pop((str(database_path), id), None)
+            if entry is not None:
+                self._size_bytes -= entry[1]
+
+    def clear(self):
+        with self._lock:
+            self._documents.clear()
+            self._size_bytes = 0
+
+    def _add(self, database_path: str, studied_document: Dict[str, Any]):
+        # Estimated memory of the decoded document
+        size_bytes = sys.getsizeof(studied_document["page_content"] or "") + len(
+            json.dumps(studied_document["metadata"], default=str)
+        )
+
+        with self._lock:
+            if size_bytes > self.max_size_bytes:
+                return
+
+            key = (database_path, studied_document["id"])
+            entry = self._documents.pop(key, None)
+            if entry is not None:
+                self._size_bytes -= entry[1]
+
+            self._documents[key] = (studied_document, size_bytes)
+            self._size_bytes += size_bytes
+            self._evict()
+
+    def _evict(self):
+        # Call with lock
+        while self._size_bytes > self.max_size_bytes and len(self._documents) > 0:
+            _, (_, size_bytes) = self._documents.popitem(last=False)
+            self._size_bytes -= size_bytes
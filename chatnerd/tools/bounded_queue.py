@@ -0,0 +1,90 @@
+import threading
+from collections import deque
+from typing import Any, Callable, Optional
+
+
+class QueueClosed(Exception):
+    pass
+
+
+class BoundedQueue:
+    """
+    Thread safe FIFO queue bounded by number of items and by an estimated size in bytes.
+    Producers block in put() while the queue is full (backpressure). An item larger than
+    max_bytes is still accepted when the queue is empty, so the pipeline never deadlocks.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 0,
+        max_bytes: int = 0,
+        sizeof: Optional[Callable[[Any], int]] = None,
+    ):
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof or (lambda item: 0)
+
+        self._items = deque()
+        self._bytes = 0
+        self._closed = False
+        self._condition = threading.Condition()
+
+    def put(self, item: Any):
+        item_bytes = self.sizeof(item)
+        with self._condition:
+            while not self._closed and self._is_full(item_bytes):
+                self._condition.wait()
+
+            if self._closed:
+                raise QueueClosed()
+
+            self._items.append((item, item_bytes))
+            self._bytes += item_bytes
+            self._condition.notify_all()
+
+    def get(self) -> Any:
+        with self._condition:
+            while not self._closed and len(self._items) == 0:
+                self._condition.wait()
+
+            if len(self._items) == 0:
+                raise QueueClosed()
+
+            item, item_bytes = self._items.popleft()
+            self._bytes -= item_bytes
+            self._condition.notify_all()
+            return item
+
+    def close(self):
+        """
+        Stop accepting items. Consumers get the remaining items and then QueueClosed
+        """
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+    def abort(self):
+        """
+        Close the queue and drop the remaining items
+        """
+        with self._condition:
+            self._closed = True
+            self._items.clear()
+            self._bytes = 0
+            self._condition.notify_all()
+
+    @property
+    def bytes(self) -> int:
+        return self._bytes
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def _is_full(self, item_bytes: int) -> bool:
+        if len(self._items) == 0:
+            return False
+        if self.maxsize > 0 and len(self._items) >= self.maxsize:
+            return True
+        if self.max_bytes > 0 and self._bytes + item_bytes > self.max_bytes:
+            return True
+        return False
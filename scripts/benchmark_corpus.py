@@ -0,0 +1,55 @@
+"""
+Corpus of the benchmark scripts: synthetic chunks, or the chunks of the text files of a
+directory
+"""
+
+import random
+from pathlib import Path
+from typing import List
+
+WORDS_PER_CHUNK = 150
+
+
+def generate_chunks(
+    num_chunks: int, seed: int = 0, product_codes: bool = False
+) -> List[str]:
+    """
+    Synthetic chunks about different topics, so that the nearest chunks are meaningful.
+    With product_codes, each chunk mentions a unique product code
+    """
+    rng = random.Random(seed)
+    common = "the of and to in is was that for it as with be on by at this from".split()
+    topics = [
+        "".join(rng.choices("abcdefghijklmnopqrstuvwxyz", k=rng.randint(4, 10)))
+        for _ in range(2_000)
+    ]
+
+    chunks = []
+    for i in range(num_chunks):
+        chunk_topics = rng.sample(topics, k=12)
+        words = [
+            rng.choice(chunk_topics) if rng.random() < 0.5 else rng.choice(common)
+            for _ in range(WORDS_PER_CHUNK)
+        ]
+        if product_codes:
+            code = "".join(rng.choices("ABCDEFGHIJKLMNOPQRSTUVWXYZ", k=2)) + f"-{i:05d}"
+            words.insert(rng.randint(0, len(words)), code)
+        sentences = [
+            " ".join(words[j : j + 15]).capitalize() + "."
+            for j in range(0, len(words), 15)
+        ]
+        chunks.append(" ".join(sentences))
+
+    return chunks
+
+
+def read_chunks(path: str, num_chunks: int) -> List[str]:
+    chunks = []
+    for file_path in sorted(Path(path).rglob("*.txt")):
+        words = file_path.read_text(encoding="utf-8", errors="replace").split()
+        for i in range(0, len(words), WORDS_PER_CHUNK):
+            chunks.append(" ".join(words[i : i + WORDS_PER_CHUNK]))
+            if len(chunks) >= num_chunks:
+                return chunks
+
+    return chunks
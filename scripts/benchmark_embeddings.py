@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+"""
+Benchmark the embedding providers: sentence-transformers on torch (provider "huggingface")
+vs. the model exported to ONNX and run on onnxruntime (provider "onnx"), with and without
+int8 quantization. Prints the throughput (chunks per second) and the retrieval quality of
+each provider: recall@k of the top k chunks against the torch vectors, and the rate of
+queries (a sentence of a chunk) whose chunk is the first result.
+
+Usage: python scripts/benchmark_embeddings.py [--model hkunlp/instructor-large]
+       [--num-chunks 2000] [--path corpus_dir] [--quantize avx2]
+"""
+
+import sys
+import time
+import random
+import argparse
+import tempfile
+from pathlib import Path
+from typing import List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import numpy as np  # noqa: E402
+from chatnerd.langchain.llm_factory import LLMFactory  # noqa: E402
+from benchmark_corpus import generate_chunks, read_chunks  # noqa: E402
+
+
+def get_queries(chunks: List[str], num_queries: int, seed: int = 0) -> List[int]:
+    rng = random.Random(seed)
+    return rng.sample(range(len(chunks)), k=min(num_queries, len(chunks)))
+
+
+def top_k(query_vectors: np.ndarray, chunk_vectors: np.ndarray, k: int) -> np.ndarray:
+    query_vectors = query_vectors / np.linalg.norm(query_vectors, axis=1)[:, None]
+    chunk_vectors = chunk_vectors / np.linalg.norm(chunk_vectors, axis=1)[:, None]
+    scores = query_vectors @ chunk_vectors.T
+    return np.argsort(-scores, axis=1)[:, :k]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--model", type=str, default="hkunlp/instructor-large")
+    parser.add_argument("--num-chunks", type=int, default=2_000)
+    parser.add_argument("--num-queries", type=int, default=200)
+    parser.add_argument("--path", type=str, default=None)
+    parser.add_argument("--quantize", type=str, default="avx2")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--export-directory", type=str, default=None)
+    args = parser.parse_args()
+
+    if args.path:
+        chunks = read_chunks(args.path, args.num_chunks)
+    else:
+        chunks = generate_chunks(args.num_chunks)
+    query_indexes = get_queries(chunks, args.num_queries)
+    # A query is the second sentence of a chunk (or its middle words)
+    queries = []
+    for i in query_indexes:
+        sentences = chunks[i].split(". ")
+        words = chunks[i].split()
+        queries.append(
+            sentences[1]
+            if len(sentences) > 2
+            else " ".join(words[len(words) // 3 : len(words) // 2])
+        )
+    print(f"Corpus: {len(chunks)} chunks, {len(queries)} queries")
+    print(f"Model: {args.model}")
+
+    export_directory = args.export_directory or tempfile.mkdtemp()
+    providers = {
+        "torch": {"provider": "huggingface"},
+        "onnx": {"provider": "onnx", "onnx": {"export_directory": export_directory}},
+        f"onnx int8 ({args.quantize})": {
+            "provider": "onnx",
+            "onnx": {"export_directory": export_directory, "quantize": args.quantize},
+        },
+    }
+
+    print(
+        f"{'Provider':<24} {'Load (s)':>9} {'Chunks/s':>9} "
+        f"{f'Recall@{args.k}':>10} {'Top-1 hit':>10}"
+    )
+    reference_top_k = None
+    for name, provider_config in providers.items():
+        config = {
+            "_project_base_path": export_directory,
+            "embeddings": {
+                "model_name": args.model,
+                "encode_kwargs": {"batch_size": args.batch_size},
+                **provider_config,
+            },
+        }
+
+        start = time.perf_counter()
+        embeddings = LLMFactory(config).get_embedding_function()
+        load_time = time.perf_counter() - start
+
+        embeddings.embed_documents(chunks[: args.batch_size])  # Warm up
+        start = time.perf_counter()
+        chunk_vectors = np.asarray(embeddings.embed_documents(chunks))
+        elapsed = time.perf_counter() - start
+        query_vectors = np.asarray(embeddings.embed_documents(queries))
+
+        results = top_k(query_vectors, chunk_vectors, args.k)
+        if reference_top_k is None:
+            reference_top_k = results
+        recall = np.mean(
+            [
+                len(set(result) & set(reference)) / args.k
+                for result, reference in zip(results, reference_top_k)
+            ]
+        )
+        top_1_hit = np.mean(
+            [result[0] == i for result, i in zip(results, query_indexes)]
+        )
+
+        print(
+            f"{name:<24} {load_time:>9.1f} {len(chunks) / elapsed:>9.1f} "
+            f"{recall:>10.1%} {top_1_hit:>10.1%}"
+        )
+
+
+if __name__ == "__main__":
+    main()
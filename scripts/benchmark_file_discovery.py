@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+"""
+Benchmark the discovery of source files: one recursive glob per extension (previous
+implementation of DocumentLoader.load_documents) vs. the single-pass os.scandir walker.
+
+Usage: python scripts/benchmark_file_discovery.py [--files 200000] [--path /tmp/tree]
+"""
+
+import os
+import sys
+import glob
+import time
+import shutil
+import argparse
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from chatnerd.lib.helpers import iwalk_files  # noqa: E402
+
+EXTENSIONS = [
+    ".csv",
+    ".doc",
+    ".docx",
+    ".enex",
+    ".epub",
+    ".html",
+    ".md",
+    ".odt",
+    ".pdf",
+    ".ppt",
+    ".pptx",
+    ".txt",
+]
+OTHER_EXTENSIONS = [".jpg", ".json", ".py"]  # Files that must be skipped
+
+
+def create_tree(base_path: str, n_files: int, files_per_directory: int = 100):
+    all_extensions = EXTENSIONS + OTHER_EXTENSIONS
+    for i in range(n_files):
+        directory = Path(
+            base_path,
+            f"d{i // (files_per_directory * 10)}",
+            f"d{i // files_per_directory}",
+        )
+        if i % files_per_directory == 0:
+            directory.mkdir(parents=True, exist_ok=True)
+        Path(directory, f"file{i}{all_extensions[i % len(all_extensions)]}").touch()
+
+
+def discover_with_glob(base_path: str) -> list:
+    all_files = []
+    for ext in EXTENSIONS:
+        all_files.extend(
+            glob.glob(os.path.join(base_path, f"**/*{ext}"), recursive=True)
+        )
+    return all_files
+
+
+def discover_with_walker(base_path: str) -> list:
+    return list(iwalk_files(base_path, extensions=EXTENSIONS))
+
+
+def measure(function, base_path: str, repeat: int):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function(base_path)
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--files", type=int, default=200_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--path", type=str, default=None)
+    args = parser.parse_args()
+
+    base_path = args.path or tempfile.mkdtemp(prefix="chatnerd_discovery_")
+    try:
+        if not any(Path(base_path).iterdir()):
+            print(f"Creating {args.files} files in {base_path}...")
+            create_tree(base_path, args.files)
+
+        glob_time, glob_files = measure(discover_with_glob, base_path, args.repeat)
+        walker_time, walker_files = measure(
+            discover_with_walker, base_path, args.repeat
+        )
+
+        assert sorted(glob_files) == sorted(walker_files), "Different files found"
+
+        print(f"Files found:           {len(walker_files)}")
+        print(f"glob per extension:    {glob_time:.3f} s")
+        print(f"single-pass scandir:   {walker_time:.3f} s")
+        print(f"Speedup:               {glob_time / walker_time:.1f}x")
+    finally:
+        if not args.path:
+            shutil.rmtree(base_path, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+#!/usr/bin/env python
+"""
+Benchmark the hybrid retrieval (similarity search fused with the lexical search of the
+status store) against the similarity search alone. Two kinds of queries are asked: semantic
+queries (a sentence of a chunk) and exact-term queries (a question about a term that appears
+in a single chunk, like a product code). Prints the recall@k of each search (rate of queries
+whose chunk is in the top k) and its latency per query.
+
+Usage: python scripts/benchmark_hybrid_retrieval.py [--model hkunlp/instructor-large]
+       [--num-chunks 2000] [--path corpus_dir] [--store chroma] [--k 5]
+"""
+
+import re
+import sys
+import time
+import uuid
+import random
+import argparse
+import tempfile
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from langchain_core.documents import Document  # noqa: E402
+from chatnerd.config import Config  # noqa: E402
+from chatnerd.langchain.llm_factory import LLMFactory  # noqa: E402
+from chatnerd.langchain.hybrid_retrieval import HybridRetriever  # noqa: E402
+from chatnerd.langchain.multi_query_retrieval import retrieve_multi_query  # noqa: E402
+from chatnerd.stores.store_factory import StoreFactory  # noqa: E402
+from benchmark_corpus import generate_chunks, read_chunks  # noqa: E402
+
+ADD_BATCH_SIZE = 1000
+
+
+def get_queries(
+    chunks: List[str], num_queries: int, seed: int = 0
+) -> Dict[str, Dict[int, str]]:
+    """
+    Semantic and exact-term queries, by index of their chunk. The term of an exact-term query
+    appears in no other chunk (codes with digits first)
+    """
+    rng = random.Random(seed)
+    chunk_terms = [
+        set(re.findall(r"\w+(?:[-./:]\w+)*", chunk.lower())) for chunk in chunks
+    ]
+    document_frequency = Counter(term for terms in chunk_terms for term in terms)
+
+    queries = {"semantic": {}, "exact term": {}}
+    for i in rng.sample(range(len(chunks)), k=min(num_queries, len(chunks))):
+        sentences = chunks[i].split(". ")
+        words = chunks[i].split()
+        queries["semantic"][i] = (
+            sentences[1]
+            if len(sentences) > 2
+            else " ".join(words[len(words) // 3 : len(words) // 2])
+        )
+
+        unique_terms = sorted(
+            (
+                term
+                for term in chunk_terms[i]
+                if document_frequency[term] == 1 and len(term) >= 5
+            ),
+            key=lambda term: (not any(c.isdigit() for c in term), term),
+        )
+        if len(unique_terms) > 0:
+            queries["exact term"][i] = f"Which document mentions {unique_terms[0]}?"
+
+    return queries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--model", type=str, default="hkunlp/instructor-large")
+    parser.add_argument("--num-chunks", type=int, default=2_000)
+    parser.add_argument("--num-queries", type=int, default=200)
+    parser.add_argument("--path", type=str, default=None)
+    parser.add_argument("--store", type=str, default="chroma")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--lexical-k", type=int, default=None)
+    args = parser.parse_args()
+
+    if args.path:
+        chunks = read_chunks(args.path, args.num_chunks)
+    else:
+        chunks = generate_chunks(args.num_chunks, product_codes=True)
+    queries = get_queries(chunks, args.num_queries)
+    print(
+        f"Corpus: {len(chunks)} chunks, "
+        + ", ".join(f"{len(q)} {name} queries" for name, q in queries.items())
+    )
+    print(f"Model: {args.model}, store: {args.store}")
+
+    project_directory = tempfile.mkdtemp()
+    Path(project_directory, Config._PROJECT_STORE_DIRECTORYNAME).mkdir()
+    config = {
+        "_project_base_path": project_directory,
+        "vector_store": args.store,
+        "chroma": {"is_persistent": True, "anonymized_telemetry": False},
+        "qdrant": {},
+        "embeddings": {"model_name": args.model},
+    }
+    embeddings = LLMFactory(config).get_embedding_function()
+    store_factory = StoreFactory(config)
+    store = store_factory.get_vector_store(embeddings=embeddings)
+    status_store = store_factory.get_shared_status_store()
+
+    # Study the chunks: vector store and lexical index
+    start = time.perf_counter()
+    chunk_ids = [str(uuid.uuid4()) for _ in chunks]
+    for i in range(0, len(chunks), ADD_BATCH_SIZE):
+        batch_chunks = chunks[i : i + ADD_BATCH_SIZE]
+        batch_ids = chunk_ids[i : i + ADD_BATCH_SIZE]
+        store.add_documents_with_embeddings(
+            [
+                Document(page_content=chunk, metadata={"source": f"chunk_{i + j}"})
+                for j, chunk in enumerate(batch_chunks)
+            ],
+            embeddings.embed_documents(batch_chunks),
+            ids=batch_ids,
+        )
+        status_store.add_lexical_chunks(
+            [
+                (chunk_id, f"chunk_{i + j}", chunk)
+                for j, (chunk_id, chunk) in enumerate(zip(batch_ids, batch_chunks))
+            ]
+        )
+    print(f"Indexed in {time.perf_counter() - start:.1f} s")
+
+    dense_retriever = store.as_retriever(
+        search_type="similarity", search_kwargs={"k": args.k}
+    )
+    retrievers = {
+        "similarity": dense_retriever,
+        "hybrid": HybridRetriever(
+            dense_retriever=dense_retriever,
+            store_factory=store_factory,
+            lexical_k=args.lexical_k,
+        ),
+    }
+
+    print(f"{'Queries':<12} {'Search':<12} {f'Recall@{args.k}':>10} {'ms/query':>9}")
+    for queries_name, queries_by_chunk in queries.items():
+        if len(queries_by_chunk) == 0:
+            continue
+
+        for retriever_name, retriever in retrievers.items():
+            results, timings = retrieve_multi_query(
+                retriever, list(queries_by_chunk.values())
+            )
+            recall = sum(
+                chunk_ids[i] in [document.id for document in documents]
+                for i, documents in zip(queries_by_chunk.keys(), results)
+            ) / len(queries_by_chunk)
+
+            print(
+                f"{queries_name:<12} {retriever_name:<12} {recall:>10.1%} "
+                f"{timings['total'] * 1000 / len(queries_by_chunk):>9.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+#!/usr/bin/env python
+"""
+Benchmark the index settings of the Qdrant store (HNSW, on-disk storage, quantization and
+search parameters, the keys of the 'qdrant' section of chatnerd.config.yml). For each setting,
+prints the recall@k of the search against the exact (brute-force) neighbours and the latency
+per query. The vectors are synthetic clusters, or the rows of a .npy file (ex. the vectors of
+a numpy store).
+
+The HNSW index and the quantization are only built by a Qdrant server (--url): the local mode
+always searches the vectors exhaustively, so every setting gives a recall of 100%.
+
+Usage: python scripts/benchmark_qdrant_index.py [--url http://localhost:6333]
+       [--num-vectors 100000] [--dim 768] [--vectors vectors.npy] [--settings settings.yml]
+"""
+
+import sys
+import json
+import time
+import uuid
+import shutil
+import argparse
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, List
+import numpy as np
+import yaml
+from qdrant_client import models
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from langchain_core.documents import Document  # noqa: E402
+from chatnerd.stores.qdrant_store import QdrantStore  # noqa: E402
+
+ADD_BATCH_SIZE = 1000
+INDEXING_TIMEOUT = 3600  # Seconds waiting for the server to index a collection
+COLLECTION_PREFIX = "chatnerd_benchmark_"
+
+# Settings of the 'qdrant' config section, by name
+DEFAULT_SETTINGS = {
+    "default": {},
+    "ef=32": {"search": {"hnsw_ef": 32}},
+    "ef=128": {"search": {"hnsw_ef": 128}},
+    "ef=512": {"search": {"hnsw_ef": 512}},
+    "m=32 ef_construct=256": {
+        "hnsw": {"m": 32, "ef_construct": 256},
+        "search": {"hnsw_ef": 128},
+    },
+    "on disk": {
+        "on_disk": True,
+        "hnsw": {"on_disk": True},
+        "search": {"hnsw_ef": 128},
+    },
+    "scalar": {
+        "quantization": {"type": "scalar", "quantile": 0.99, "always_ram": True},
+        "search": {"hnsw_ef": 128, "rescore": True, "oversampling": 2.0},
+    },
+    "scalar no rescore": {
+        "quantization": {"type": "scalar", "quantile": 0.99, "always_ram": True},
+        "search": {"hnsw_ef": 128, "rescore": False},
+    },
+    "product x16": {
+        "quantization": {"type": "product", "compression": "x16", "always_ram": True},
+        "search": {"hnsw_ef": 128, "rescore": True, "oversampling": 2.0},
+    },
+    "binary": {
+        "quantization": {"type": "binary", "always_ram": True},
+        "search": {"hnsw_ef": 128, "rescore": True, "oversampling": 3.0},
+    },
+}
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def generate_vectors(
+    num_vectors: int, dim: int, num_clusters: int = 100, seed: int = 0
+) -> np.ndarray:
+    """
+    Normalized vectors around random centers, closer to the embeddings of texts than
+    uniformly random vectors
+    """
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(num_clusters, dim)).astype(np.float32)
+    vectors = centers[rng.integers(num_clusters, size=num_vectors)]
+    vectors += rng.normal(scale=0.8, size=(num_vectors, dim)).astype(np.float32)
+    return normalize(vectors)
+
+
+def read_vectors(path: str, num_vectors: int) -> np.ndarray:
+    vectors = np.load(path, mmap_mode="r")[:num_vectors]
+    vectors = np.asarray(vectors, dtype=np.float32)
+    # Empty rows (ex. capacity of a numpy store) are skipped
+    return normalize(vectors[np.linalg.norm(vectors, axis=1) > 0])
+
+
+def exact_neighbours(vectors: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    neighbours = []
+    for i in range(0, len(queries), 100):
+        similarities = queries[i : i + 100] @ vectors.T
+        top = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+        neighbours.extend(top)
+    return np.array(neighbours)
+
+
+def get_index_key(setting: Dict[str, Any]) -> str:
+    # Settings with the same collection settings (all but search) share a collection
+    return json.dumps(
+        {key: value for key, value in setting.items() if key != "search"},
+        sort_keys=True,
+    )
+
+
+def wait_for_indexing(store: QdrantStore):
+    start = time.perf_counter()
+    while time.perf_counter() - start < INDEXING_TIMEOUT:
+        collection = store.client.get_collection(store.collection_name)
+        if collection.status == models.CollectionStatus.GREEN:
+            return
+        time.sleep(1)
+
+    print(f"Timeout waiting for the indexing of {store.collection_name}")
+
+
+def load_collection(
+    client_config: Dict[str, Any],
+    setting: Dict[str, Any],
+    collection_name: str,
+    vectors: np.ndarray,
+    ids: List[str],
+) -> float:
+    """
+    Creates the collection with the index settings and adds the vectors. Returns the seconds
+    to add and index the vectors
+    """
+    store = QdrantStore(
+        {**client_config, **setting},
+        collection_name=collection_name,
+        vector_size=vectors.shape[1],
+    )
+    start = time.perf_counter()
+    for i in range(0, len(vectors), ADD_BATCH_SIZE):
+        store.add_documents_with_embeddings(
+            [
+                Document(page_content="", metadata={"source": f"vector_{j}"})
+                for j in range(i, min(i + ADD_BATCH_SIZE, len(vectors)))
+            ],
+            vectors[i : i + ADD_BATCH_SIZE].tolist(),
+            ids=ids[i : i + ADD_BATCH_SIZE],
+        )
+    wait_for_indexing(store)
+
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--url", type=str, default=None)
+    parser.add_argument("--num-vectors", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--vectors", type=str, default=None)
+    parser.add_argument("--num-queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument(
+        "--settings",
+        type=str,
+        default=None,
+        help="YAML file of the settings to compare: name -> keys of the 'qdrant' config",
+    )
+    args = parser.parse_args()
+
+    if args.vectors:
+        vectors = read_vectors(args.vectors, args.num_vectors + args.num_queries)
+    else:
+        vectors = generate_vectors(args.num_vectors + args.num_queries, args.dim)
+    vectors, queries = vectors[: -args.num_queries], vectors[-args.num_queries :]
+    ids = [str(uuid.uuid4()) for _ in range(len(vectors))]
+    neighbours = exact_neighbours(vectors, queries, args.k)
+
+    if args.settings:
+        with open(args.settings, "r", encoding="utf-8") as settings_file:
+            settings = yaml.safe_load(settings_file)
+    else:
+        settings = DEFAULT_SETTINGS
+
+    if args.url:
+        client_config = {"url": args.url}
+    else:
+        client_config = {"path": tempfile.mkdtemp()}
+        print("Local mode: no HNSW index nor quantization, use --url of a server")
+    print(
+        f"Vectors: {len(vectors)} x {vectors.shape[1]}, {len(queries)} queries, k: {args.k}"
+    )
+
+    # One collection for each index settings
+    collection_names = {}
+    try:
+        for name, setting in settings.items():
+            index_key = get_index_key(setting or {})
+            if index_key in collection_names:
+                continue
+
+            collection_name = f"{COLLECTION_PREFIX}{len(collection_names)}"
+            collection_names[index_key] = collection_name
+            store = QdrantStore(client_config, collection_name=collection_name)
+            if store.client.collection_exists(collection_name):
+                store.client.delete_collection(collection_name)
+            seconds = load_collection(
+                client_config, setting or {}, collection_name, vectors, ids
+            )
+            print(f"Collection of '{name}' indexed in {seconds:.1f} s")
+
+        print(f"{'Setting':<24} {f'Recall@{args.k}':>10} {'ms/query':>9} {'p95 ms':>8}")
+        for name, setting in settings.items():
+            store = QdrantStore(
+                {**client_config, **(setting or {})},
+                collection_name=collection_names[get_index_key(setting or {})],
+            )
+
+            latencies = []
+            recalls = []
+            for query, query_neighbours in zip(queries, neighbours):
+                start = time.perf_counter()
+                results = store.similarity_search_with_score_by_vector(
+                    query.tolist(), k=args.k
+                )
+                latencies.append(time.perf_counter() - start)
+
+                expected_ids = {ids[i] for i in query_neighbours}
+                recalls.append(
+                    len(expected_ids & {document.id for document, _ in results})
+                    / args.k
+                )
+
+            print(
+                f"{name:<24} {np.mean(recalls):>10.1%} {np.mean(latencies) * 1000:>9.2f} "
+                f"{np.percentile(latencies, 95) * 1000:>8.2f}"
+            )
+    finally:
+        # Delete the collections, and the directory of the local mode
+        store = QdrantStore(client_config, collection_name=COLLECTION_PREFIX)
+        for collection_name in collection_names.values():
+            if store.client.collection_exists(collection_name):
+                store.client.delete_collection(collection_name)
+        store.close()
+        if "path" in client_config:
+            shutil.rmtree(client_config["path"], ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+#!/usr/bin/env python
+"""
+Benchmark the text splitters on a text corpus: RecursiveCharacterTextSplitter created per
+document with chunk_size in characters (previous implementation of DocumentEmbedder) vs.
+FastTokenTextSplitter (modes "tokens" and "sentences") counting tokens with the tokenizer of
+the embedding model. Prints the throughput and the truncation rate: chunks longer than the
+max_seq_length of the model, which the embedding model silently truncates, and the mean
+number of tokens per chunk (chunks much shorter than max_seq_length waste embedding calls).
+
+Usage: python scripts/benchmark_text_splitter.py [--size-mb 100] [--path corpus_dir]
+       [--model sentence-transformers/all-MiniLM-L6-v2] [--max-seq-length 256]
+"""
+
+import sys
+import time
+import random
+import argparse
+from pathlib import Path
+from typing import List, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from langchain_core.documents import Document  # noqa: E402
+from langchain_text_splitters import RecursiveCharacterTextSplitter  # noqa: E402
+from chatnerd.langchain.token_text_splitter import (  # noqa: E402
+    FastTokenTextSplitter,
+    DEFAULT_SEPARATORS,
+    SPLIT_MODE_SENTENCES,
+    SPLIT_MODE_TOKENS,
+)
+
+DOCUMENT_SIZE = 50_000  # Characters per generated document
+COUNT_BATCH_SIZE = 1_000  # Chunks tokenized at once to count their tokens
+
+
+def generate_documents(size_mb: float, seed: int = 0) -> List[Document]:
+    """
+    Synthetic English-like text: sentences of random words, paragraphs and some long words
+    """
+    rng = random.Random(seed)
+    words = (
+        "the of and to in is was that for it as with be on by at this from have which or "
+        "an are not but they his one had all were she there we been can their has more "
+        "when who will no if would so what about said up out into them document model "
+        "embedding retrieval vector chunk sentence paragraph tokenizer transformer"
+    ).split()
+    long_words = [
+        "".join(rng.choices("abcdefghijklmnopqrstuvwxyz", k=12)) for _ in range(500)
+    ]
+
+    sentences = []
+    for _ in range(5_000):
+        sentence = " ".join(
+            rng.choice(long_words) if rng.random() < 0.1 else rng.choice(words)
+            for _ in range(rng.randint(5, 40))
+        )
+        sentences.append(sentence.capitalize() + ".")
+
+    documents = []
+    total_size = int(size_mb * 1024**2)
+    size = 0
+    while size < total_size:
+        parts = []
+        document_size = 0
+        while document_size < DOCUMENT_SIZE:
+            paragraph = " ".join(rng.choices(sentences, k=rng.randint(2, 12)))
+            parts.append(paragraph)
+            document_size += len(paragraph) + 2
+        text = "\n\n".join(parts)
+        documents.append(
+            Document(page_content=text, metadata={"source": f"doc{len(documents)}"})
+        )
+        size += len(text)
+
+    return documents
+
+
+def read_documents(path: str) -> List[Document]:
+    return [
+        Document(
+            page_content=file_path.read_text(encoding="utf-8", errors="replace"),
+            metadata={"source": str(file_path)},
+        )
+        for file_path in sorted(Path(path).rglob("*.txt"))
+    ]
+
+
+def split_per_document(documents: List[Document], chunk_size: int) -> List[Document]:
+    chunks = []
+    for document in documents:
+        text_splitter = RecursiveCharacterTextSplitter(
+            separators=DEFAULT_SEPARATORS,
+            chunk_size=chunk_size,
+            chunk_overlap=0,
+            keep_separator=False,
+            add_start_index=True,
+        )
+        chunks.extend(
+            text_splitter.create_documents(
+                [document.page_content], metadatas=[document.metadata]
+            )
+        )
+    return chunks
+
+
+def count_tokens(
+    tokenizer, chunks: List[Document], max_seq_length: int
+) -> Tuple[int, int]:
+    """
+    Returns the number of tokens of the chunks and the number of truncated chunks
+    """
+    num_tokens, truncated = 0, 0
+    for i in range(0, len(chunks), COUNT_BATCH_SIZE):
+        encoding = tokenizer(
+            [chunk.page_content for chunk in chunks[i : i + COUNT_BATCH_SIZE]],
+            add_special_tokens=True,
+            return_attention_mask=False,
+            return_token_type_ids=False,
+            verbose=False,
+        )
+        lengths = [len(input_ids) for input_ids in encoding["input_ids"]]
+        num_tokens += sum(lengths)
+        truncated += sum(1 for length in lengths if length > max_seq_length)
+    return num_tokens, truncated
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--size-mb", type=float, default=100)
+    parser.add_argument("--path", type=str, default=None)
+    parser.add_argument(
+        "--model", type=str, default="sentence-transformers/all-MiniLM-L6-v2"
+    )
+    parser.add_argument("--max-seq-length", type=int, default=256)
+    parser.add_argument("--batch-size", type=int, default=256)
+    args = parser.parse_args()
+
+    from transformers import AutoTokenizer
+
+    tokenizer = AutoTokenizer.from_pretrained(args.model, use_fast=True)
+    chunk_size = args.max_seq_length - tokenizer.num_special_tokens_to_add()
+
+    if args.path:
+        documents = read_documents(args.path)
+    else:
+        print(f"Generating {args.size_mb:.0f} MB of text...")
+        documents = generate_documents(args.size_mb)
+    corpus_mb = sum(len(document.page_content) for document in documents) / 1024**2
+    print(f"Corpus: {len(documents)} documents, {corpus_mb:.1f} MB")
+    print(f"Model: {args.model} (max_seq_length {args.max_seq_length})")
+
+    splitters = {
+        "recursive characters (per document)": lambda: split_per_document(
+            documents, args.max_seq_length
+        ),
+    }
+    for mode in [SPLIT_MODE_TOKENS, SPLIT_MODE_SENTENCES]:
+        text_splitter = FastTokenTextSplitter(
+            tokenizer=tokenizer,
+            mode=mode,
+            separators=DEFAULT_SEPARATORS,
+            chunk_size=chunk_size,
+            chunk_overlap=0,
+            add_start_index=True,
+        )
+
+        def split_batches(text_splitter=text_splitter):
+            chunks = []
+            for i in range(0, len(documents), args.batch_size):
+                batch = documents[i : i + args.batch_size]
+                chunks.extend(
+                    text_splitter.create_documents(
+                        [document.page_content for document in batch],
+                        metadatas=[document.metadata for document in batch],
+                    )
+                )
+            return chunks
+
+        splitters[f"fast token splitter ({mode})"] = split_batches
+
+    print(
+        f"{'Splitter':<40} {'Time (s)':>9} {'MB/s':>7} {'Chunks':>9} "
+        f"{'Tokens/chunk':>13} {'Truncated':>10}"
+    )
+    for name, split in splitters.items():
+        start = time.perf_counter()
+        chunks = split()
+        elapsed = time.perf_counter() - start
+
+        num_tokens, truncated = count_tokens(tokenizer, chunks, args.max_seq_length)
+        num_chunks = max(1, len(chunks))
+        print(
+            f"{name:<40} {elapsed:>9.2f} {corpus_mb / elapsed:>7.2f} {len(chunks):>9} "
+            f"{num_tokens / num_chunks:>13.1f} {truncated / num_chunks:>10.1%}"
+        )
+
+
+if __name__ == "__main__":
+    main()
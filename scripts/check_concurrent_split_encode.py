@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+"""
+Check the text splitter of the streaming study while the encode workers encode batches with
+the same embedding model. The encode workers set the truncation of the model's tokenizer on
+every batch, so the splitter must use its own tokenizer: a shared one raises "Already
+borrowed" or splits the texts truncated to max_seq_length. Each concurrent split must return
+the chunks of the split done before the encode workers start.
+
+Usage: python scripts/check_concurrent_split_encode.py
+       [--model sentence-transformers/all-MiniLM-L6-v2] [--workers 4] [--rounds 50]
+"""
+
+import sys
+import random
+import argparse
+import threading
+from pathlib import Path
+from typing import List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from langchain_core.documents import Document  # noqa: E402
+from chatnerd.langchain.document_embedder import DocumentEmbedder  # noqa: E402
+from chatnerd.langchain.llm_factory import LLMFactory  # noqa: E402
+
+WORDS = (
+    "the of and to in is was that for it as with be on by at this from document model "
+    "embedding retrieval vector chunk sentence paragraph tokenizer transformer"
+).split()
+
+
+def generate_documents(num_documents: int, seed: int = 0) -> List[Document]:
+    """
+    Documents much longer than max_seq_length, so a truncated tokenizer drops text
+    """
+    rng = random.Random(seed)
+    documents = []
+    for i in range(num_documents):
+        sentences = [
+            " ".join(rng.choices(WORDS, k=rng.randint(5, 30))).capitalize() + "."
+            for _ in range(200)
+        ]
+        documents.append(
+            Document(page_content=" ".join(sentences), metadata={"source": f"doc{i}"})
+        )
+
+    return documents
+
+
+def split(documents: List[Document], text_splitter) -> List[List[str]]:
+    return [
+        [
+            chunk.page_content
+            for chunk in DocumentEmbedder.split_documents([document], text_splitter)[0]
+        ]
+        for document in documents
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--model", type=str, default="sentence-transformers/all-MiniLM-L6-v2"
+    )
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--rounds", type=int, default=50)
+    parser.add_argument("--num-documents", type=int, default=20)
+    args = parser.parse_args()
+
+    config = {
+        "embeddings": {"model_name": args.model, "provider": "huggingface"},
+        "splitter": {"mode": "tokens"},
+    }
+    embeddings = LLMFactory(config).get_embedding_function()
+    text_splitter = DocumentEmbedder.get_text_splitter(config, embeddings)
+
+    documents = generate_documents(args.num_documents)
+    expected = split(documents, text_splitter)
+    texts = [chunk for chunks in expected for chunk in chunks]
+
+    stop = threading.Event()
+    errors = []
+
+    def encode():
+        try:
+            while not stop.is_set():
+                embeddings.embed_documents(texts[:64])
+        except Exception as e:
+            errors.append(e)
+
+    workers = [threading.Thread(target=encode) for _ in range(args.workers)]
+    for worker in workers:
+        worker.start()
+
+    mismatches = 0
+    try:
+        for _ in range(args.rounds):
+            if split(documents, text_splitter) != expected:
+                mismatches += 1
+    except Exception as e:
+        errors.append(e)
+    finally:
+        stop.set()
+        for worker in workers:
+            worker.join()
+
+    print(
+        f"{args.rounds} splits of {len(documents)} documents ({len(texts)} chunks) with "
+        f"{args.workers} encode workers: {mismatches} different, {len(errors)} errors"
+    )
+    for error in errors[:5]:
+        print(f"Error: {type(error).__name__}: {str(error)}")
+
+    sys.exit(1 if mismatches or errors else 0)
+
+
+if __name__ == "__main__":
+    main()